@@ -1,4 +1,5 @@
 from .gget_ref import ref
+from .gget_mirror import mirror
 from .gget_search import search
 from .gget_info import info
 from .gget_seq import seq
@@ -15,6 +16,7 @@ from .gget_cellxgene import cellxgene
 from .gget_elm import elm
 from .gget_diamond import diamond
 from .gget_cosmic import cosmic
+from .cache import enable_cache, disable_cache
 
 import logging
 logging.basicConfig(
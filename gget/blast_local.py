@@ -0,0 +1,251 @@
+import os
+import shutil
+import logging
+import tempfile
+import subprocess
+from io import StringIO
+
+# Add and format time stamp in logging messages
+logging.basicConfig(
+    format="%(asctime)s %(levelname)s %(message)s",
+    level=logging.INFO,
+    datefmt="%c",
+)
+# Mute numexpr threads info
+logging.getLogger("numexpr").setLevel(logging.WARNING)
+
+import pandas as pd
+
+# Custom functions
+from .seq_index import decompress_fasta
+from .utils import format_evalue
+
+# Fields of the tabular BLAST+ output (-outfmt 7)
+OUTFMT_FIELDS = [
+    "qseqid",
+    "saccver",
+    "stitle",
+    "staxids",
+    "sscinames",
+    "scomnames",
+    "bitscore",
+    "evalue",
+    "pident",
+    "qlen",
+    "qstart",
+    "qend",
+    "slen",
+]
+
+# Database type required by each BLAST+ program
+DB_TYPES = {
+    "blastn": "nucl",
+    "tblastn": "nucl",
+    "tblastx": "nucl",
+    "blastp": "prot",
+    "blastx": "prot",
+}
+
+
+def find_binary(name, blast_bin=None):
+    """
+    Returns the path to a BLAST+ program (in 'blast_bin' or on the PATH).
+    """
+    path = shutil.which(name, path=blast_bin) if blast_bin else shutil.which(name)
+    if path is None:
+        raise RuntimeError(
+            f"BLAST+ program '{name}' not found. Please install BLAST+ "
+            "(https://blast.ncbi.nlm.nih.gov/doc/blast-help/downloadblastdata.html, "
+            "e.g. 'conda install -c bioconda blast') or pass the directory containing the BLAST+ programs ('blast_bin')."
+        )
+    return path
+
+
+def _db_exists(db, dbtype):
+    prefix = "n" if dbtype == "nucl" else "p"
+    return any(os.path.exists(f"{db}.{prefix}{ext}") for ext in ["in", "al"])
+
+
+def make_blast_db(database, dbtype, blast_bin=None, verbose=True):
+    """
+    Returns the path to a BLAST database. If 'database' is a (gzipped) FASTA file,
+    a BLAST database is built next to it with makeblastdb (once).
+
+    Args:
+    - database    Path to a BLAST database (prefix) or FASTA file.
+    - dbtype      'nucl' or 'prot'.
+    """
+    if _db_exists(database, dbtype):
+        return database
+
+    if not os.path.isfile(database):
+        raise ValueError(
+            f"No {dbtype} BLAST database or FASTA file found at '{database}'."
+        )
+
+    fasta = decompress_fasta(database, verbose=verbose)
+    if _db_exists(fasta, dbtype) and os.path.getmtime(
+        f"{fasta}.{'n' if dbtype == 'nucl' else 'p'}in"
+    ) >= os.path.getmtime(fasta):
+        return fasta
+
+    if verbose:
+        logging.info(f"Building BLAST database from {fasta}.")
+
+    command = [
+        find_binary("makeblastdb", blast_bin),
+        "-in",
+        fasta,
+        "-dbtype",
+        dbtype,
+        "-out",
+        fasta,
+        "-parse_seqids",
+    ]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"makeblastdb failed:\n{process.stderr}")
+
+    return fasta
+
+
+def _query_cover(hits, query_len):
+    # Percentage of the query covered by the union of all HSPs
+    covered = 0
+    last_end = 0
+    for start, end in sorted(
+        zip(hits[["qstart", "qend"]].min(axis=1), hits[["qstart", "qend"]].max(axis=1))
+    ):
+        start = max(start, last_end + 1)
+        if end >= start:
+            covered += end - start + 1
+            last_end = end
+    return covered / query_len * 100 if query_len else 0
+
+
+def _na(value):
+    return None if pd.isna(value) or value == "N/A" else value
+
+
+def parse_tabular(output, query_ids):
+    """
+    Convert tabular BLAST+ output (-outfmt 6 or 7 with the fields in OUTFMT_FIELDS) into
+    data frames with the columns of the descriptions table on the BLAST website.
+
+    Args:
+    - output      Tabular BLAST+ output (str).
+    - query_ids   Dictionary {query ID in the BLAST+ output: query ID}.
+
+    Returns a dictionary {query ID: data frame (or None if no hits were found)}.
+    """
+    df = pd.read_csv(
+        StringIO(output),
+        sep="\t",
+        comment="#",
+        names=OUTFMT_FIELDS,
+        dtype={"qseqid": str, "saccver": str, "staxids": str},
+        keep_default_na=False,
+        na_values=[""],
+    )
+
+    results = {query_id: None for query_id in query_ids.values()}
+    for qseqid, query_hits in df.groupby("qseqid", sort=False):
+        rows = []
+        # Combine the HSPs of each subject (subjects are sorted by their best HSP)
+        for accession, hits in query_hits.groupby("saccver", sort=False):
+            best = hits.loc[hits["bitscore"].idxmax()]
+            taxid = _na(str(best["staxids"]).split(";")[0])
+            rows.append(
+                {
+                    "Description": _na(best["stitle"]),
+                    "Scientific Name": _na(best["sscinames"]),
+                    "Common Name": _na(best["scomnames"]),
+                    "Taxid": int(taxid) if taxid and taxid.isdigit() else None,
+                    "Max Score": round(best["bitscore"]),
+                    "Total Score": round(hits["bitscore"].sum()),
+                    "Query Cover": f"{round(_query_cover(hits, best['qlen'])):d}%",
+                    "E value": format_evalue(hits["evalue"].min()),
+                    "Per. Ident": f"{best['pident']:.2f}%",
+                    "Acc. Len": int(best["slen"]),
+                    "Accession": accession,
+                }
+            )
+        results[query_ids.get(qseqid, qseqid)] = pd.DataFrame(rows)
+
+    return results
+
+
+def run_local_blast(
+    queries,
+    program,
+    database,
+    limit=50,
+    expect=10.0,
+    low_comp_filt=False,
+    megablast=True,
+    threads=1,
+    blast_bin=None,
+    verbose=True,
+):
+    """
+    Search all queries with a single call of a local BLAST+ program.
+
+    Args:
+    - queries     List of (query ID, sequence) tuples.
+    - database    Path to a BLAST database or FASTA file (see make_blast_db).
+    - threads     Number of threads used by BLAST+ (-num_threads). Default: 1.
+    - blast_bin   Directory containing the BLAST+ programs (default: None -> programs on the PATH).
+    (See gget.blast for the other arguments.)
+
+    Returns a dictionary {query ID: data frame of results (or None if no hits were found)}.
+    """
+    binary = find_binary(program, blast_bin)
+    database = make_blast_db(database, DB_TYPES[program], blast_bin=blast_bin, verbose=verbose)
+
+    # Number the queries, since BLAST+ might change IDs containing special characters
+    query_ids = {f"Query_{i + 1}": query_id for i, (query_id, _) in enumerate(queries)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        query_file = os.path.join(tmp, "queries.fa")
+        with open(query_file, "w") as f:
+            for (_, sequence), blast_id in zip(queries, query_ids):
+                f.write(f">{blast_id}\n{sequence}\n")
+
+        command = [
+            binary,
+            "-query",
+            query_file,
+            "-db",
+            database,
+            "-outfmt",
+            "7 " + " ".join(OUTFMT_FIELDS),
+            "-max_target_seqs",
+            str(limit),
+            "-num_threads",
+            str(threads),
+        ]
+        if expect is not None:
+            command += ["-evalue", str(expect)]
+        if program == "blastn":
+            command += ["-task", "megablast" if megablast else "blastn"]
+            command += ["-dust", "yes" if low_comp_filt else "no"]
+        elif program in ["blastp", "tblastn"]:
+            command += ["-seg", "yes" if low_comp_filt else "no"]
+
+        if verbose:
+            logging.info(
+                f"Running {program} with {len(queries)} queries against {database} using {threads} threads."
+            )
+
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"{program} failed:\n{process.stderr}")
+
+    results = parse_tabular(process.stdout, query_ids)
+    for query_id, df in results.items():
+        if df is None:
+            logging.error(
+                f"No significant similarity found for {query_id}. If your sequence is very short, try increasing the 'expect' argument."
+            )
+
+    return results
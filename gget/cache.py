@@ -0,0 +1,348 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import inspect
+import logging
+import threading
+import functools
+
+# Add and format time stamp in logging messages
+logging.basicConfig(
+    format="%(asctime)s %(levelname)s %(message)s",
+    level=logging.INFO,
+    datefmt="%c",
+)
+# Mute numexpr threads info
+logging.getLogger("numexpr").setLevel(logging.WARNING)
+
+# Constants
+from .constants import CACHE_DIR, CACHE_MAX_SIZE, CACHE_TTLS, CACHE_ENV_VAR
+
+# Name of the SQLite database inside the cache directory
+CACHE_DB = "gget_cache.sqlite"
+
+
+class ResponseCache:
+    """
+    Persistent on-disk cache for server responses stored in an SQLite database.
+
+    Each entry belongs to an endpoint (e.g. "ensembl_rest" or "uniprot") which defines
+    its time to live (TTL). When the total size of the stored responses exceeds
+    max_size, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=CACHE_DIR, max_size=CACHE_MAX_SIZE, ttls=None):
+        """
+        Args:
+        - path      Path to the cache directory. Default: ~/.cache/gget
+        - max_size  Maximum size of the cache in bytes. Default: 1 GB.
+        - ttls      Dictionary of time to live (in seconds) per endpoint, e.g. {"uniprot": 86400}.
+                    Overwrites the defaults defined in gget.constants.CACHE_TTLS.
+                    Endpoints with a TTL of None do not expire.
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(self.path, exist_ok=True)
+        self.db = os.path.join(self.path, CACHE_DB)
+        self.max_size = max_size
+        self.ttls = dict(CACHE_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        # In-process hit/miss counters per endpoint
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, "
+                "endpoint TEXT NOT NULL, "
+                "value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "created REAL NOT NULL, "
+                "accessed REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+
+    @staticmethod
+    def make_key(endpoint, key):
+        """
+        Returns a hash identifying a request from the endpoint and any JSON serializable key.
+        """
+        key = json.dumps([endpoint, key], sort_keys=True, default=str)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _count(self, endpoint, event):
+        counts = self._counts.setdefault(endpoint, {"hits": 0, "misses": 0})
+        counts[event] += 1
+
+    def get(self, endpoint, key):
+        """
+        Look up a response.
+        Returns a tuple (True, value) if a valid entry was found, and (False, None) otherwise.
+        """
+        key = self.make_key(endpoint, key)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            ttl = self.ttls.get(endpoint)
+            if row is None or (ttl is not None and now - row[1] > ttl):
+                self._count(endpoint, "misses")
+                return False, None
+
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+                )
+            self._count(endpoint, "hits")
+
+        return True, pickle.loads(row[0])
+
+    def set(self, endpoint, key, value):
+        """
+        Store a response and evict the least recently used entries if the cache is full.
+        """
+        key = self.make_key(endpoint, key)
+        value = pickle.dumps(value)
+        now = time.time()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, value, len(value), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        """
+        Delete expired entries and the least recently used entries until the cache
+        is smaller than max_size. Must be called while holding the lock.
+        """
+        now = time.time()
+        for endpoint, ttl in self.ttls.items():
+            if ttl is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE endpoint = ? AND created < ?",
+                    (endpoint, now - ttl),
+                )
+
+        if self.max_size is None:
+            return
+
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        to_delete = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        ):
+            to_delete.append((key,))
+            total -= size
+            if total <= self.max_size:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of entries, their size (in bytes) and the
+        number of hits and misses in the current session per endpoint.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT endpoint, COUNT(*), SUM(size) FROM responses GROUP BY endpoint"
+            ).fetchall()
+            counts = {endpoint: dict(c) for endpoint, c in self._counts.items()}
+
+        endpoints = {}
+        for endpoint, entries, size in rows:
+            endpoints[endpoint] = {"entries": entries, "size": size}
+        for endpoint, c in counts.items():
+            endpoints.setdefault(endpoint, {"entries": 0, "size": 0}).update(c)
+
+        return {
+            "path": self.db,
+            "max_size": self.max_size,
+            "entries": sum(e["entries"] for e in endpoints.values()),
+            "size": sum(e["size"] for e in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+    def clear(self, endpoint=None):
+        """
+        Delete all entries (or only the entries of one endpoint).
+        Returns the number of deleted entries.
+        """
+        with self._lock, self._conn:
+            if endpoint is None:
+                cur = self._conn.execute("DELETE FROM responses")
+            else:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE endpoint = ?", (endpoint,)
+                )
+        with self._lock:
+            # Release the freed disk space
+            self._conn.execute("VACUUM")
+
+        return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Cache shared by all gget modules (None = caching disabled)
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+# Whether the environment variable was checked already
+_ENV_CHECKED = False
+
+
+def enable_cache(path=CACHE_DIR, max_size=CACHE_MAX_SIZE, ttls=None):
+    """
+    Enable the persistent on-disk cache for Ensembl, UniProt and PDBe server responses
+    for all gget modules. Responses are reused until their time to live expires or a
+    new Ensembl release becomes available.
+
+    The cache can also be enabled by setting the environment variable GGET_CACHE
+    to 1 (default cache directory) or to the path of a cache directory.
+
+    Args:
+    - path      Path to the cache directory. Default: ~/.cache/gget
+    - max_size  Maximum size of the cache in bytes. Default: 1 GB.
+    - ttls      Dictionary of time to live (in seconds) per endpoint, e.g. {"uniprot": 86400}.
+                Default: gget.constants.CACHE_TTLS
+
+    Returns the ResponseCache object.
+    """
+    global _CACHE, _ENV_CHECKED
+    with _CACHE_LOCK:
+        if _CACHE is not None:
+            _CACHE.close()
+        _CACHE = ResponseCache(path=path, max_size=max_size, ttls=ttls)
+        _ENV_CHECKED = True
+
+    return _CACHE
+
+
+def disable_cache():
+    """
+    Disable the persistent on-disk cache (cached responses are kept on disk).
+    """
+    global _CACHE, _ENV_CHECKED
+    with _CACHE_LOCK:
+        if _CACHE is not None:
+            _CACHE.close()
+        _CACHE = None
+        _ENV_CHECKED = True
+
+
+def cache_path_from_env():
+    """
+    Returns the cache directory defined by the GGET_CACHE environment variable
+    (None if the variable is not set or caching is switched off).
+    """
+    value = os.environ.get(CACHE_ENV_VAR, "").strip()
+    if value.lower() in ["", "0", "false", "no", "off"]:
+        return None
+    if value.lower() in ["1", "true", "yes", "on"]:
+        return CACHE_DIR
+    return value
+
+
+def get_cache():
+    """
+    Returns the shared ResponseCache, or None if caching is disabled.
+    """
+    global _ENV_CHECKED
+    if not _ENV_CHECKED:
+        path = cache_path_from_env()
+        if path is not None:
+            enable_cache(path)
+        _ENV_CHECKED = True
+
+    return _CACHE
+
+
+# In-process memoization layer in the format {key hash: (time stored, value)}
+_MEMORY = {}
+_MEMORY_LOCK = threading.Lock()
+
+
+def clear_memory():
+    """
+    Clear the in-process memoization layer (see cached(memory=True)).
+    """
+    with _MEMORY_LOCK:
+        _MEMORY.clear()
+
+
+def cached(endpoint, release=True, ignore=(), memory=False):
+    """
+    Decorator that stores the return value of a function in the shared ResponseCache.
+    The function arguments (except for the arguments listed in 'ignore') and, if
+    release=True, the latest Ensembl release are part of the cache key.
+    If memory=True, return values are also memoized in-process (also when the on-disk
+    cache is disabled), using the same time to live as the on-disk cache.
+    Exceptions are not cached.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None and not memory:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = {
+                arg: value
+                for arg, value in bound.arguments.items()
+                if arg not in ignore
+            }
+            key["function"] = func.__name__
+            if release:
+                from .utils import find_latest_ens_rel
+
+                key["ens_release"] = find_latest_ens_rel()
+
+            if memory:
+                ttl = (cache.ttls if cache is not None else CACHE_TTLS).get(endpoint)
+                memory_key = ResponseCache.make_key(endpoint, key)
+                with _MEMORY_LOCK:
+                    entry = _MEMORY.get(memory_key)
+                if entry is not None and (ttl is None or time.time() - entry[0] <= ttl):
+                    return entry[1]
+
+            hit = False
+            if cache is not None:
+                hit, value = cache.get(endpoint, key)
+
+            if not hit:
+                value = func(*args, **kwargs)
+                if cache is not None:
+                    cache.set(endpoint, key, value)
+
+            if memory:
+                with _MEMORY_LOCK:
+                    _MEMORY[memory_key] = (time.time(), value)
+
+            return value
+
+        return wrapper
+
+    return decorator
@@ -1,17 +1,82 @@
+import os
 import uuid
 
+# HTTP session settings (shared by all gget modules, see utils.get_session)
+# Number of times a failed request is retried
+HTTP_RETRIES = 5
+# Retries are spaced out using exponential backoff:
+# {backoff factor} * (2 ** ({number of previous retries})) seconds
+# (Retry-After headers sent by the server take precedence)
+HTTP_BACKOFF_FACTOR = 0.5
+# Response status codes that trigger a retry
+HTTP_RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# Hosts whose POST requests are retried (POST requests to other hosts, e.g. BLAST and
+# UniProt ID mapping job submissions, are sent once so that no duplicate jobs are created)
+HTTP_RETRY_POST_HOSTS = ["rest.ensembl.org"]
+# Maximum number of keep-alive connections per host
+HTTP_POOL_MAXSIZE = 10
+# Host-specific connection pool sizes
+HTTP_POOL_SIZES = {
+    "rest.ensembl.org": 15,
+    "rest.uniprot.org": 10,
+    "www.ebi.ac.uk": 10,
+    "www.ncbi.nlm.nih.gov": 4,
+    "blast.ncbi.nlm.nih.gov": 2,
+    "maayanlab.cloud": 4,
+    "genome.ucsc.edu": 2,
+    # gget ref downloads (DOWNLOAD_WORKERS files x DOWNLOAD_RANGE_PARTS range requests)
+    "ftp.ensembl.org": 16,
+    "ftp.ensemblgenomes.org": 16,
+}
+
 # Ensembl REST API server for gget seq and info
 ENSEMBL_REST_API = "http://rest.ensembl.org/"
 ENSEMBL_FTP_URL = "http://ftp.ensembl.org/pub/"
 # Non-vertebrate server
 ENSEMBL_FTP_URL_NV = "http://ftp.ensemblgenomes.org/pub/"
+# Maximum number of IDs per POST request to the Ensembl REST API
+# (https://github.com/Ensembl/ensembl-rest/wiki/POST-Requests)
+ENSEMBL_LOOKUP_BATCH_SIZE = 1000
+# Maximum number of IDs per POST sequence/id request (gget seq)
+# (https://rest.ensembl.org/documentation/info/sequence_id_post)
+ENSEMBL_SEQUENCE_BATCH_SIZE = 50
+
+# Public Ensembl MySQL server for gget search
+# (ports are tried in this order)
+ENSEMBL_MYSQL_HOST = "mysql-eg-publicsql.ebi.ac.uk"
+ENSEMBL_MYSQL_PORTS = [3306, 4157]
+ENSEMBL_MYSQL_USER = "anonymous"
+# Maximum number of idle connections kept open per database
+MYSQL_POOL_MAX_IDLE = 2
+
+# Native downloader for gget ref (see download.py)
+# Number of files downloaded concurrently
+DOWNLOAD_WORKERS = 4
+# Number of parallel HTTP range requests per large file
+DOWNLOAD_RANGE_PARTS = 4
+# Minimum file size (in bytes) from which a file is split into range requests
+DOWNLOAD_MIN_RANGE_SIZE = 64 * 1024**2
+DOWNLOAD_CHUNK_SIZE = 1024**2
+# Seconds without data after which a download is resumed with a new request
+DOWNLOAD_TIMEOUT = 60
 
 # NCBI URL for gget info
 NCBI_URL = "https://www.ncbi.nlm.nih.gov"
+# NCBI E-utilities (taxonomy common names for gget blast)
+NCBI_EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
 
 # UniProt REST API server for gget seq and info
 UNIPROT_REST_API = "https://rest.uniprot.org/uniprotkb/search?query="
 UNIPROT_IDMAPPING_API = "https://rest.uniprot.org/idmapping"
+# Number of IDs from which a single UniProt ID mapping job is used
+# instead of one search request per ID
+UNIPROT_IDMAPPING_MIN_IDS = 10
+# Maximum number of IDs per ID mapping job
+UNIPROT_IDMAPPING_BATCH_SIZE = 100000
+# Number of entries per page of ID mapping results
+UNIPROT_IDMAPPING_PAGE_SIZE = 500
+# Seconds between ID mapping job status requests
+UNIPROT_IDMAPPING_POLL_INTERVAL = 3
 
 # RCSB PDB API for gget pdb
 RCSB_PDB_API = "https://data.rcsb.org/rest/v1/core/"
@@ -23,6 +88,18 @@ ENS_TO_PDB_API = "https://www.ebi.ac.uk/pdbe/aggregated-api/mappings/ensembl_to_
 BLAST_URL = "https://blast.ncbi.nlm.nih.gov/Blast.cgi"
 # Generate a random UUID
 BLAST_CLIENT = "gget_client-" + str(uuid.uuid4())
+# Maximum number of searches (RIDs) per client running on the BLAST server at the same time
+BLAST_MAX_RIDS = 10
+# Minimum number of seconds before the first status request of a search
+BLAST_MIN_WAIT = 11
+# Do not poll for any single RID more often than once a minute
+BLAST_POLL_INTERVAL = 61
+# Factor by which the interval between status requests of a search grows after each request
+BLAST_POLL_BACKOFF = 1.5
+# Maximum number of seconds between status requests of a search
+BLAST_MAX_POLL_INTERVAL = 300
+# Number of finished searches used to estimate the completion time from the RTOE
+BLAST_RTOE_HISTORY = 20
 
 # MUSCLE Github repo
 MUSCLE_GITHUB_LINK = "https://github.com/rcedgar/muscle.git"
@@ -43,5 +120,52 @@ ELM_INSTANCES_TSV_DOWNLOAD = "http://elm.eu.org/instances.tsv?q=*&taxon=&instanc
 ELM_CLASSES_TSV_DOWNLOAD = "http://elm.eu.org/elms/elms_index.tsv"
 ELM_INTDOMAINS_TSV_DOWNLOAD = "http://elm.eu.org/interactiondomains.tsv"
 
+# UCSC BLAT server
+BLAT_URL = "https://genome.ucsc.edu/cgi-bin/hgBlat"
+# Number of BLAT requests sent at the same time when several sequences are passed
+BLAT_WORKERS = 2
+# Maximum number of BLAT requests per day (UCSC usage policy)
+BLAT_MAX_DAILY = 5000
+
 # COSMIC API endpoint
 COSMIC_GET_URL = "https://cancer.sanger.ac.uk/cosmic/search/"
+
+# Default request rate limits per host (see utils.RateLimiter) in the format
+# {URL or host: (requests per second, burst size)}
+RATE_LIMITS = {
+    # https://github.com/Ensembl/ensembl-rest/wiki/Rate-Limits
+    ENSEMBL_REST_API: (15, 15),
+    UNIPROT_REST_API: (10, 10),
+    # https://www.ncbi.nlm.nih.gov/books/NBK25497/
+    NCBI_URL: (3, 3),
+    NCBI_EUTILS_URL: (3, 3),
+    # Do not contact the BLAST server more often than once every 10 seconds
+    # https://blast.ncbi.nlm.nih.gov/doc/blast-help/developerinfo.html
+    BLAST_URL: (0.1, 1),
+    POST_ENRICHR_URL: (5, 5),
+    # Program-driven use of BLAT is limited to one hit every 15 seconds
+    # https://genome.ucsc.edu/FAQ/FAQblat.html#blat2
+    BLAT_URL: (1 / 15, 1),
+}
+
+# Persistent on-disk response cache (see cache.py)
+# Environment variable to enable the cache (1 or path to cache directory)
+CACHE_ENV_VAR = "GGET_CACHE"
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gget")
+# Maximum cache size in bytes (least recently used entries are evicted first)
+CACHE_MAX_SIZE = 1024**3
+# Time to live (in seconds) of cached responses per endpoint
+# (None = entries do not expire)
+CACHE_TTLS = {
+    # Latest Ensembl release number (part of all other cache keys)
+    "ensembl_release": 24 * 60 * 60,
+    # Ensembl FTP directory listings (species and databases per release)
+    "ensembl_ftp": 7 * 24 * 60 * 60,
+    "ensembl_rest": 30 * 24 * 60 * 60,
+    "uniprot": 7 * 24 * 60 * 60,
+    "pdbe": 7 * 24 * 60 * 60,
+    "ncbi": 7 * 24 * 60 * 60,
+}
+
+# Directory for local gget search indices (see search_index.py)
+SEARCH_INDEX_DIR = os.path.join(CACHE_DIR, "search_index")
@@ -0,0 +1,361 @@
+import os
+import math
+import time
+import shutil
+import logging
+import subprocess
+from concurrent import futures
+
+# Add and format time stamp in logging messages
+logging.basicConfig(
+    format="%(asctime)s %(levelname)s %(message)s",
+    level=logging.INFO,
+    datefmt="%c",
+)
+# Mute numexpr threads info
+logging.getLogger("numexpr").setLevel(logging.WARNING)
+
+import requests
+from tqdm import tqdm
+
+# Custom functions
+from .utils import get_session, get_host
+from .cache import cached
+
+# Constants
+from .constants import (
+    HTTP_RETRIES,
+    HTTP_BACKOFF_FACTOR,
+    HTTP_POOL_MAXSIZE,
+    HTTP_POOL_SIZES,
+    DOWNLOAD_WORKERS,
+    DOWNLOAD_RANGE_PARTS,
+    DOWNLOAD_MIN_RANGE_SIZE,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_TIMEOUT,
+)
+
+
+def parse_checksums(text):
+    """
+    Parse an Ensembl CHECKSUMS file (output of the BSD 'sum' command).
+    Returns a dictionary in the format {filename: (checksum, number of 1 kB blocks)}.
+    """
+    checksums = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[0].isdigit() and fields[1].isdigit():
+            checksums[fields[2]] = (int(fields[0]), int(fields[1]))
+    return checksums
+
+
+@cached("ensembl_ftp", release=False, memory=True)
+def get_checksums(directory_url):
+    """
+    Fetch the CHECKSUMS file Ensembl publishes in each FTP directory.
+    Returns a dictionary in the format {filename: (checksum, number of 1 kB blocks)}
+    (empty if the directory does not contain a CHECKSUMS file).
+    """
+    r = get_session().get(directory_url.rstrip("/") + "/CHECKSUMS")
+    if r.status_code == 404:
+        return {}
+    if r.status_code != 200:
+        raise RuntimeError(
+            f"HTTP response status code {r.status_code}. Please try again.\n"
+        )
+    return parse_checksums(r.text)
+
+
+def bsd_sum(path):
+    """
+    Returns the BSD checksum and the number of 1 kB blocks of a file
+    (same as the 'sum' command used to generate the Ensembl CHECKSUMS files).
+    """
+    # The sum command is much faster than the pure Python implementation below
+    if shutil.which("sum"):
+        try:
+            out = subprocess.run(
+                ["sum", path], capture_output=True, text=True, check=True
+            ).stdout.split()
+            return int(out[0]), int(out[1])
+        except (subprocess.CalledProcessError, ValueError, IndexError):
+            pass
+
+    # Each step rotates the checksum right by one bit and adds the next byte. Since the
+    # carries of the additions feed into the next rotation, the steps cannot be computed
+    # independently (vectorized). Instead, the unmasked sum is carried over and the
+    # masking and rotation are looked up in a single table, so each byte takes one
+    # lookup and one addition.
+    checksum = 0
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            size += len(chunk)
+            for byte in chunk:
+                checksum = _ROTATE[checksum] + byte
+
+    return checksum & 0xFFFF, math.ceil(size / 1024)
+
+
+# Rotation right by one bit of the lower 16 bits of all sums of a
+# 16-bit checksum and a byte (see bsd_sum)
+_ROTATE = [((x & 0xFFFF) >> 1) + ((x & 1) << 15) for x in range(0x10000 + 0xFF)]
+
+
+def remote_file_info(url):
+    """
+    Returns the size of a remote file in bytes (None if unknown) and
+    whether the server supports HTTP range requests.
+    """
+    r = get_session().head(url, allow_redirects=True)
+    if r.status_code != 200:
+        raise RuntimeError(
+            f"HTTP response status code {r.status_code} for {url}. Please try again.\n"
+        )
+    size = r.headers.get("Content-Length")
+    size = int(size) if size and size.isdigit() else None
+    return size, r.headers.get("Accept-Ranges") == "bytes"
+
+
+def _fetch_range(url, part_path, start, end, pbar):
+    """
+    Download bytes start to end (inclusive; end=None -> end of file) of a file to part_path.
+    Bytes already present in part_path are not downloaded again, and interrupted
+    transfers are resumed from where they stopped.
+    """
+    error = None
+    for attempt in range(HTTP_RETRIES + 1):
+        done = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if end is not None and done >= end - start + 1:
+            return
+
+        headers = {}
+        if start + done > 0 or end is not None:
+            headers["Range"] = f"bytes={start + done}-{'' if end is None else end}"
+
+        try:
+            with get_session().get(
+                url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+            ) as r:
+                # Requested range starts at the end of the file (already complete)
+                if r.status_code == 416 and end is None:
+                    return
+                if r.status_code not in [200, 206]:
+                    raise RuntimeError(
+                        f"HTTP response status code {r.status_code} for {url}."
+                    )
+
+                mode = "ab"
+                # Number of bytes still missing (None -> until the end of the file)
+                remaining = None if end is None else end - start + 1 - done
+                if headers and r.status_code == 200:
+                    # The server ignored the range request and sends the whole file,
+                    # restart from scratch (and only keep the bytes of this range)
+                    if start > 0:
+                        raise RuntimeError(
+                            f"The server does not support range requests for {url}."
+                        )
+                    mode = "wb"
+                    pbar.update(-done)
+                    remaining = None if end is None else end + 1
+
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        if remaining is not None:
+                            chunk = chunk[:remaining]
+                            remaining -= len(chunk)
+                        f.write(chunk)
+                        pbar.update(len(chunk))
+                        if remaining == 0:
+                            break
+
+            if end is None:
+                return
+
+            # The server sent less than the requested range, request the rest
+            received = os.path.getsize(part_path)
+            if received < end - start + 1:
+                error = f"received {received} of {end - start + 1} bytes (bytes {start}-{end})"
+                time.sleep(HTTP_BACKOFF_FACTOR * (2**attempt))
+
+        except requests.exceptions.RequestException as e:
+            error = e
+            time.sleep(HTTP_BACKOFF_FACTOR * (2**attempt))
+
+    raise RuntimeError(f"Download of {url} failed: {error}")
+
+
+def download_file(
+    url,
+    out_dir=".",
+    parts=DOWNLOAD_RANGE_PARTS,
+    checksums=True,
+    verbose=True,
+    position=None,
+):
+    """
+    Download a file, splitting large files into parallel HTTP range requests.
+
+    Partial downloads (saved as <filename>.part*) are resumed, and files that are already
+    complete are not downloaded again. If checksums=True, the file is verified against
+    the CHECKSUMS file in the same Ensembl FTP directory (if available).
+
+    Args:
+    - url           URL of the file.
+    - out_dir       Directory the file is saved in (default: current directory).
+    - parts         Number of parallel range requests for files larger than
+                    DOWNLOAD_MIN_RANGE_SIZE (default: 4).
+    - checksums     True/False whether to verify the file against the Ensembl CHECKSUMS file (default: True).
+    - verbose       True/False whether to print progress information (default: True).
+    - position      Line of the progress bar (used when several files are downloaded at once).
+
+    Returns the path to the downloaded file.
+    """
+    filename = url.split("/")[-1]
+    path = os.path.join(out_dir, filename)
+
+    size, accepts_ranges = remote_file_info(url)
+    expected = None
+    if checksums:
+        expected = get_checksums(url.rsplit("/", 1)[0]).get(filename)
+
+    # Skip files that were downloaded before
+    if os.path.exists(path) and size is not None and os.path.getsize(path) == size:
+        if expected is None or bsd_sum(path) == expected:
+            if verbose:
+                logging.info(f"{filename} was already downloaded.")
+            return path
+
+    # Split large files into parallel range requests
+    if accepts_ranges and size and size >= DOWNLOAD_MIN_RANGE_SIZE and parts > 1:
+        step = math.ceil(size / parts)
+        ranges = [
+            (start, min(start + step, size) - 1) for start in range(0, size, step)
+        ]
+        part_paths = [f"{path}.part{i}" for i in range(len(ranges))]
+    else:
+        ranges = [(0, size - 1 if size else None)]
+        part_paths = [f"{path}.part"]
+
+    # Bytes downloaded before (resumed downloads)
+    initial = sum(
+        min(os.path.getsize(part_path), end - start + 1 if end is not None else math.inf)
+        for part_path, (start, end) in zip(part_paths, ranges)
+        if os.path.exists(part_path)
+    )
+
+    with tqdm(
+        total=size,
+        initial=initial,
+        unit="B",
+        unit_scale=True,
+        unit_divisor=1024,
+        desc=filename,
+        position=position,
+        disable=not verbose,
+    ) as pbar:
+        if len(ranges) == 1:
+            _fetch_range(url, part_paths[0], *ranges[0], pbar)
+        else:
+            with futures.ThreadPoolExecutor(len(ranges)) as executor:
+                for future in [
+                    executor.submit(_fetch_range, url, part_path, start, end, pbar)
+                    for part_path, (start, end) in zip(part_paths, ranges)
+                ]:
+                    future.result()
+
+    # Join the parts
+    os.replace(part_paths[0], path)
+    if len(part_paths) > 1:
+        with open(path, "ab") as f:
+            for part_path in part_paths[1:]:
+                with open(part_path, "rb") as part:
+                    shutil.copyfileobj(part, f)
+                os.remove(part_path)
+
+    downloaded = os.path.getsize(path)
+    if size is not None and downloaded != size:
+        os.remove(path)
+        raise RuntimeError(
+            f"Download of {filename} is incomplete ({downloaded} of {size} bytes)."
+        )
+
+    if expected is not None:
+        if bsd_sum(path) != expected:
+            os.remove(path)
+            raise RuntimeError(
+                f"Checksum of {filename} does not match the Ensembl CHECKSUMS file. Please try again."
+            )
+        if verbose:
+            logging.info(f"{filename} matches the Ensembl CHECKSUMS file.")
+
+    return path
+
+
+def download_files(
+    urls,
+    out_dir=".",
+    workers=DOWNLOAD_WORKERS,
+    parts=DOWNLOAD_RANGE_PARTS,
+    checksums=True,
+    verbose=True,
+):
+    """
+    Download several files concurrently (see download_file).
+
+    Args:
+    - urls          List of URLs (empty strings are ignored).
+    - out_dir       Directory the files are saved in (default: current directory),
+                    or a list with one directory per URL.
+    - workers       Number of files downloaded at the same time (default: 4).
+    - parts         Number of parallel range requests per large file (default: 4).
+    - checksums     True/False whether to verify the files against the Ensembl CHECKSUMS files (default: True).
+    - verbose       True/False whether to print progress information (default: True).
+
+    Returns a list of paths to the downloaded files.
+    """
+    if isinstance(out_dir, str):
+        out_dir = [out_dir] * len(urls)
+    out_dirs = [directory for url, directory in zip(urls, out_dir) if url]
+    urls = [url for url in urls if url]
+    for directory in set(out_dirs):
+        os.makedirs(directory, exist_ok=True)
+
+    # Limit the number of range requests, so that all connections fit into the
+    # connection pool of the server (otherwise, connections are discarded)
+    workers = max(1, min(workers, len(urls)))
+    pool_size = min(
+        [HTTP_POOL_SIZES.get(get_host(url), HTTP_POOL_MAXSIZE) for url in urls],
+        default=HTTP_POOL_MAXSIZE,
+    )
+    parts = max(1, min(parts, pool_size // workers))
+
+    with futures.ThreadPoolExecutor(workers) as executor:
+        future_paths = [
+            executor.submit(
+                download_file,
+                url,
+                out_dir=directory,
+                parts=parts,
+                checksums=checksums,
+                verbose=verbose,
+                position=i,
+            )
+            for i, (url, directory) in enumerate(zip(urls, out_dirs))
+        ]
+
+    paths = []
+    failed = []
+    for url, future in zip(urls, future_paths):
+        try:
+            paths.append(future.result())
+        except Exception as e:
+            logging.error(f"{e}")
+            failed.append(url.split("/")[-1])
+
+    if failed:
+        raise RuntimeError(
+            f"The following files could not be downloaded: {', '.join(failed)}"
+        )
+
+    return paths
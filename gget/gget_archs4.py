@@ -1,4 +1,3 @@
-import requests
 import pandas as pd
 import json as json_package
 import io
@@ -15,6 +14,7 @@ logging.getLogger("numexpr").setLevel(logging.WARNING)
 
 # Custom functions
 from .gget_info import info
+from .utils import get_session
 
 # Constants
 from .constants import GENECORR_URL, EXPRESSION_URL
@@ -107,7 +107,7 @@ def archs4(
         # Dictionary with arguments
         json_dict = {"id": gene, "count": gene_count}
 
-        r = requests.post(url=GENECORR_URL, json=json_dict)
+        r = get_session().post(url=GENECORR_URL, json=json_dict)
 
         if not r.ok:
             raise RuntimeError(
@@ -170,7 +170,7 @@ def archs4(
         url = EXPRESSION_URL + query
 
         # Submit API query
-        r = requests.post(url=url, headers={"Content-Type": "application/json"})
+        r = get_session().post(url=url, headers={"Content-Type": "application/json"})
 
         if not r.ok:
             raise RuntimeError(
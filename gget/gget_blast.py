@@ -1,7 +1,10 @@
+import os
+import re
+import asyncio
+import statistics
 import pandas as pd
 import json as json_package
 import time
-from bs4 import BeautifulSoup
 import logging
 
 # Add and format time stamp in logging messages
@@ -13,145 +16,118 @@ logging.basicConfig(
 # Mute numexpr threads info
 logging.getLogger("numexpr").setLevel(logging.WARNING)
 
-# Using urllib instead of requests here because requests does not
-# support long queries (queries very long here due to input sequence)
-from urllib.request import urlopen, Request
-from urllib.parse import urlencode
-
 # Custom functions
-from .utils import parse_blast_ref_page, wrap_cols_func
+from .utils import parse_blast_ref_page, wrap_cols_func, get_session, format_evalue
+from .blast_local import run_local_blast
+from .cache import cached
 
 # Constants
 from .constants import (
     BLAST_URL,
     BLAST_CLIENT,
+    NCBI_EUTILS_URL,
+    BLAST_MAX_RIDS,
+    BLAST_MIN_WAIT,
+    BLAST_POLL_INTERVAL,
+    BLAST_POLL_BACKOFF,
+    BLAST_MAX_POLL_INTERVAL,
+    BLAST_RTOE_HISTORY,
 )
 
+# Valid program and database options
+PROGRAMS = ["blastn", "blastp", "blastx", "tblastn", "tblastx"]
+DATABASES = ["nt", "nr", "refseq_rna", "refseq_protein", "swissprot", "pdbaa", "pdbnt"]
 
-def blast(
-    sequence,
-    program="default",
-    database="default",
-    limit=50,
-    expect=10.0,
-    low_comp_filt=False,
-    megablast=True,
-    verbose=True,
-    wrap_text=False,
-    json=False,
-    save=False,
-):
-    """
-    BLAST a nucleotide or amino acid sequence against any BLAST DB.
-    Args:
-     - sequence       Sequence (str) or path to FASTA file.
-                      (If more than one sequence in FASTA file, only the first will be submitted to BLAST.)
-     - program        'blastn', 'blastp', 'blastx', 'tblastn', or 'tblastx'.
-                      Default: 'blastn' for nucleotide sequences; 'blastp' for amino acid sequences.
-     - database       'nt', 'nr', 'refseq_rna', 'refseq_protein', 'swissprot', 'pdbaa', or 'pdbnt'.
-                      Default: 'nt' for nucleotide sequences; 'nr' for amino acid sequences.
-                      More info on BLAST databases: https://ncbi.github.io/blast-cloud/blastdb/available-blastdbs.html
-     - limit          Limits number of hits to return. Default 50.
-     - expect         float or None. An expect value cutoff. Default 10.0.
-     - low_comp_filt  True/False whether to apply low complexity filter. Default False.
-     - megablast      True/False whether to use the MegaBLAST algorithm (blastn only). Default True.
-     - verbose        True/False whether to print progress information. Default True.
-     - wrap_text      If True, displays data frame with wrapped text for easy reading. Default: False.
-     - json           If True, returns results in json format instead of data frame. Default: False.
-     - save           If True, the data frame is saved as a csv in the current directory (default: False).
-     - verbose        True/False whether to print progress information. Default True.
-
-    Returns a data frame with the BLAST results.
-
-    NCBI server rule:
-    Run scripts weekends or between 9 pm and 5 am Eastern time
-    on weekdays if more than 50 searches will be submitted.
 
-    Note: This function does not check the validity of the arguments
-    and passes the values to the server as is.
+def read_queries(sequence):
     """
-    # Server rules:
-    # 1. Do not contact the server more often than once every 10 seconds.
-    # 2. Do not poll for any single RID more often than once a minute.
-    # 3. Use the URL parameter email and tool, so that the NCBI
-    #    can contact you if there is a problem.
-    # 4. Run scripts weekends or between 9 pm and 5 am Eastern time
-    #    on weekdays if more than 50 searches will be submitted.
-    # Reference: https://blast.ncbi.nlm.nih.gov/Blast.cgi?CMD=Web&PAGE_TYPE=BlastDocs&DOC_TYPE=DeveloperInfo
+    Returns the queries passed to gget blast as a list of (query ID, sequence) tuples.
 
-    # Please note that NCBI uses the new Common URL API for BLAST searches
-    # on the internet (http://ncbi.github.io/blast-cloud/dev/api.html). Thus,
-    # some of the arguments used by this function are not (or are no longer)
-    # officially supported by NCBI. Although they are still functioning, this
-    # may change in the future.
-
-    # Define server URL and client
-    url = BLAST_URL
-    client = BLAST_CLIENT
+    Args:
+    - sequence    Sequence (str), list of sequences or path to a FASTA/text file.
+                  Query IDs are taken from the FASTA title lines (first word after '>'),
+                  otherwise queries are numbered in the format 'query_1', 'query_2', ...
+                  Repeated query IDs are made unique with a suffix ('_2', '_3', ...).
+    """
+    if not isinstance(sequence, str):
+        return [(f"query_{i + 1}", seq) for i, seq in enumerate(sequence)]
 
-    ## Clean up arguments
     # If the path to a fasta file was provided instead of a nucleotide sequence,
-    # read the file and extract the first sequence
-    if "." in sequence:
-        if ".txt" in sequence:
-            # Read the text file
-            titles = []
-            seqs = []
-            with open(sequence) as text_file:
-                for i, line in enumerate(text_file):
-                    # Recognize a title line by the '>' character
-                    if line[0] == ">":
+    # read the file and extract all sequences
+    if "." not in sequence:
+        return [("query_1", sequence)]
+
+    if ".txt" in sequence:
+        # Read the text file
+        titles = []
+        seqs = []
+        with open(sequence) as text_file:
+            for i, line in enumerate(text_file):
+                # Recognize a title line by the '>' character
+                if line[0] == ">":
+                    # Append title line to titles list
+                    titles.append(line.strip())
+                else:
+                    seqs.append(line.strip())
+
+    elif ".fa" in sequence:
+        # Read the FASTA
+        titles = []
+        seqs = []
+        with open(sequence) as fasta_file:
+            for i, line in enumerate(fasta_file):
+                # Each second line will be a title line
+                if i % 2 == 0:
+                    if line[0] != ">":
+                        raise ValueError(
+                            "Expected FASTA to start with a '>' character. "
+                        )
+                    else:
                         # Append title line to titles list
                         titles.append(line.strip())
+                else:
+                    if line[0] == ">":
+                        raise ValueError(
+                            "FASTA contains two lines starting with '>' in a row -> missing sequence line. "
+                        )
+                    # Append sequences line to seqs list
                     else:
                         seqs.append(line.strip())
-
-        elif ".fa" in sequence:
-            # Read the FASTA
-            titles = []
-            seqs = []
-            with open(sequence) as fasta_file:
-                for i, line in enumerate(fasta_file):
-                    # Each second line will be a title line
-                    if i % 2 == 0:
-                        if line[0] != ">":
-                            raise ValueError(
-                                "Expected FASTA to start with a '>' character. "
-                            )
-                        else:
-                            # Append title line to titles list
-                            titles.append(line.strip())
-                    else:
-                        if line[0] == ">":
-                            raise ValueError(
-                                "FASTA contains two lines starting with '>' in a row -> missing sequence line. "
-                            )
-                        # Append sequences line to seqs list
-                        else:
-                            seqs.append(line.strip())
-        else:
-            raise ValueError(
-                "File format not recognized. gget BLAST currently only supports '.txt' or '.fa' files. "
-            )
-
-        # Set the first sequence from the fasta file as 'sequence'
-        sequence = seqs[0]
-        if len(seqs) > 1:
-            logging.warning(
-                "File contains more than one sequence. Only the first sequence will be submitted to BLAST."
-            )
-
-    # Convert sequence to upper case
-    sequence = sequence.upper()
-
-    ## Set program and database
-
+    else:
+        raise ValueError(
+            "File format not recognized. gget currently only supports '.txt' or '.fa' files. "
+        )
+
+    query_ids = []
+    seen = set()
+    for i in range(len(seqs)):
+        title = titles[i][1:].split() if i < len(titles) else []
+        query_id = title[0] if title else f"query_{i + 1}"
+        # Make repeated titles unique so that no results are overwritten
+        n = 1
+        unique_id = query_id
+        while unique_id in seen:
+            n += 1
+            unique_id = f"{query_id}_{n}"
+        seen.add(unique_id)
+        query_ids.append(unique_id)
+
+    return list(zip(query_ids, seqs))
+
+
+def blast_program(
+    sequence, program="default", database="default", verbose=True, databases=DATABASES
+):
+    """
+    Returns the BLAST program and database for a sequence (or the concatenated sequences of all queries).
+    If the program is not specified, it is chosen based on whether the sequence
+    is a nucleotide or amino acid sequence.
+    If 'databases' is None (local BLAST+), the database is a path and is not checked.
+    """
     # Convert program and database to lower case
     program = program.lower()
-    database = database.lower()
-    # Valid program and database options
-    programs = ["blastn", "blastp", "blastx", "tblastn", "tblastx"]
-    dbs = ["nt", "nr", "refseq_rna", "refseq_protein", "swissprot", "pdbaa", "pdbnt"]
+    if databases is not None:
+        database = database.lower()
 
     # If user does not specify the program,
     # check if a nulceotide or amino acid sequence was passed
@@ -172,9 +148,9 @@ def blast(
                     logging.info("BLAST will use program 'blastn' with database 'nt'.")
             else:
                 # Check if the user specified database is valid
-                if database not in dbs:
+                if databases is not None and database not in databases:
                     raise ValueError(
-                        f"Database specified is {database}. Expected one of: {', '.join(dbs)}"
+                        f"Database specified is {database}. Expected one of: {', '.join(databases)}"
                     )
 
                 else:
@@ -195,9 +171,9 @@ def blast(
                     logging.info("BLAST will use program 'blastp' with database 'nr'.")
             else:
                 # Check if the user specified database is valid
-                if database not in dbs:
+                if databases is not None and database not in databases:
                     raise ValueError(
-                        f"Database specified is {database}. Expected one of: {', '.join(dbs)}"
+                        f"Database specified is {database}. Expected one of: {', '.join(databases)}"
                     )
 
                 else:
@@ -211,33 +187,50 @@ def blast(
                 f"""
                 Sequence not automatically recognized as a nucleotide or amino acid sequence.
                 Please specify 'program' and 'database'.
-                Program options: {', '.join(programs)} 
-                Database options:  {', '.join(dbs)} 
+                Program options: {', '.join(PROGRAMS)}
+                Database options:  {', '.join(DATABASES)}
                 """
             )
 
     else:
         # Check if the user specified program is valid
-        if program not in programs:
+        if program not in PROGRAMS:
             raise ValueError(
-                f"Program specified is {program}. Expected one of: {', '.join(programs)}"
+                f"Program specified is {program}. Expected one of: {', '.join(PROGRAMS)}"
             )
 
         # Ask user to also specify database
         if database == "default":
             raise ValueError(
                 f"""
-                User-specified program requires user-specified database. Please also specify argument 'database'. 
-                Database options:  {', '.join(dbs)}
+                User-specified program requires user-specified database. Please also specify argument 'database'.
+                Database options:  {', '.join(DATABASES)}
                 """
             )
         else:
             # Check if the user specified database is valid
-            if database not in dbs:
+            if databases is not None and database not in databases:
                 raise ValueError(
-                    f"Database specified is {database}. Expected one of: {', '.join(dbs)}"
+                    f"Database specified is {database}. Expected one of: {', '.join(databases)}"
                 )
 
+    return program, database
+
+
+def submit_search(
+    sequence,
+    program,
+    database,
+    limit=50,
+    expect=10.0,
+    low_comp_filt=False,
+    megablast=True,
+):
+    """
+    Submit a search to the NCBI BLAST server.
+
+    Returns the request ID (RID) and the estimated time to completion in seconds (RTOE).
+    """
     ## Translate filter arguments
     if low_comp_filt is False:
         low_comp_filt = None
@@ -270,126 +263,753 @@ def blast(
     ]
 
     # Define query
+    # (The query is sent in the body of a POST request since it can be very long due to the input sequence)
     put_query = [x for x in put_args if x[1] is not None]
-    put_message = urlencode(put_query).encode()
 
     # Submit search to server
-    request = Request(url, put_message, {"User-Agent": client})
-    handle = urlopen(request)
+    # (The shared session spaces out all requests to the BLAST server by at least 10 seconds)
+    r = get_session().post(BLAST_URL, data=put_query, headers={"User-Agent": BLAST_CLIENT})
 
     ## Fetch Request ID (RID) and estimated time to completion (RTOE)
-    RID, RTOE = parse_blast_ref_page(handle)
-
-    # Wait for search to complete
-    # (At least 11 seconds to comply with server rule 1)
-    if RTOE < 11:
-        # Communicate RTOE
-        if verbose:
-            logging.info(f"BLAST initiated. Estimated time to completion: 11 seconds.")
-        time.sleep(11)
-    else:
-        # Communicate RTOE
-        if verbose:
-            logging.info(
-                f"BLAST initiated with search ID {RID}. Estimated time to completion: {RTOE} seconds."
-            )
-        time.sleep(int(RTOE))
+    return parse_blast_ref_page(r.text)
+
+
+def get_status(RID):
+    """
+    Request the status of a search from the NCBI BLAST server
+    (only the search information is requested, not the results).
+
+    Returns the status ('WAITING', 'READY', 'FAILED' or 'UNKNOWN')
+    and True/False whether the search found any hits.
+    """
+    get_args = [
+        ("RID", RID),
+        ("FORMAT_OBJECT", "SearchInfo"),
+        ("CMD", "Get"),
+    ]
+
+    r = get_session().post(BLAST_URL, data=get_args, headers={"User-Agent": BLAST_CLIENT})
+    if not r.ok:
+        raise RuntimeError(
+            f"The NCBI BLAST server returned error status code {r.status_code} for search {RID}. Please try again later."
+        )
 
-    ## Poll server for status and fetch search results
-    # Args for the GET command
+    status = re.search(r"Status=(\w+)", r.text)
+    if status is None:
+        raise RuntimeError(
+            f"The NCBI BLAST server did not return the status of search {RID}. Please try again later."
+        )
+    there_are_hits = re.search(r"ThereAreHits=(\w+)", r.text)
+
+    return status.group(1), there_are_hits is not None and there_are_hits.group(1) == "yes"
+
+
+def get_results(RID, limit=50):
+    """
+    Fetch the results of a finished search from the NCBI BLAST server in JSON format.
+    """
     get_args = [
         ("RID", RID),
         ("DESCRIPTIONS", limit),
         ("HITLIST_SIZE", limit),
-        ("ALIGNMENTS", 0),
-        ("FORMAT_TYPE", "HTML"),
+        ("ALIGNMENTS", limit),
+        ("FORMAT_TYPE", "JSON2_S"),
         ("CMD", "Get"),
     ]
-    get_query = [x for x in get_args if x[1] is not None]
-    get_message = urlencode(get_query).encode()
-
-    ## Poll NCBI until the results are ready
-    searching = True
-    i = 0
-    while searching:
-        if i > 0:
-            # Sleep for 61 seconds if first fetch was not succesful
-            # to comply with server rules
-            time.sleep(61)
-
-        # Query for search status
-        request = Request(url, get_message, {"User-Agent": client})
-        handle = urlopen(request)
-        results = handle.read().decode()
-
-        # Fetch search status
-        i = results.index("Status=")
-        j = results.index("\n", i)
-        status = results[i + len("Status=") : j].strip()
+
+    r = get_session().post(BLAST_URL, data=get_args, headers={"User-Agent": BLAST_CLIENT})
+    if not r.ok:
+        raise RuntimeError(
+            f"The NCBI BLAST server returned error status code {r.status_code} for search {RID}. Please try again later."
+        )
+
+    return r.json()
+
+
+def _query_cover(hsps, query_len):
+    # Percentage of the query covered by the union of all HSPs
+    covered = 0
+    last_end = 0
+    for start, end in sorted(
+        (min(hsp["query_from"], hsp["query_to"]), max(hsp["query_from"], hsp["query_to"]))
+        for hsp in hsps
+    ):
+        start = max(start, last_end + 1)
+        if end >= start:
+            covered += end - start + 1
+            last_end = end
+    return covered / query_len * 100 if query_len else 0
+
+
+@cached("ncbi", release=False, memory=True)
+def get_common_names(taxids):
+    """
+    Fetch the common names of NCBI taxonomy IDs from the NCBI E-utilities.
+    Returns a dictionary {taxid: common name (None if not available)}.
+    """
+    r = get_session().get(
+        NCBI_EUTILS_URL + "esummary.fcgi",
+        params={
+            "db": "taxonomy",
+            "id": ",".join(str(taxid) for taxid in taxids),
+            "retmode": "json",
+        },
+    )
+    if not r.ok:
+        raise RuntimeError(
+            f"The NCBI E-utilities returned error status code {r.status_code}. Please try again later."
+        )
+    summaries = r.json().get("result", {})
+
+    return {
+        taxid: summaries.get(str(taxid), {}).get("commonname") or None for taxid in taxids
+    }
+
+
+def parse_results(results, RID):
+    """
+    Convert the JSON results of a search into a data frame with the columns of the
+    descriptions table on the BLAST website (returns None if no hits were found).
+    """
+    search = results["BlastOutput2"][0]["report"]["results"]["search"]
+    hits = search.get("hits", [])
+
+    if len(hits) == 0:
+        logging.error(
+            f"No significant similarity found for search {RID}. If your sequence is very short, try increasing the 'expect' argument."
+        )
+        return
+
+    rows = []
+    for hit in hits:
+        description = hit["description"][0]
+        hsps = hit["hsps"]
+        best_hsp = max(hsps, key=lambda hsp: hsp["bit_score"])
+
+        # Versioned accession, e.g. 'ref|NG_168413.1|' -> 'NG_168413.1'
+        accession = next(
+            (
+                field
+                for field in description.get("id", "").split("|")
+                if field.startswith(description["accession"] + ".")
+            ),
+            description["accession"],
+        )
+
+        rows.append(
+            {
+                "Description": description.get("title"),
+                "Scientific Name": description.get("sciname"),
+                # Not included in the JSON results (added below)
+                "Common Name": None,
+                "Taxid": description.get("taxid"),
+                "Max Score": round(best_hsp["bit_score"]),
+                "Total Score": round(sum(hsp["bit_score"] for hsp in hsps)),
+                "Query Cover": f"{round(_query_cover(hsps, search.get('query_len'))):d}%",
+                "E value": format_evalue(min(hsp["evalue"] for hsp in hsps)),
+                "Per. Ident": f"{best_hsp['identity'] / best_hsp['align_len'] * 100:.2f}%",
+                "Acc. Len": hit.get("len"),
+                "Accession": accession,
+            }
+        )
+
+    # Look up the common names of all species at once
+    taxids = sorted({row["Taxid"] for row in rows if row["Taxid"]})
+    if taxids:
+        try:
+            common_names = get_common_names(taxids)
+        except Exception as e:
+            logging.warning(f"Common names could not be fetched from NCBI Taxonomy: {e}")
+            common_names = {}
+        for row in rows:
+            row["Common Name"] = common_names.get(row["Taxid"])
+
+    return pd.DataFrame(rows)
+
+
+class PollSchedule:
+    """
+    Adaptive schedule of the status requests of BLAST searches.
+
+    The first status request of a search is sent when the search is expected to be done.
+    This estimate is based on the estimated time to completion (RTOE) returned by NCBI,
+    corrected by the ratio of actual to estimated completion time of previous searches.
+    If the search is still running, the interval between status requests starts at the
+    minimum allowed by NCBI (once a minute per search) and grows geometrically up to 'max_interval'.
+    """
+
+    def __init__(
+        self,
+        min_interval=BLAST_POLL_INTERVAL,
+        max_interval=BLAST_MAX_POLL_INTERVAL,
+        backoff=BLAST_POLL_BACKOFF,
+        history=BLAST_RTOE_HISTORY,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.history = history
+        # Ratios of actual to estimated completion time of previous searches
+        self.ratios = []
+
+    def first_poll(self, RTOE):
+        """
+        Returns the number of seconds after submission at which a search is first polled.
+        """
+        estimate = RTOE
+        if self.ratios:
+            estimate = max(RTOE, 1) * statistics.median(self.ratios)
+        return max(BLAST_MIN_WAIT, estimate)
+
+    def interval(self, polls):
+        """
+        Returns the number of seconds until the next status request after 'polls' unsuccessful requests.
+        """
+        return min(
+            self.max_interval, self.min_interval * self.backoff ** max(0, polls - 1)
+        )
+
+    def record(self, RTOE, elapsed):
+        """
+        Record the time a search took to complete (in seconds after submission).
+        """
+        self.ratios.append(elapsed / max(RTOE, 1))
+        del self.ratios[: -self.history]
+
+
+# Completion times are learned across all searches of a session
+POLL_SCHEDULE = PollSchedule()
+
+
+class BlastJob:
+    """
+    Search submitted to the NCBI BLAST server (see submit).
+
+    The status of the search is requested according to the poll schedule.
+    wait() blocks until the search is done (or a timeout is reached),
+    and cancel() stops polling the search. Jobs can also be awaited in asyncio
+    code, so that a single event loop can keep many searches in flight:
+
+        jobs = [submit(seq) for seq in sequences]
+        results = await asyncio.gather(*jobs)
+    """
+
+    def __init__(self, RID, RTOE, query_id=None, limit=50, schedule=None, submitted=None):
+        self.RID = RID
+        self.RTOE = RTOE
+        self.query_id = query_id if query_id is not None else RID
+        self.limit = limit
+        self.schedule = schedule or POLL_SCHEDULE
+        self.submitted = submitted if submitted is not None else time.time()
+        self.polls = 0
+        self.next_poll = self.submitted + self.schedule.first_poll(RTOE)
+        # 'WAITING', 'READY', 'FAILED', 'UNKNOWN' or 'CANCELLED'
+        self.state = "WAITING"
+        self.there_are_hits = None
+        self._results = None
+        self._collected = False
+
+    def __repr__(self):
+        return f"BlastJob(RID={self.RID!r}, query_id={self.query_id!r}, state={self.state!r})"
+
+    @property
+    def done(self):
+        return self.state != "WAITING"
+
+    def status(self):
+        """
+        Returns the status of the search: 'WAITING', 'READY', 'FAILED', 'UNKNOWN' or 'CANCELLED'.
+        The server is only contacted if the next status request is due according to the poll schedule.
+        """
+        if not self.done and time.time() >= self.next_poll:
+            self.poll()
+        return self.state
+
+    def poll(self):
+        """
+        Request the status of the search (without waiting for the poll schedule).
+        Returns the status.
+        """
+        if self.done:
+            return self.state
+
+        status, there_are_hits = get_status(self.RID)
+        self.polls += 1
 
         if status == "WAITING":
-            if verbose:
-                logging.info("BLASTING...")
-            i += 1
-            continue
+            self.next_poll = time.time() + self.schedule.interval(self.polls)
+        else:
+            self.state = status
+            self.there_are_hits = there_are_hits
+            if status == "READY":
+                self.schedule.record(self.RTOE, time.time() - self.submitted)
+
+        return self.state
+
+    def wait(self, timeout=None, verbose=False):
+        """
+        Poll the search according to the poll schedule until it is done.
+        Returns the status, or 'WAITING' if the search is not done after 'timeout' seconds.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.done:
+            if deadline is not None and self.next_poll > deadline:
+                time.sleep(max(0, deadline - time.time()))
+                break
+            time.sleep(max(0, self.next_poll - time.time()))
+            if self.poll() == "WAITING" and verbose:
+                logging.info(f"BLASTING {self.query_id}...")
+        return self.state
+
+    async def wait_async(self, timeout=None, verbose=False):
+        """
+        Asynchronous version of wait(): sleeps without blocking the event loop
+        (status requests are sent from a thread pool).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.done:
+            if deadline is not None and self.next_poll > deadline:
+                await asyncio.sleep(max(0, deadline - time.time()))
+                break
+            await asyncio.sleep(max(0, self.next_poll - time.time()))
+            if not self.done:
+                status = await loop.run_in_executor(None, self.poll)
+                if status == "WAITING" and verbose:
+                    logging.info(f"BLASTING {self.query_id}...")
+        return self.state
+
+    async def result_async(self, timeout=None):
+        """
+        Asynchronous version of result().
+        """
+        await self.wait_async(timeout=timeout)
+        if not self.done:
+            raise TimeoutError(
+                f"Search {self.RID} was not done after {timeout} seconds."
+            )
+        return await asyncio.get_running_loop().run_in_executor(None, self.result)
+
+    def __await__(self):
+        return self.result_async().__await__()
+
+    def cancel(self):
+        """
+        Stop polling the search. (NCBI does not support cancelling searches, the RID expires on the server.)
+        """
+        if not self.done:
+            self.state = "CANCELLED"
+
+    def result(self, timeout=None):
+        """
+        Wait for the search to be done (see wait) and return a data frame with the results
+        (or None if no hits were found or the search failed).
+        Raises a TimeoutError if the search is not done after 'timeout' seconds.
+        """
+        self.wait(timeout=timeout)
+        if not self.done:
+            raise TimeoutError(
+                f"Search {self.RID} was not done after {timeout} seconds."
+            )
+
+        # Results are only fetched once
+        if not self._collected:
+            self._results = self._collect()
+            self._collected = True
+        return self._results
 
-        elif status == "FAILED":
+    def _collect(self):
+        if self.state == "READY":
+            if self.there_are_hits:
+                return parse_results(get_results(self.RID, limit=self.limit), self.RID)
             logging.error(
-                f"Search {RID} failed; please try again and/or report to blast-help@ncbi.nlm.nih.gov."
+                f"No significant similarity found for search {self.RID}. If your sequence is very short, try increasing the 'expect' argument."
             )
-            return
 
-        elif status == "UNKNOWN":
-            logging.error(f"NCBI status {status}. Search {RID} expired.")
-            return
+        elif self.state == "FAILED":
+            logging.error(
+                f"Search {self.RID} failed; please try again and/or report to blast-help@ncbi.nlm.nih.gov."
+            )
 
-        elif status == "READY":
-            if verbose:
-                logging.info("Retrieving results...")
-            # Stop search
-            searching = False
-
-            ## Return results
-            # Parse HTML results
-            soup = BeautifulSoup(results, "html.parser")
-            # Get the descriptions table
-            dsc_table = soup.find(
-                lambda tag: tag.name == "table"
-                and tag.has_attr("id")
-                and tag["id"] == "dscTable"
+        elif self.state == "UNKNOWN":
+            logging.error(f"NCBI status {self.state}. Search {self.RID} expired.")
+
+        elif self.state == "CANCELLED":
+            logging.warning(f"Search {self.RID} was cancelled.")
+
+        else:
+            logging.error(
+                f"Something unexpected happened. Search {self.RID} possibly failed; please try again and/or report to blast-help@ncbi.nlm.nih.gov"
             )
 
-            if dsc_table is None:
-                logging.error(
-                    f"No significant similarity found for search {RID}. If your sequence is very short, try increasing the 'expect' argument."
+    def to_dict(self):
+        return {
+            "RID": self.RID,
+            "RTOE": self.RTOE,
+            "query_id": self.query_id,
+            "limit": self.limit,
+            "submitted": self.submitted,
+        }
+
+    @classmethod
+    def from_dict(cls, job_dict, schedule=None):
+        return cls(
+            job_dict["RID"],
+            job_dict["RTOE"],
+            query_id=job_dict.get("query_id"),
+            limit=job_dict.get("limit", 50),
+            schedule=schedule,
+            submitted=job_dict.get("submitted"),
+        )
+
+
+def save_jobs(jobs, jobs_file):
+    """
+    Add BLAST jobs to a JSON file (jobs already in the file are kept),
+    so that their results can still be collected after a restart (see load_jobs).
+    """
+    saved = {}
+    if os.path.exists(jobs_file):
+        with open(jobs_file, encoding="utf-8") as f:
+            saved = {job_dict["RID"]: job_dict for job_dict in json_package.load(f)}
+    for job in jobs:
+        saved[job.RID] = job.to_dict()
+
+    # Only replace the previous file once the new file was written completely
+    with open(jobs_file + ".tmp", "w", encoding="utf-8") as f:
+        json_package.dump(list(saved.values()), f, ensure_ascii=False, indent=4)
+    os.replace(jobs_file + ".tmp", jobs_file)
+
+
+def load_jobs(jobs_file, schedule=None):
+    """
+    Load the BLAST jobs saved in a JSON file (see submit and save_jobs).
+    Returns a list of BlastJob objects; their results can be collected as usual.
+    (NCBI keeps the results of a search for about 36 hours.)
+    """
+    with open(jobs_file, encoding="utf-8") as f:
+        return [BlastJob.from_dict(job_dict, schedule=schedule) for job_dict in json_package.load(f)]
+
+
+def submit(
+    sequence,
+    program="default",
+    database="default",
+    limit=50,
+    expect=10.0,
+    low_comp_filt=False,
+    megablast=True,
+    query_id=None,
+    jobs_file=None,
+    verbose=True,
+):
+    """
+    Submit a BLAST search without waiting for its results.
+
+    Args:
+    - sequence       Nucleotide or amino acid sequence (str).
+    - query_id       ID of the query (default: None -> the request ID (RID) of the search).
+    - jobs_file      Path to a JSON file the job is saved in (default: None -> not saved).
+                     Jobs saved in this file can be loaded with load_jobs, e.g. to collect
+                     their results after a crash.
+    (See gget.blast for the other arguments.)
+
+    Returns a BlastJob with the methods status(), wait(timeout), result(timeout) and cancel().
+    The job can also be awaited (await job) to get its results in asyncio code.
+    """
+    sequence = sequence.upper()
+    program, database = blast_program(sequence, program, database, verbose=verbose)
+
+    RID, RTOE = submit_search(
+        sequence,
+        program,
+        database,
+        limit=limit,
+        expect=expect,
+        low_comp_filt=low_comp_filt,
+        megablast=megablast,
+    )
+    job = BlastJob(RID, RTOE, query_id=query_id, limit=limit)
+
+    if verbose:
+        logging.info(
+            f"BLAST initiated with search ID {RID}. Estimated time to completion: {RTOE} seconds."
+        )
+
+    if jobs_file is not None:
+        save_jobs([job], jobs_file)
+
+    return job
+
+
+def run_searches(
+    queries,
+    program,
+    database,
+    limit=50,
+    expect=10.0,
+    low_comp_filt=False,
+    megablast=True,
+    max_rids=BLAST_MAX_RIDS,
+    max_poll_interval=BLAST_MAX_POLL_INTERVAL,
+    verbose=True,
+):
+    """
+    Run several BLAST searches on the NCBI BLAST server.
+
+    Searches are submitted one after another while at most 'max_rids' searches are running.
+    All running searches are polled from a single loop according to an adaptive poll schedule
+    (see PollSchedule). All requests to the server are spaced out by at least 10 seconds
+    by the shared session.
+
+    Args:
+    - queries             List of (query ID, sequence) tuples.
+    - max_rids            Maximum number of searches running at the same time (default: 10).
+    - max_poll_interval   Maximum number of seconds between status requests of a search (default: 300).
+    (See gget.blast for the other arguments.)
+
+    Returns a dictionary {query ID: data frame of results (or None if the search failed or found no hits)}.
+    Errors are raised if a single query is passed. If several queries are passed, errors of one search
+    are logged and do not abort the other searches.
+    """
+    schedule = POLL_SCHEDULE
+    if max_poll_interval != schedule.max_interval:
+        schedule = PollSchedule(max_interval=max_poll_interval)
+        schedule.ratios = POLL_SCHEDULE.ratios
+
+    pending = list(queries)
+    running = []
+    results = {}
+
+    while pending or running:
+        # Submit new searches while the maximum number of running searches is not reached
+        while pending and len(running) < max_rids:
+            query_id, sequence = pending.pop(0)
+            try:
+                RID, RTOE = submit_search(
+                    sequence,
+                    program,
+                    database,
+                    limit=limit,
+                    expect=expect,
+                    low_comp_filt=low_comp_filt,
+                    megablast=megablast,
+                )
+            except Exception as e:
+                if len(queries) == 1:
+                    raise
+                # Errors of one search do not abort the other searches
+                logging.error(f"BLAST search for {query_id} could not be submitted: {e}")
+                results[query_id] = None
+                continue
+            job = BlastJob(RID, RTOE, query_id=query_id, limit=limit, schedule=schedule)
+            running.append(job)
+            if verbose:
+                logging.info(
+                    f"BLAST initiated for {query_id} with search ID {RID}. "
+                    f"Estimated time to completion: {RTOE} seconds."
                 )
-                return
 
-            results_df = pd.read_html(str(dsc_table))[0]
-            # Drop the first column
-            results_df = results_df.iloc[:, 1:]
+        if not running:
+            continue
 
-            if wrap_text:
-                df_wrapped = results_df.copy()
-                wrap_cols_func(df_wrapped, ["Description"])
+        # Poll the search that is due next
+        job = min(running, key=lambda job: job.next_poll)
+        time.sleep(max(0, job.next_poll - time.time()))
 
-            if json:
-                results_dict = json_package.loads(results_df.to_json(orient="records"))
-                if save:
-                    with open("gget_blast_results.json", "w", encoding="utf-8") as f:
-                        json_package.dump(results_dict, f, ensure_ascii=False, indent=4)
+        try:
+            if job.poll() == "WAITING":
+                if verbose:
+                    logging.info(f"BLASTING {job.query_id}...")
+                continue
 
-                return results_dict
+            running.remove(job)
+            if verbose and job.state == "READY":
+                logging.info(f"Retrieving results for {job.query_id}...")
+            results[job.query_id] = job.result()
+        except Exception as e:
+            if len(queries) == 1:
+                raise
+            # Errors of one search do not abort the other searches
+            logging.error(f"BLAST search {job.RID} for {job.query_id} failed: {e}")
+            if job in running:
+                running.remove(job)
+            results[job.query_id] = None
 
-            else:
-                # Save
-                if save:
-                    results_df.to_csv("gget_blast_results.csv", index=False)
+    return results
 
-                return results_df
 
-        else:
-            logging.error(
-                f"Something unexpected happened. Search {RID} possibly failed; please try again and/or report to blast-help@ncbi.nlm.nih.gov"
-            )
+def blast(
+    sequence,
+    program="default",
+    database="default",
+    limit=50,
+    expect=10.0,
+    low_comp_filt=False,
+    megablast=True,
+    verbose=True,
+    wrap_text=False,
+    json=False,
+    save=False,
+    max_rids=BLAST_MAX_RIDS,
+    max_poll_interval=BLAST_MAX_POLL_INTERVAL,
+    backend="rest",
+    threads=1,
+    blast_bin=None,
+):
+    """
+    BLAST a nucleotide or amino acid sequence against any BLAST DB.
+    Args:
+     - sequence       Sequence (str), list of sequences or path to FASTA file.
+                      All sequences in a list or FASTA file are searched concurrently and
+                      the results are returned in one data frame with an additional 'query' column.
+     - program        'blastn', 'blastp', 'blastx', 'tblastn', or 'tblastx'.
+                      Default: 'blastn' for nucleotide sequences; 'blastp' for amino acid sequences.
+     - database       'nt', 'nr', 'refseq_rna', 'refseq_protein', 'swissprot', 'pdbaa', or 'pdbnt'.
+                      Default: 'nt' for nucleotide sequences; 'nr' for amino acid sequences.
+                      More info on BLAST databases: https://ncbi.github.io/blast-cloud/blastdb/available-blastdbs.html
+     - limit          Limits number of hits to return. Default 50.
+     - expect         float or None. An expect value cutoff. Default 10.0.
+     - low_comp_filt  True/False whether to apply low complexity filter. Default False.
+     - megablast      True/False whether to use the MegaBLAST algorithm (blastn only). Default True.
+     - verbose        True/False whether to print progress information. Default True.
+     - wrap_text      If True, displays data frame with wrapped text for easy reading. Default: False.
+     - json           If True, returns results in json format instead of data frame. Default: False.
+     - save           If True, the data frame is saved as a csv in the current directory (default: False).
+     - max_rids       Maximum number of searches running on the BLAST server at the same time
+                      when several sequences are passed. Default: 10.
+     - max_poll_interval  Maximum number of seconds between status requests of a search. Default: 300.
+                      Searches are first polled when they are expected to be done (based on NCBI's
+                      estimate and previous searches), then every 61 seconds with geometrically
+                      increasing intervals up to this ceiling.
+     - backend        'rest' (default): Submit searches to the NCBI BLAST server.
+                      'local': Run a local BLAST+ program (blastn, blastp, ...) against an on-disk database.
+                      All sequences are searched with a single call of the program.
+                      'database' is then the path to a BLAST database or to a (gzipped) FASTA file,
+                      from which a BLAST database is built with makeblastdb (saved next to the file).
+     - threads        Number of threads used by the local BLAST+ program (backend='local' only). Default: 1.
+     - blast_bin      Directory containing the BLAST+ programs (backend='local' only).
+                      Default: None -> programs are searched on the PATH.
+
+    Returns a data frame with the BLAST results.
+
+    NCBI server rule:
+    Run scripts weekends or between 9 pm and 5 am Eastern time
+    on weekdays if more than 50 searches will be submitted.
+
+    Note: This function does not check the validity of the arguments
+    and passes the values to the server as is.
+    """
+    # Server rules:
+    # 1. Do not contact the server more often than once every 10 seconds.
+    # 2. Do not poll for any single RID more often than once a minute.
+    # 3. Use the URL parameter email and tool, so that the NCBI
+    #    can contact you if there is a problem.
+    # 4. Run scripts weekends or between 9 pm and 5 am Eastern time
+    #    on weekdays if more than 50 searches will be submitted.
+    # Reference: https://blast.ncbi.nlm.nih.gov/Blast.cgi?CMD=Web&PAGE_TYPE=BlastDocs&DOC_TYPE=DeveloperInfo
+
+    # Please note that NCBI uses the new Common URL API for BLAST searches
+    # on the internet (http://ncbi.github.io/blast-cloud/dev/api.html). Thus,
+    # some of the arguments used by this function are not (or are no longer)
+    # officially supported by NCBI. Although they are still functioning, this
+    # may change in the future.
+
+    ## Clean up arguments
+    # Convert sequences to upper case
+    queries = [(query_id, seq.upper()) for query_id, seq in read_queries(sequence)]
+    if len(queries) == 0:
+        raise ValueError("No sequences were found in the input.")
+    if backend not in ["rest", "local"]:
+        raise ValueError(
+            f"Backend specified is {backend}. Expected one of: rest, local"
+        )
+    if backend == "local" and database == "default":
+        raise ValueError(
+            "backend='local' requires argument 'database' (path to a BLAST database or FASTA file)."
+        )
+    if backend == "rest" and len(queries) > 50:
+        logging.warning(
+            f"{len(queries)} searches will be submitted. Please run scripts with more than 50 searches "
+            "on weekends or between 9 pm and 5 am Eastern time on weekdays (NCBI server rule)."
+        )
+
+    ## Set program and database (detected for each sequence)
+    databases = DATABASES if backend == "rest" else None
+    programs = set(
+        blast_program(seq, program, database, verbose=False, databases=databases)
+        for _, seq in queries[1:]
+    )
+    program, database = blast_program(
+        queries[0][1], program, database, verbose=verbose, databases=databases
+    )
+    if programs - {(program, database)}:
+        raise ValueError(
+            "The sequences were recognized as a mix of nucleotide and amino acid sequences. "
+            "Please search nucleotide and amino acid sequences separately (or specify 'program' and 'database')."
+        )
+
+    if backend == "local":
+        ## Search all queries with one call of the local BLAST+ program
+        results = run_local_blast(
+            queries,
+            program,
+            database,
+            limit=limit,
+            expect=expect,
+            low_comp_filt=low_comp_filt,
+            megablast=megablast,
+            threads=threads,
+            blast_bin=blast_bin,
+            verbose=verbose,
+        )
+    else:
+        ## Submit searches and poll NCBI until the results are ready
+        results = run_searches(
+            queries,
+            program,
+            database,
+            limit=limit,
+            expect=expect,
+            low_comp_filt=low_comp_filt,
+            megablast=megablast,
+            max_rids=max_rids,
+            max_poll_interval=max_poll_interval,
+            verbose=verbose,
+        )
+
+    ## Return results
+    if len(queries) == 1:
+        results_df = results[queries[0][0]]
+        if results_df is None:
             return
+    else:
+        # Combine the results of all queries in one data frame
+        dfs = []
+        for query_id, _ in queries:
+            if results[query_id] is not None:
+                df = results[query_id].copy()
+                df.insert(0, "query", query_id)
+                dfs.append(df)
+        if not dfs:
+            return
+        results_df = pd.concat(dfs, ignore_index=True)
+
+    if wrap_text:
+        df_wrapped = results_df.copy()
+        wrap_cols_func(df_wrapped, ["Description"])
+
+    if json:
+        results_dict = json_package.loads(results_df.to_json(orient="records"))
+        if save:
+            with open("gget_blast_results.json", "w", encoding="utf-8") as f:
+                json_package.dump(results_dict, f, ensure_ascii=False, indent=4)
+
+        return results_dict
+
+    else:
+        # Save
+        if save:
+            results_df.to_csv("gget_blast_results.csv", index=False)
+
+        return results_df
@@ -11,96 +11,26 @@ logging.getLogger("numexpr").setLevel(logging.WARNING)
 
 import json as json_package
 from json.decoder import JSONDecodeError
+from concurrent import futures
 import pandas as pd
-from urllib.request import urlopen
 
+# Custom functions
+from .utils import get_session
+from .gget_blast import read_queries
 
-def blat(sequence, seqtype="default", assembly="human", json=False, save=False, verbose=True,):
-    """
-    BLAT a nucleotide or amino acid sequence against any BLAT UCSC assembly.
-
-    Args:
-     - sequence       Sequence (str) or path to fasta file containing one sequence.
-     - seqtype        'DNA', 'protein', 'translated%20RNA', or 'translated%20DNA'.
-                      Default: 'DNA' for nucleotide sequences; 'protein' for amino acid sequences.
-     - assembly       'human' (hg38) (default), 'mouse' (mm39), 'zebrafinch' (taeGut2),
-                      or any of the species assemblies available at https://genome.ucsc.edu/cgi-bin/hgBlat
-                      (use short assembly name as listed after the "/").
-     - json           If True, returns results in json format instead of data frame. Default: False.
-     - save           If True, the data frame is saved as a csv in the current directory (default: False).
-     - verbose        True/False whether to print progress information. Default True.
-
-    Returns a data frame with the BLAT results.
-    """
-
-    ## Clean up sequence
-    # If the path to a fasta file was provided instead of a nucleotide sequence,
-    # read the file and extract the first sequence
-    if "." in sequence:
-        if ".txt" in sequence:
-            # Read the text file
-            titles = []
-            seqs = []
-            with open(sequence) as text_file:
-                for i, line in enumerate(text_file):
-                    # Recognize a title line by the '>' character
-                    if line[0] == ">":
-                        # Append title line to titles list
-                        titles.append(line.strip())
-                    else:
-                        seqs.append(line.strip())
-
-        elif ".fa" in sequence:
-            # Read the FASTA
-            titles = []
-            seqs = []
-            with open(sequence) as fasta_file:
-                for i, line in enumerate(fasta_file):
-                    # Each second line will be a title line
-                    if i % 2 == 0:
-                        if line[0] != ">":
-                            raise ValueError(
-                                "Expected FASTA to start with a '>' character. "
-                            )
-                        else:
-                            # Append title line to titles list
-                            titles.append(line.strip())
-                    else:
-                        if line[0] == ">":
-                            raise ValueError(
-                                "FASTA contains two lines starting with '>' in a row -> missing sequence line. "
-                            )
-                        # Append sequences line to seqs list
-                        else:
-                            seqs.append(line.strip())
-        else:
-            raise ValueError(
-                "File format not recognized. gget BLAT currently only supports '.txt' or '.fa' files. "
-            )
-
-        # Set the first sequence from the fasta file as 'sequence'
-        sequence = seqs[0]
-        if len(seqs) > 1:
-            if verbose:
-                logging.info(
-                    "File contains more than one sequence. Only the first sequence will be submitted to BLAT."
-                )
-
-    # Shorten sequence to length limit if necessary
-    if len(sequence) > 8000:
-        if verbose:
-            logging.info(
-                "Length of sequence is > 8000. Only the fist 8000 characters will be submitted to BLAT."
-            )
-        sequence = sequence[:8000]
+# Constants
+from .constants import BLAT_URL, BLAT_WORKERS, BLAT_MAX_DAILY
 
-    # Convert sequence to upper case
-    sequence = sequence.upper()
+# Valid seqtype options
+SEQTYPES = ["DNA", "protein", "translated%20RNA", "translated%20DNA"]
 
-    ## Set seqtype
-    # Valid seqtype options
-    seqtypes = ["DNA", "protein", "translated%20RNA", "translated%20DNA"]
 
+def blat_seqtype(sequence, seqtype="default"):
+    """
+    Returns the BLAT seqtype of a sequence.
+    If the seqtype is not specified, it is chosen based on whether the sequence
+    is a nucleotide or amino acid sequence.
+    """
     # If user does not specify the seqtype,
     # check if a nucleotide or amino acid sequence was passed
     if seqtype == "default":
@@ -110,61 +40,50 @@ def blat(sequence, seqtype="default", assembly="human", json=False, save=False,
 
         # If sequence is a nucleotide sequence, set seqtype to DNA
         if set(sequence) <= nucleotides:
-            seqtype = "DNA"
-            if verbose:
-                logging.info(
-                    f"Sequence recognized as nucleotide sequence. 'seqtype' will be set as {seqtype}."
-                )
+            return "DNA"
 
         # If sequence is an amino acid sequence, set seqtype to protein
         elif set(sequence) <= amino_acids:
-            seqtype = "protein"
-            if verbose:
-                logging.info(
-                    f"Sequence recognized as amino acid sequence. 'seqtype' will be set as {seqtype}."
-                )
+            return "protein"
 
         else:
             raise ValueError(
                 f"""
                 Sequence not automatically recognized as a nucleotide or amino acid sequence.
                 Please specify 'seqtype'.
-                Seqtype options: {', '.join(seqtypes)} 
+                Seqtype options: {', '.join(SEQTYPES)} 
                 """
             )
 
-    else:
-        # Check if the user specified seqtype is valid
-        if seqtype not in seqtypes:
-            raise ValueError(
-                f"Seqtype specified is {seqtype}. Expected one of {', '.join(seqtypes)}"
-            )
+    # Check if the user specified seqtype is valid
+    if seqtype not in SEQTYPES:
+        raise ValueError(
+            f"Seqtype specified is {seqtype}. Expected one of {', '.join(SEQTYPES)}"
+        )
 
-    ## Set assembly
-    # Note: If assembly not found, defaults to hg38
-    if assembly == "human" or assembly == "homo_sapiens":
-        database = "hg38"
-    elif assembly == "mouse" or assembly == "mus_musculus":
-        database = "mm39"
-    elif assembly == "zebrafinch" or assembly == "taeniopygia_guttata":
-        database = "taeGut2"
-    else:
-        database = assembly
+    return seqtype
 
+
+def blat_query(sequence, seqtype, database):
+    """
+    Submit one sequence to the UCSC BLAT server.
+
+    Returns the BLAT results (dictionary) or None if the server did not return any results.
+    """
     # Define server URL
-    url = f"https://genome.ucsc.edu/cgi-bin/hgBlat?userSeq={sequence}&type={seqtype}&db={database}&output=json"
+    url = f"{BLAT_URL}?userSeq={sequence}&type={seqtype}&db={database}&output=json"
 
-    # Submit URL request
-    r = urlopen(url)
-    if r.status != 200:
+    # Submit URL request (requests to the BLAT server are spaced out by the shared session)
+    r = get_session().get(url)
+    if r.status_code != 200:
         raise RuntimeError(
-            f"HTTP response status code {r.status}. "
+            f"HTTP response status code {r.status_code}. "
             "Please double-check arguments and try again.\n"
         )
 
     try:
         # Read json results into a dictionary
-        results = json_package.load(r)
+        return json_package.loads(r.text)
     except JSONDecodeError:
         logging.error(
             f"""
@@ -176,32 +95,13 @@ def blat(sequence, seqtype="default", assembly="human", json=False, save=False,
         )
         return
 
-    if len(results["blat"]) == 0:
-        if verbose:
-            logging.info(
-                f"No {seqtype} BLAT matches were found for this sequence in genome {results['genome']}."
-            )
-        return
-
-    # Let user know if assembly was not found
-    # If this is the case, BLAT automatically defaults to human (hg38)
-    if results["genome"] != database:
-        logging.warning(
-            f"Assembly {database} not recognized. Defaulted to {results['genome']} instead."
-        )
-
-    ## Build data frame to resemble BLAT web search results
-    # Define dataframe from dictionary
-    df_dict = {}
-
-    for field in results["fields"]:
-        df_dict.update({field: []})
 
-    for blat_result_list in results["blat"]:
-        for field, (i, result) in zip(results["fields"], enumerate(blat_result_list)):
-            df_dict[field].append(result)
-
-    df = pd.DataFrame(df_dict)
+def parse_results(results):
+    """
+    Build a data frame resembling the BLAT web search results from the BLAT JSON results.
+    """
+    ## Build data frame column-wise from the arrays returned by the server
+    df = pd.DataFrame(dict(zip(results["fields"], zip(*results["blat"]))))
 
     # Calculate % aligned sequence of submitted sequence
     aligned_size = df["qEnd"] - df["qStart"]
@@ -230,7 +130,7 @@ def blat(sequence, seqtype="default", assembly="human", json=False, save=False,
     df = df.rename(columns=columns_dict)
 
     # Change columns order (this also drops all unmentioned columns)
-    df = df.reindex(
+    return df.reindex(
         columns=[
             "genome",
             "query_size",
@@ -247,6 +147,144 @@ def blat(sequence, seqtype="default", assembly="human", json=False, save=False,
         ]
     )
 
+
+def blat(
+    sequence,
+    seqtype="default",
+    assembly="human",
+    json=False,
+    save=False,
+    verbose=True,
+    workers=BLAT_WORKERS,
+):
+    """
+    BLAT a nucleotide or amino acid sequence against any BLAT UCSC assembly.
+
+    Args:
+     - sequence       Sequence (str), list of sequences or path to FASTA file.
+                      All sequences in a list or FASTA file are submitted concurrently and
+                      the results are returned in one data frame with an additional 'query' column.
+     - seqtype        'DNA', 'protein', 'translated%20RNA', or 'translated%20DNA'.
+                      Default: 'DNA' for nucleotide sequences; 'protein' for amino acid sequences
+                      (detected for each sequence).
+     - assembly       'human' (hg38) (default), 'mouse' (mm39), 'zebrafinch' (taeGut2),
+                      or any of the species assemblies available at https://genome.ucsc.edu/cgi-bin/hgBlat
+                      (use short assembly name as listed after the "/").
+     - json           If True, returns results in json format instead of data frame. Default: False.
+     - save           If True, the data frame is saved as a csv in the current directory (default: False).
+     - verbose        True/False whether to print progress information. Default True.
+     - workers        Number of requests sent to the BLAT server at the same time when several
+                      sequences are passed. Default: 2.
+                      All requests are spaced out by at least 15 seconds (UCSC usage policy), so
+                      additional workers do not increase the request rate. They only allow the next
+                      request to be sent while the server is still answering the previous one.
+                      If the request for one sequence fails, the error is logged and the results
+                      of the other sequences are returned.
+
+    Returns a data frame with the BLAT results.
+    """
+
+    ## Clean up sequences
+    queries = []
+    for query_id, seq in read_queries(sequence):
+        # Shorten sequence to length limit if necessary
+        if len(seq) > 8000:
+            if verbose:
+                logging.info(
+                    f"Length of sequence {query_id} is > 8000. Only the fist 8000 characters will be submitted to BLAT."
+                )
+            seq = seq[:8000]
+
+        # Convert sequence to upper case
+        queries.append((query_id, seq.upper()))
+
+    if len(queries) == 0:
+        raise ValueError("No sequences were found in the input.")
+    if len(queries) > BLAT_MAX_DAILY:
+        logging.warning(
+            f"{len(queries)} sequences will be submitted. The UCSC usage policy limits BLAT to "
+            f"{BLAT_MAX_DAILY} requests per day."
+        )
+
+    ## Set seqtype of each sequence (before submitting any requests)
+    seqtypes = [blat_seqtype(seq, seqtype) for _, seq in queries]
+    if verbose and seqtype == "default":
+        if len(queries) == 1:
+            logging.info(
+                f"Sequence recognized as {'nucleotide' if seqtypes[0] == 'DNA' else 'amino acid'} sequence. "
+                f"'seqtype' will be set as {seqtypes[0]}."
+            )
+        else:
+            logging.info(
+                f"{seqtypes.count('DNA')} sequences recognized as nucleotide sequences (seqtype 'DNA'), "
+                f"{seqtypes.count('protein')} as amino acid sequences (seqtype 'protein')."
+            )
+
+    ## Set assembly
+    # Note: If assembly not found, defaults to hg38
+    if assembly == "human" or assembly == "homo_sapiens":
+        database = "hg38"
+    elif assembly == "mouse" or assembly == "mus_musculus":
+        database = "mm39"
+    elif assembly == "zebrafinch" or assembly == "taeniopygia_guttata":
+        database = "taeGut2"
+    else:
+        database = assembly
+
+    ## Submit requests
+    if len(queries) == 1:
+        all_results = [blat_query(queries[0][1], seqtypes[0], database)]
+    else:
+        if verbose:
+            logging.info(
+                f"Submitting {len(queries)} sequences to BLAT (one request every 15 seconds)."
+            )
+
+        def query(args):
+            (query_id, seq), query_seqtype = args
+            # A failed request does not discard the results of the other sequences
+            try:
+                return blat_query(seq, query_seqtype, database)
+            except Exception as e:
+                logging.error(f"BLAT request for {query_id} failed: {e}")
+                return None
+
+        with futures.ThreadPoolExecutor(max(1, min(workers, len(queries)))) as executor:
+            all_results = list(executor.map(query, zip(queries, seqtypes)))
+
+    ## Build data frames to resemble BLAT web search results
+    dfs = []
+    genomes = set()
+    for (query_id, _), query_seqtype, results in zip(queries, seqtypes, all_results):
+        if results is None:
+            continue
+
+        genomes.add(results["genome"])
+        if len(results["blat"]) == 0:
+            if verbose:
+                logging.info(
+                    f"No {query_seqtype} BLAT matches were found for "
+                    f"{'this sequence' if len(queries) == 1 else query_id} in genome {results['genome']}."
+                )
+            continue
+
+        df = parse_results(results)
+        if len(queries) > 1:
+            df.insert(0, "query", query_id)
+        dfs.append(df)
+
+    # Let user know if assembly was not found
+    # If this is the case, BLAT automatically defaults to human (hg38)
+    for genome in genomes - {database}:
+        logging.warning(
+            f"Assembly {database} not recognized. Defaulted to {genome} instead."
+        )
+
+    if not dfs:
+        return
+
+    df = pd.concat(dfs, ignore_index=True)
+
     if json:
         results_dict = json_package.loads(df.to_json(orient="records"))
         if save:
@@ -1,4 +1,3 @@
-import requests
 import pandas as pd
 import json as json_package
 import logging
@@ -12,6 +11,9 @@ logging.basicConfig(
 # Mute numexpr threads info
 logging.getLogger("numexpr").setLevel(logging.WARNING)
 
+# Custom functions
+from .utils import get_session
+
 # Constants
 from .constants import COSMIC_GET_URL
 
@@ -67,7 +69,7 @@ def cosmic(
             f"Fetching the {limit} most correlated to {searchterm} from COSMIC."
         )
 
-    r = requests.get(url=COSMIC_GET_URL + entity + "?q=" + searchterm + "&export=json")
+    r = get_session().get(url=COSMIC_GET_URL + entity + "?q=" + searchterm + "&export=json")
 
     # Check if the request returned an error (e.g. gene not found)
     if not r.ok:
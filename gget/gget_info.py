@@ -1,8 +1,7 @@
 import numpy as np
 import pandas as pd
 import json as json_package
-import requests
-from bs4 import BeautifulSoup
+from concurrent import futures
 
 # import json
 import logging
@@ -17,10 +16,29 @@ logging.basicConfig(
 logging.getLogger("numexpr").setLevel(logging.WARNING)
 
 # Custom functions
-from .utils import rest_query, get_uniprot_info, wrap_cols_func, get_pdb_ids
+from .utils import (
+    rest_query,
+    rest_query_post,
+    chunks,
+    get_uniprot_info,
+    get_uniprot_info_bulk,
+    wrap_cols_func,
+    get_pdb_ids,
+    get_ncbi_info,
+    get_host,
+)
 
 # Constants
-from .constants import ENSEMBL_REST_API, UNIPROT_REST_API, NCBI_URL
+from .constants import (
+    ENSEMBL_REST_API,
+    ENSEMBL_LOOKUP_BATCH_SIZE,
+    UNIPROT_REST_API,
+    UNIPROT_IDMAPPING_MIN_IDS,
+    NCBI_URL,
+    ENS_TO_PDB_API,
+    HTTP_POOL_MAXSIZE,
+    HTTP_POOL_SIZES,
+)
 
 
 ## gget info
@@ -116,16 +134,26 @@ def info(
     master_dict = {}
 
     # Query REST APIs from https://rest.ensembl.org/
+    # Look up the IDs in batches using the POST lookup/id endpoint
+    # (one request per ENSEMBL_LOOKUP_BATCH_SIZE IDs instead of one request per ID)
+    batch_results = {}
+    for ids_chunk in chunks(ens_ids_clean, ENSEMBL_LOOKUP_BATCH_SIZE):
+        try:
+            batch_results.update(
+                rest_query_post(
+                    server, "lookup/id?expand=1", {"ids": ids_chunk}, content_type
+                )
+            )
+        except RuntimeError:
+            # IDs of failed batches are looked up one by one below
+            pass
+
     for ensembl_ID in ens_ids_clean:
         # Create dict to save query results
         results_dict = {ensembl_ID: {}}
 
-        # Define the REST query
-        query = "lookup/id/" + ensembl_ID + "?" + "expand=1"
-
-        # Submit query
-        try:
-            df_temp = rest_query(server, query, content_type)
+        if batch_results.get(ensembl_ID) is not None:
+            df_temp = batch_results[ensembl_ID]
 
             try:
                 # Add Ensembl ID with latest version number to df_temp
@@ -139,29 +167,60 @@ def info(
                 ensembl_id_dict = {"ensembl_id": str(df_temp["id"])}
                 df_temp.update(ensembl_id_dict)
 
-        # If query returns in an error:
-        except RuntimeError:
-            # Try submitting query without expand (expand does not work for exons and translation IDs)
-            try:
-                query = "lookup/id/" + ensembl_ID + "?"
-                df_temp = rest_query(server, query, content_type)
-                # Add Ensembl ID with latest version number to df_temp
-                ensembl_id_dict = {
-                    "ensembl_id": str(df_temp["id"]) + "." + str(df_temp["version"])
-                }
-                df_temp.update(ensembl_id_dict)
+        # If the ID was not found by the batch query, query it separately
+        else:
+            df_temp = None
 
-            # Log error if this also did not work
-            except RuntimeError:
-                if verbose:
-                    logging.warning(
-                        f"ID '{ensembl_ID}' not found. Please double-check spelling/arguments and try again."
-                    )
+            # IDs returned as null by a successful batch query could not be expanded,
+            # so only retry the expanded query for IDs from failed batches
+            if ensembl_ID not in batch_results:
+                try:
+                    # Define the REST query
+                    query = "lookup/id/" + ensembl_ID + "?" + "expand=1"
+                    # Submit query
+                    df_temp = rest_query(server, query, content_type)
+
+                    try:
+                        # Add Ensembl ID with latest version number to df_temp
+                        ensembl_id_dict = {
+                            "ensembl_id": str(df_temp["id"])
+                            + "."
+                            + str(df_temp["version"])
+                        }
+                        df_temp.update(ensembl_id_dict)
 
-                # Remove IDs that were not found from ID list
-                ens_ids_clean_2.remove(ensembl_ID)
+                    except KeyError:
+                        # Just add Ensembl ID if no version found
+                        ensembl_id_dict = {"ensembl_id": str(df_temp["id"])}
+                        df_temp.update(ensembl_id_dict)
+
+                except RuntimeError:
+                    df_temp = None
+
+            if df_temp is None:
+                # Try submitting query without expand (expand does not work for exons and translation IDs)
+                try:
+                    query = "lookup/id/" + ensembl_ID + "?"
+                    df_temp = rest_query(server, query, content_type)
+                    # Add Ensembl ID with latest version number to df_temp
+                    ensembl_id_dict = {
+                        "ensembl_id": str(df_temp["id"])
+                        + "."
+                        + str(df_temp["version"])
+                    }
+                    df_temp.update(ensembl_id_dict)
 
-                continue
+                # Log error if this also did not work
+                except RuntimeError:
+                    if verbose:
+                        logging.warning(
+                            f"ID '{ensembl_ID}' not found. Please double-check spelling/arguments and try again."
+                        )
+
+                    # Remove IDs that were not found from ID list
+                    ens_ids_clean_2.remove(ensembl_ID)
+
+                    continue
 
         # Add results to master dict
         results_dict[ensembl_ID].update(df_temp)
@@ -187,74 +246,107 @@ def info(
         # df_temp will hold information from NCBI, UniProt and PDB for each of the Ensembl IDs
         df_temp = pd.DataFrame()
 
-        for ens_id in ens_ids_clean_2:
-            if fetch_uniprot is True:
-                try:
-                    # Get gene names and descriptions from UniProt
-                    df_uniprot = get_uniprot_info(
-                        UNIPROT_REST_API, ens_id, verbose=verbose
+        # Send the UniProt, NCBI and PDBe requests for all IDs concurrently
+        # Each server gets its own thread pool to cap the number of parallel requests per host
+        # (the results are collected in input order below)
+        executors = []
+        uniprot_futures = {}
+        ncbi_futures = {}
+        pdb_futures = {}
+        try:
+            # Fetch UniProt entries of long ID lists using UniProt ID mapping jobs
+            # (IDs that cannot be mapped are looked up one by one below)
+            uniprot_bulk = {}
+            if fetch_uniprot is True and len(ens_ids_clean_2) >= UNIPROT_IDMAPPING_MIN_IDS:
+                uniprot_bulk = get_uniprot_info_bulk(ens_ids_clean_2, verbose=verbose)
+
+            for fetch, future_dict, server, func, args, ids in [
+                (
+                    fetch_uniprot,
+                    uniprot_futures,
+                    UNIPROT_REST_API,
+                    get_uniprot_info,
+                    lambda ens_id: (UNIPROT_REST_API, ens_id, verbose),
+                    [ens_id for ens_id in ens_ids_clean_2 if ens_id not in uniprot_bulk],
+                ),
+                (
+                    fetch_ncbi,
+                    ncbi_futures,
+                    NCBI_URL,
+                    get_ncbi_info,
+                    lambda ens_id: (ens_id,),
+                    ens_ids_clean_2,
+                ),
+                (
+                    fetch_pdb,
+                    pdb_futures,
+                    ENS_TO_PDB_API,
+                    get_pdb_ids,
+                    lambda ens_id: (ens_id,),
+                    ens_ids_clean_2,
+                ),
+            ]:
+                if fetch:
+                    ex = futures.ThreadPoolExecutor(
+                        HTTP_POOL_SIZES.get(get_host(server), HTTP_POOL_MAXSIZE)
                     )
+                    executors.append(ex)
+                    for ens_id in ids:
+                        future_dict[ens_id] = ex.submit(func, *args(ens_id))
 
-                except Exception as e:
-                    if verbose:
-                        logging.warning(
-                            f"UniProt server request for ID '{ens_id}' return following error:\n{e}"
-                        )
-                    continue
-
-                if not isinstance(df_uniprot, type(None)):
-                    # If two different UniProt IDs for a single query ID are returned, they should be merged into one column
-                    # So len(df_uniprot) should always be 1
-                    if len(df_uniprot) > 1:
-                        # If the above somehow failed, we will only return the first result.
-                        df_uniprot = df_uniprot.iloc[[0]]
+            for ens_id in ens_ids_clean_2:
+                if fetch_uniprot is True:
+                    try:
+                        # Get gene names and descriptions from UniProt
+                        if ens_id in uniprot_bulk:
+                            df_uniprot = uniprot_bulk[ens_id]
+                        else:
+                            df_uniprot = uniprot_futures[ens_id].result()
 
+                    except Exception as e:
                         if verbose:
                             logging.warning(
-                                f"More than one UniProt match was found for ID {ens_id}. Only the first match and its associated information will be returned."
+                                f"UniProt server request for ID '{ens_id}' return following error:\n{e}"
                             )
+                        continue
 
-                    # Get uniprot synonyms and remove NaN values
-                    uni_synonyms = df_uniprot["uni_synonyms"].values[0]
-                    uni_synonyms = [
-                        item for item in uni_synonyms if not (pd.isnull(item)) == True
-                    ]
-
-                    # Transpose UniProt data frame and add Ensembl ID as column name
-                    df_uniprot = df_uniprot.T
-                    df_uniprot.columns = [ens_id]
-
-                else:
-                    if verbose:
-                        logging.warning(f"No UniProt entry was found for ID {ens_id}.")
-
-            if fetch_ncbi is True:
-                ## Get NCBI gene ID and description (for genes only)
-                url = NCBI_URL + f"/gene/?term={ens_id}"
-
-                try:
-                    html = requests.get(url)
-                    # Raise error if status code not "OK" Response
-                    if html.status_code != 200:
-                        logging.error(
-                            f"NCBI server request for {ens_id} returned error status code:\n{html.status_code}.\nPlease double-check arguments or try again later."
-                        )
-
-                    ## Web scrape NCBI website for gene ID, synonyms and description
-                    soup = BeautifulSoup(html.text, "html.parser")
+                    if not isinstance(df_uniprot, type(None)):
+                        # If two different UniProt IDs for a single query ID are returned, they should be merged into one column
+                        # So len(df_uniprot) should always be 1
+                        if len(df_uniprot) > 1:
+                            # If the above somehow failed, we will only return the first result.
+                            df_uniprot = df_uniprot.iloc[[0]]
+
+                            if verbose:
+                                logging.warning(
+                                    f"More than one UniProt match was found for ID {ens_id}. Only the first match and its associated information will be returned."
+                                )
+
+                        # Get uniprot synonyms and remove NaN values
+                        uni_synonyms = df_uniprot["uni_synonyms"].values[0]
+                        uni_synonyms = [
+                            item for item in uni_synonyms if not (pd.isnull(item)) == True
+                        ]
+
+                        # Transpose UniProt data frame and add Ensembl ID as column name
+                        df_uniprot = df_uniprot.T
+                        df_uniprot.columns = [ens_id]
+
+                    else:
+                        if verbose:
+                            logging.warning(f"No UniProt entry was found for ID {ens_id}.")
 
-                    # Check for error message in NCBI return
-                    if (
-                        soup.find("li", class_="error icon") is not None
-                        and "An error has occured"
-                        in soup.find("li", class_="error icon").text.strip()
-                    ):
-                        error_message = soup.find(
-                            "li", class_="error icon"
-                        ).text.strip()
+                if fetch_ncbi is True:
+                    ## Get NCBI gene ID and description (for genes only)
+                    try:
+                        ncbi_info = ncbi_futures[ens_id].result()
+                        ncbi_gene_id = ncbi_info["ncbi_gene_id"]
+                        ncbi_description = ncbi_info["ncbi_description"]
+                        ncbi_synonyms = ncbi_info["ncbi_synonyms"]
 
+                    except Exception as e:
                         logging.error(
-                            f"The NCBI server request for Ensembl ID '{ens_id}' returned the following error:\n{error_message}"
+                            f"The NCBI server request for Ensembl ID '{ens_id}' returned the following error:\n{e}"
                         )
 
                         ncbi_gene_id = np.nan
@@ -262,117 +354,82 @@ def info(
                         ncbi_synonyms = None
                         continue
 
-                    # Check if NCBI gene ID is available
-                    try:
-                        ncbi_gene_id = soup.find("input", {"id": "gene-id-value"}).get(
-                            "value"
-                        )
-                    except AttributeError:
-                        ncbi_gene_id = np.nan
-
-                    # Check if NCBI description is available
-                    try:
-                        ncbi_description = (
-                            soup.find("div", class_="section", id="summaryDiv")
-                            .find("dt", string="Summary")
-                            .find_next_sibling("dd")
-                            .text
-                        )
-                    except AttributeError:
-                        ncbi_description = np.nan
-
-                    # Check if NCBI synonyms are available
-                    try:
-                        ncbi_synonyms = (
-                            soup.find("div", class_="section", id="summaryDiv")
-                            .find("dt", string="Also known as")
-                            .find_next_sibling("dd")
-                            .text
-                        )
-                        # Split NCBI synonyms
-                        ncbi_synonyms = ncbi_synonyms.split("; ")
-                    except AttributeError:
-                        ncbi_synonyms = None
-
-                except Exception as e:
-                    logging.error(
-                        f"The NCBI server request for Ensembl ID '{ens_id}' returned the following error:\n{e}"
+                    # Save NCBI info to data frame
+                    df_ncbi = pd.DataFrame(
+                        {
+                            "ncbi_gene_id": [ncbi_gene_id],
+                            "ncbi_description": [ncbi_description],
+                        },
                     )
 
-                    ncbi_gene_id = np.nan
-                    ncbi_description = np.nan
-                    ncbi_synonyms = None
-                    continue
-
-                # Save NCBI info to data frame
-                df_ncbi = pd.DataFrame(
-                    {
-                        "ncbi_gene_id": [ncbi_gene_id],
-                        "ncbi_description": [ncbi_description],
-                    },
-                )
+                    # Transpose NCBI df and add Ensembl ID as column name
+                    df_ncbi = df_ncbi.T
+                    df_ncbi.columns = [ens_id]
 
-                # Transpose NCBI df and add Ensembl ID as column name
-                df_ncbi = df_ncbi.T
-                df_ncbi.columns = [ens_id]
+                if fetch_pdb:
+                    ## Get PDB IDs from Ensembl ID
+                    try:
+                        pdb_ids = pdb_futures[ens_id].result()
 
-            if fetch_pdb:
-                ## Get PDB IDs from Ensembl ID
-                try:
-                    pdb_ids = get_pdb_ids(ens_id)
+                    except Exception as e:
+                        if verbose:
+                            logging.warning(
+                                f"The PDBe server request for Ensembl ID '{ens_id}' returned the following error:\n{e}"
+                            )
+                        continue
 
-                except Exception as e:
-                    if verbose:
-                        logging.warning(
-                            f"The PDBe server request for Ensembl ID '{ens_id}' returned the following error:\n{e}"
-                        )
-                    continue
+                    # Add pdb_ids to data frame
+                    if pdb_ids:
+                        df_pdb["pdb_id"] = [pdb_ids]
+                    else:
+                        df_pdb["pdb_id"] = [np.NaN]
+
+                    # Transpose pdb df and add Ensembl ID as column name
+                    df_pdb = df_pdb.T
+                    df_pdb.columns = [ens_id]
+
+                ## Handle synonyms
+                # If both NCBI and UniProt synonyms available,
+                # final synonyms list will be combined set of both lists
+                if ncbi_synonyms is not None and not isinstance(df_uniprot, type(None)):
+                    synonyms = list(set().union(uni_synonyms, ncbi_synonyms))
+                    # Remove nan values
+                    synonyms = [item for item in synonyms if not (pd.isnull(item)) == True]
+
+                # Add only UniProt synonyms if NCBI syns not available
+                elif ncbi_synonyms is None and not isinstance(df_uniprot, type(None)):
+                    # Remove nan values
+                    synonyms = uni_synonyms
+
+                # Add only NCBI synonyms if UniProt syns not available
+                elif ncbi_synonyms is not None and isinstance(df_uniprot, type(None)):
+                    # Remove nan values
+                    synonyms = ncbi_synonyms
 
-                # Add pdb_ids to data frame
-                if pdb_ids:
-                    df_pdb["pdb_id"] = [pdb_ids]
                 else:
-                    df_pdb["pdb_id"] = [np.NaN]
-
-                # Transpose pdb df and add Ensembl ID as column name
-                df_pdb = df_pdb.T
-                df_pdb.columns = [ens_id]
-
-            ## Handle synonyms
-            # If both NCBI and UniProt synonyms available,
-            # final synonyms list will be combined set of both lists
-            if ncbi_synonyms is not None and not isinstance(df_uniprot, type(None)):
-                synonyms = list(set().union(uni_synonyms, ncbi_synonyms))
-                # Remove nan values
-                synonyms = [item for item in synonyms if not (pd.isnull(item)) == True]
-
-            # Add only UniProt synonyms if NCBI syns not available
-            elif ncbi_synonyms is None and not isinstance(df_uniprot, type(None)):
-                # Remove nan values
-                synonyms = uni_synonyms
-
-            # Add only NCBI synonyms if UniProt syns not available
-            elif ncbi_synonyms is not None and isinstance(df_uniprot, type(None)):
-                # Remove nan values
-                synonyms = ncbi_synonyms
-
-            else:
-                synonyms = []
-
-            # Sort synonyms alphabetically (if sortable)
-            try:
-                synonyms = sorted(synonyms)
-            except:
-                pass
-
-            # Append dataframes with data from NCBI, UniProt and PDB from ens_id to df_temp
-            frames = [df_uniprot, df_ncbi, df_pdb]
-            df_uni_ncbi = pd.concat(frames)
-
-            if not df_uni_ncbi.empty:
-                df_uni_ncbi.loc["synonyms"] = [synonyms]
+                    synonyms = []
 
-            df_temp = pd.concat([df_temp, df_uni_ncbi], axis=1)
+                # Sort synonyms alphabetically (if sortable)
+                try:
+                    synonyms = sorted(synonyms)
+                except:
+                    pass
+
+                # Append dataframes with data from NCBI, UniProt and PDB from ens_id to df_temp
+                frames = [df_uniprot, df_ncbi, df_pdb]
+                df_uni_ncbi = pd.concat(frames)
+
+                if not df_uni_ncbi.empty:
+                    df_uni_ncbi.loc["synonyms"] = [synonyms]
+
+                df_temp = pd.concat([df_temp, df_uni_ncbi], axis=1)
+        finally:
+            # Cancel the requests that did not start yet (e.g. after an error) and wait for the others
+            for future_dict in [uniprot_futures, ncbi_futures, pdb_futures]:
+                for future in future_dict.values():
+                    future.cancel()
+            for ex in executors:
+                ex.shutdown()
 
         # Append info from NCBI, UniProt and PDB to master df which contains info from Ensembl
         df = pd.concat([df, df_temp])
@@ -0,0 +1,351 @@
+import os
+import re
+import json
+import time
+import shutil
+import logging
+from concurrent import futures
+
+# Add and format time stamp in logging messages
+logging.basicConfig(
+    format="%(asctime)s %(levelname)s %(message)s",
+    level=logging.INFO,
+    datefmt="%c",
+)
+# Mute numexpr threads info
+logging.getLogger("numexpr").setLevel(logging.WARNING)
+
+import pandas as pd
+
+# Custom functions
+from .gget_ref import ref_manifest
+from .download import download_files, get_checksums
+
+# Constants
+from .constants import HTTP_POOL_MAXSIZE
+
+# File in the mirror directory recording the files downloaded by gget mirror
+MIRROR_STATE = "gget_mirror.json"
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(size):
+    """
+    Convert a size such as 500000, "750M" or "1.5T" (binary units) to bytes.
+    """
+    if size is None or isinstance(size, (int, float)):
+        return size
+
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)B?\s*", str(size).upper())
+    if not match:
+        raise ValueError(
+            f"Size '{size}' is not valid. Please pass the size in bytes or with a unit, e.g. '500G'."
+        )
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def load_state(out_dir):
+    """
+    Load the state of a mirror directory in the format {"files": {relative path: file information}}.
+    """
+    path = os.path.join(out_dir, MIRROR_STATE)
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    """
+    Save the state of a mirror directory (the previous state is only replaced once
+    the new state was written completely).
+    """
+    path = os.path.join(out_dir, MIRROR_STATE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def _disk_usage(out_dir, paths):
+    """
+    Returns the number of bytes used by the files (hard links are only counted once).
+    """
+    inodes = {}
+    for path in paths:
+        stat = os.stat(os.path.join(out_dir, path))
+        inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return sum(inodes.values())
+
+
+def _link(source, target):
+    """
+    Hard link a file from a previous release (or copy it if hard links are not supported).
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def fetch_checksums(urls, verbose=True):
+    """
+    Fetch the Ensembl CHECKSUMS values of several files (one request per FTP directory).
+
+    Returns a dictionary {URL: "<checksum> <number of 1 kB blocks>" (None if not available)}.
+    """
+    directories = sorted(set(url.rsplit("/", 1)[0] for url in urls))
+
+    def fetch(directory):
+        try:
+            return get_checksums(directory)
+        except Exception as e:
+            if verbose:
+                logging.warning(f"Could not fetch the CHECKSUMS file of {directory}: {e}")
+            return {}
+
+    with futures.ThreadPoolExecutor(
+        max(1, min(len(directories), HTTP_POOL_MAXSIZE))
+    ) as executor:
+        checksums = dict(zip(directories, executor.map(fetch, directories)))
+
+    results = {}
+    for url in urls:
+        directory, filename = url.rsplit("/", 1)
+        checksum = checksums[directory].get(filename)
+        results[url] = f"{checksum[0]} {checksum[1]}" if checksum else None
+    return results
+
+
+def _release_free_name(filename, release):
+    """
+    Remove the release number from a filename, e.g. Homo_sapiens.GRCh38.110.gtf.gz -> Homo_sapiens.GRCh38.gtf.gz
+    """
+    return re.sub(rf"\.{release}(?=\.)", "", filename)
+
+
+def _same_file(info, other_info):
+    """
+    Returns True if two files (mirror state entries) have the same content.
+    Files are compared using their Ensembl checksums, since Ensembl updates the timestamps of
+    all files in each release (the listing is used if no checksums are available).
+    """
+    if info.get("checksum") and other_info.get("checksum"):
+        return info["checksum"] == other_info["checksum"]
+    return all(
+        other_info.get(key) == info[key] for key in ["release_date", "release_time", "bytes"]
+    )
+
+
+def collect_garbage(out_dir, state, max_size, verbose=True):
+    """
+    Delete files of old releases (oldest releases first) until the mirror uses at most
+    max_size bytes. Only files superseded by a newer release of the same species and
+    file type are deleted.
+
+    Returns the list of deleted files (relative paths).
+    """
+    files = state["files"]
+    usage = _disk_usage(out_dir, files)
+    if usage <= max_size:
+        return []
+
+    # Newest release per species and file type
+    latest = {}
+    for info in files.values():
+        key = (info["species"], info["file_type"])
+        latest[key] = max(latest.get(key, info["ensembl_release"]), info["ensembl_release"])
+
+    superseded = sorted(
+        (
+            path
+            for path, info in files.items()
+            if info["ensembl_release"] < latest[(info["species"], info["file_type"])]
+        ),
+        key=lambda path: (files[path]["ensembl_release"], path),
+    )
+
+    deleted = []
+    for path in superseded:
+        if usage <= max_size:
+            break
+        os.remove(os.path.join(out_dir, path))
+        del files[path]
+        deleted.append(path)
+        # Files hard linked into newer releases do not free any space
+        usage = _disk_usage(out_dir, files)
+
+        # Remove empty directories
+        directory = os.path.dirname(os.path.join(out_dir, path))
+        while os.path.abspath(directory) != os.path.abspath(out_dir):
+            if os.listdir(directory):
+                break
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+    if verbose and deleted:
+        logging.info(f"Deleted {len(deleted)} files from previous Ensembl releases.")
+    if usage > max_size:
+        logging.warning(
+            f"The mirror uses {usage} bytes, which exceeds the disk budget of {max_size} bytes "
+            "after deleting all files from previous releases."
+        )
+
+    return deleted
+
+
+def mirror(
+    species,
+    which="all",
+    out_dir=".",
+    release=None,
+    kingdom=None,
+    max_size=None,
+    checksums=True,
+    dry_run=False,
+    verbose=True,
+):
+    """
+    Keep a local mirror of Ensembl reference genomes and annotations up to date.
+
+    Files are saved in the format <out_dir>/release-<release>/<species>/<filename>.
+    Only files that changed or are new in the current release are downloaded. Files that
+    did not change since a previous release (same species, file type and Ensembl checksum) are
+    hard linked instead of downloaded again.
+    The downloaded files (and their checksums) are recorded in <out_dir>/gget_mirror.json.
+
+    Args:
+    - species     Species (or list of species) in the format "<genus>_<species>", e.g. "homo_sapiens",
+                  or "all" for all species of a kingdom (see 'kingdom').
+    - which       File types to mirror (see gget.ref), e.g. ["gtf", "dna"]. Default: 'all'.
+    - out_dir     Path to the mirror directory (default: current directory).
+    - release     Ensembl release number (default: latest Ensembl release).
+    - kingdom     Kingdom of the species if species = "all": 'vertebrates' (default), 'plants', 'protists', 'metazoa' or 'fungi'.
+    - max_size    Disk budget of the mirror in bytes or with a unit, e.g. "500G" (default: None -> no limit).
+                  Files of previous releases are deleted (oldest first) until the mirror fits the budget.
+    - checksums   True/False whether to verify the files against the Ensembl CHECKSUMS files (default: True).
+    - dry_run     If True, only returns which files would be downloaded (default: False).
+    - verbose     True/False whether to print progress information (default: True).
+
+    Returns a data frame of the manifest (see gget.ref) with the path of each file and its status:
+    'unchanged', 'linked' (from a previous release), 'downloaded', 'planned' (dry_run=True) or 'unavailable'.
+    """
+    max_size = parse_size(max_size)
+    if isinstance(species, str) and species.lower() != "all":
+        species = [species]
+
+    manifest = ref_manifest(
+        species, which=which, release=release, kingdom=kingdom, verbose=verbose
+    )
+
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir)
+    files = state["files"]
+    # Forget files that were deleted manually
+    for path in [path for path in files if not os.path.exists(os.path.join(out_dir, path))]:
+        del files[path]
+
+    # Checksums of all files (from the CHECKSUMS file of each FTP directory)
+    # (used to compare files, also if the downloads are not verified)
+    file_checksums = fetch_checksums(
+        [url for url in manifest["ftp"] if url], verbose=verbose
+    )
+
+    paths = []
+    statuses = []
+    to_download = []
+    for row in manifest.itertuples(index=False):
+        if not row.ftp:
+            paths.append(None)
+            statuses.append("unavailable")
+            continue
+
+        filename = row.ftp.split("/")[-1]
+        path = f"release-{row.ensembl_release}/{row.species}/{filename}"
+        paths.append(path)
+        info = {
+            "ftp": row.ftp,
+            "species": row.species,
+            "file_type": row.file_type,
+            "ensembl_release": int(row.ensembl_release),
+            "release_date": row.release_date,
+            "release_time": row.release_time,
+            "bytes": row.bytes,
+            "checksum": file_checksums[row.ftp],
+        }
+
+        # File is up to date
+        previous = files.get(path)
+        if previous and _same_file(info, previous):
+            if info["checksum"] and not previous.get("checksum"):
+                previous["checksum"] = info["checksum"]
+            statuses.append("unchanged")
+            continue
+
+        # Same file in a previous release
+        # (filenames of some file types contain the release number)
+        name = _release_free_name(filename, info["ensembl_release"])
+        source = next(
+            (
+                other
+                for other, other_info in files.items()
+                if other_info["species"] == info["species"]
+                and other_info["file_type"] == info["file_type"]
+                and _release_free_name(other.split("/")[-1], other_info["ensembl_release"])
+                == name
+                and _same_file(info, other_info)
+            ),
+            None,
+        )
+        if source is not None:
+            if dry_run:
+                statuses.append("planned")
+                continue
+            target = os.path.join(out_dir, path)
+            if os.path.exists(target):
+                os.remove(target)
+            _link(os.path.join(out_dir, source), target)
+            files[path] = {**info, "downloaded": files[source].get("downloaded")}
+            statuses.append("linked")
+            continue
+
+        statuses.append("planned" if dry_run else "downloaded")
+        to_download.append((path, info))
+
+    manifest["path"] = paths
+    manifest["status"] = statuses
+
+    if verbose:
+        counts = manifest["status"].value_counts()
+        logging.info(
+            f"{counts.get('unchanged', 0)} files are up to date, "
+            f"{counts.get('linked', 0)} files were linked from previous releases and "
+            f"{len(to_download)} files {'would be' if dry_run else 'will be'} downloaded."
+        )
+
+    if dry_run:
+        return manifest
+
+    try:
+        if to_download:
+            download_files(
+                [info["ftp"] for _, info in to_download],
+                out_dir=[
+                    os.path.dirname(os.path.join(out_dir, path)) for path, _ in to_download
+                ],
+                checksums=checksums,
+                verbose=verbose,
+            )
+    finally:
+        # Record all files that were downloaded completely (also if others failed)
+        for path, info in to_download:
+            if os.path.exists(os.path.join(out_dir, path)):
+                files[path] = {**info, "downloaded": time.strftime("%Y-%m-%d %H:%M")}
+        save_state(out_dir, state)
+
+    if max_size is not None:
+        collect_garbage(out_dir, state, max_size, verbose=verbose)
+        save_state(out_dir, state)
+
+    return manifest
@@ -1,5 +1,3 @@
-from urllib.request import urlopen
-from urllib.error import HTTPError
 import json
 import logging
 
@@ -12,6 +10,10 @@ logging.basicConfig(
 # Mute numexpr threads info
 logging.getLogger("numexpr").setLevel(logging.WARNING)
 
+# Custom functions
+from .utils import get_session
+
+# Constants
 from .constants import RCSB_PDB_API
 
 
@@ -93,9 +95,8 @@ def pdb(pdb_id, resource="pdb", identifier=None, save=False):
         url = f"https://files.rcsb.org/download/{pdb_id}.pdb"
 
     # Submit URL request
-    try:
-        r = urlopen(url)
-    except HTTPError:
+    r = get_session().get(url)
+    if not r.ok:
         if resource == "assembly":
             logging.error(
                 f"{resource} for {pdb_id} assembly {identifier} was not found. Please double-check arguments and try again."
@@ -114,18 +115,18 @@ def pdb(pdb_id, resource="pdb", identifier=None, save=False):
             )
         return
 
-    if r.status != 200:
+    if r.status_code != 200:
         raise RuntimeError(
-            f"The RCSB PDB server responded with status code: {r.status}. "
+            f"The RCSB PDB server responded with status code: {r.status_code}. "
             "Please double-check arguments and try again.\n"
         )
 
     if resource != "pdb":
         # Read json formatted results
-        results = json.load(r)
+        results = r.json()
     else:
         # Read PDB file
-        results = r.read().decode()
+        results = r.text
 
     if save:
         if resource != "pdb":
@@ -1,7 +1,7 @@
-from bs4 import BeautifulSoup
-import requests
-import json
+import json as json_package
 import logging
+from typing import NamedTuple
+from concurrent import futures
 
 # Add and format time stamp in logging messages
 logging.basicConfig(
@@ -12,10 +12,74 @@ logging.basicConfig(
 # Mute numexpr threads info
 logging.getLogger("numexpr").setLevel(logging.WARNING)
 
+import pandas as pd
+
 # Custom functions
-from .utils import ref_species_options, find_latest_ens_rel, find_nv_kingdom
+from .utils import (
+    ref_species_options,
+    find_latest_ens_rel,
+    find_nv_kingdom,
+    get_ftp_files,
+    get_ftp_listing,
+)
+from .download import download_files
+
+from .constants import ENSEMBL_FTP_URL, ENSEMBL_FTP_URL_NV, HTTP_POOL_MAXSIZE
+
+# Reference files returned by gget ref in the format
+# {which: (result key, FTP directory, substrings identifying the file in order of preference)}
+REF_FILES = {
+    "cdna": ("transcriptome_cdna", "fasta/{species}/cdna/", ["cdna.all.fa"]),
+    "dna": (
+        "genome_dna",
+        "fasta/{species}/dna/",
+        # Get toplevel if primary assembly not available
+        [".dna.primary_assembly.fa", ".dna.toplevel.fa"],
+    ),
+    "gtf": ("annotation_gtf", "gtf/{species}/", ["{release}.gtf.gz"]),
+    "cds": ("coding_seq_cds", "fasta/{species}/cds/", ["cds.all.fa"]),
+    "ncrna": ("non-coding_seq_ncRNA", "fasta/{species}/ncrna/", [".ncrna.fa"]),
+    "pep": ("protein_translation_pep", "fasta/{species}/pep/", [".pep.all.fa"]),
+}
+# Order of the FTP links returned by ref(which="all", ftp=True)
+FTP_ORDER = ["gtf", "cdna", "dna", "cds", "ncrna", "pep"]
+# Kingdoms for ref(species="all")
+NV_KINGDOMS = ["plants", "protists", "metazoa", "fungi"]
+KINGDOMS = ["vertebrates"] + NV_KINGDOMS
+# Columns of the multi-species manifest (see ref_manifest)
+MANIFEST_COLUMNS = [
+    "species",
+    "file_type",
+    "ftp",
+    "ensembl_release",
+    "release_date",
+    "release_time",
+    "bytes",
+]
+
+
+class RefFile(NamedTuple):
+    """
+    Reference file listed in a species manifest (see species_manifest).
+    Files that are not available have an empty URL, date and size.
+    """
+
+    url: str
+    release: int
+    # Last modification date in the format "YYYY-MM-DD HH:MM"
+    date: str
+    # Size as listed on the Ensembl FTP site, e.g. "26M"
+    size: str
 
-from .constants import ENSEMBL_FTP_URL, ENSEMBL_FTP_URL_NV
+    def to_dict(self):
+        release_date, _, release_time = self.date.partition(" ")
+        return {
+            "ftp": self.url,
+            "ensembl_release": self.release,
+            "release_date": release_date,
+            "release_time": release_time,
+            "bytes": self.size,
+        }
 
 
 def find_FTP_link(url, link_substring):
@@ -28,39 +92,270 @@ def find_FTP_link(url, link_substring):
 
     Returns the link, date, and size as strings.
     """
-    html = requests.get(url)
-
-    # Raise error if status code not "OK" Response
-    if html.status_code != 200:
-        raise RuntimeError(
-            f"HTTP response status code {html.status_code}. Please try again.\n"
-        )
-
-    soup = BeautifulSoup(html.text, "html.parser")
-
     link_str = None
     date_str = None
     size_str = None
 
     # Get all entries from the website
-    links = [stuff.text.strip() for stuff in soup.findAll("td")]
-    for i, link in enumerate(links):
+    for link, date, size in get_ftp_files(url):
         # Find the correct link
         if link_substring in link:
             link_str = link
-            # Get date and size
-            date_str = links[i + 1]
-            size_str = links[i + 2]
+            date_str = date
+            size_str = size
 
     return link_str, date_str, size_str
 
 
+def species_manifest(
+    species, release, database=ENSEMBL_FTP_URL, kingdom=None, which=REF_FILES
+):
+    """
+    Build the manifest of the reference files available for a species.
+    The FTP directory of each file type is fetched and parsed only once,
+    and all directories are fetched concurrently.
+
+    Args:
+    - species   Species in the format "<genus>_<species>", e.g. "homo_sapiens".
+    - release   Ensembl release number.
+    - database  Link to the Ensembl FTP server (ENSEMBL_FTP_URL or ENSEMBL_FTP_URL_NV).
+    - kingdom   Kingdom of non-vertebrate species, e.g. "plants".
+    - which     File types to include (default: all), e.g. ["gtf", "dna"].
+
+    Returns a dictionary in the format {file type: RefFile}.
+    """
+    which = list(which)
+    base_url = database + f"release-{release}/"
+    if kingdom:
+        base_url += f"{kingdom}/"
+    urls = [
+        base_url + REF_FILES[file_type][1].format(species=species)
+        for file_type in which
+    ]
+
+    def fetch(file_type, url):
+        # ncRNA data is not available for all species
+        return get_ftp_files(url, missing_ok=file_type == "ncrna")
+
+    with futures.ThreadPoolExecutor(max(1, len(which))) as executor:
+        listings = list(executor.map(fetch, which, urls))
+
+    manifest = {}
+    for file_type, url, files in zip(which, urls, listings):
+        manifest[file_type] = RefFile("", int(release), "", "")
+        for substring in REF_FILES[file_type][2]:
+            substring = substring.format(release=release)
+            # Use the last listed file containing the substring
+            matches = [file for file in files if substring in file[0]]
+            if matches:
+                name, date, size = matches[-1]
+                manifest[file_type] = RefFile(url + name, int(release), date, size)
+                break
+
+    return manifest
+
+
+def ref_species(database=ENSEMBL_FTP_URL, release=None):
+    """
+    Returns a sorted list of all species for which both the genome FASTA and the GTF
+    are available. The FASTA and GTF listings are fetched concurrently.
+    """
+    with futures.ThreadPoolExecutor(2) as executor:
+        species_list_gtf, species_list_dna = executor.map(
+            lambda which: ref_species_options(which, database=database, release=release),
+            ["gtf", "dna"],
+        )
+
+    # Find intersection of the two lists
+    # (Only species which have GTF and FASTAs available can continue)
+    return sorted(set(species_list_gtf) & set(species_list_dna))
+
+
+def kingdom_species(kingdom, release=None):
+    """
+    Returns a sorted list of all species of a kingdom ('vertebrates', 'plants', 'protists',
+    'metazoa' or 'fungi') for which both the genome FASTA and the GTF are available.
+    """
+    if kingdom == "vertebrates":
+        return ref_species(release=release)
+
+    if release is None:
+        release = find_latest_ens_rel(ENSEMBL_FTP_URL_NV)
+    base_url = ENSEMBL_FTP_URL_NV + f"release-{release}/{kingdom}/"
+    with futures.ThreadPoolExecutor(2) as executor:
+        species_list_gtf, species_list_dna = executor.map(
+            get_ftp_listing, [base_url + "gtf/", base_url + "fasta/"]
+        )
+
+    return sorted(set(species_list_gtf[5:]) & set(species_list_dna[5:]))
+
+
+def resolve_species(species, release=None):
+    """
+    Find the Ensembl FTP server, release and (for non-vertebrates) kingdom of a species.
+    Raises a ValueError if the GTF and genome FASTA of the species are not available.
+
+    Returns the cleaned up species name, the FTP server, the release and the kingdom (or None).
+    """
+    # Species shortcuts
+    if species == "human":
+        species = "homo_sapiens"
+    if species == "mouse":
+        species = "mus_musculus"
+
+    # In case species was passed with upper case letters
+    species = species.lower()
+
+    ## For non-vertebrates, switch to non-vertebrate databases
+    if species in ref_species_options("dna", database=ENSEMBL_FTP_URL, release=release):
+        database = ENSEMBL_FTP_URL
+        # Find latest vertebrate Ensembl release
+        ENS_rel = find_latest_ens_rel(ENSEMBL_FTP_URL)
+    else:
+        database = ENSEMBL_FTP_URL_NV
+        # Find latest NV Ensembl release
+        ENS_rel = find_latest_ens_rel(database)
+
+    # If release != None, use user-defined Ensembl release
+    if release != None:
+        # Warn user when release is higher than the latest release
+        if release > ENS_rel:
+            logging.warning(
+                f"Provided Ensembl release number {release} is greater than the latest release ({ENS_rel})."
+            )
+        ENS_rel = release
+
+    ## Raise error if species not found (both FASTA and GTF have to be available)
+    species_list = ref_species(database=database, release=ENS_rel)
+
+    if species not in species_list:
+        raise ValueError(
+            f"Species does not match any available species for Ensembl release {ENS_rel}. Please double-check spelling.\n"
+            "'gget ref --list_species' -> lists out all available species (Python: 'gget.ref(None, list_species=True)').\n"
+            "Combine with `release` argument to define specific Ensembl release (default: latest).\n"
+        )
+
+    ## Find kingdom for non-vertebrate species
+    kingdom = None
+    if database == ENSEMBL_FTP_URL_NV:
+        kingdom = find_nv_kingdom(species, release=ENS_rel)
+
+    return species, database, ENS_rel, kingdom
+
+
+def ref_manifest(species, which="all", release=None, kingdom=None, verbose=True):
+    """
+    Build one long-format manifest of the reference files of several species.
+    The species are resolved and their FTP directories fetched concurrently
+    (the release and species listings are only fetched once).
+
+    Args:
+    - species   List of species, e.g. ["homo_sapiens", "mus_musculus"],
+                or "all" for all species of a kingdom.
+    - which     File types to include (default: 'all'), e.g. ["gtf", "dna"].
+    - release   Ensembl release number (default: latest release).
+    - kingdom   Kingdom used if species="all": 'vertebrates' (default), 'plants', 'protists', 'metazoa' or 'fungi'.
+    - verbose   True/False whether to print progress information (default: True).
+
+    Returns a data frame with one row per species and file type.
+    """
+    if type(which) == str:
+        which = [which]
+    if "all" in which:
+        file_types = FTP_ORDER
+    else:
+        file_types = list(dict.fromkeys(which))
+    if not file_types:
+        raise ValueError("Parameter 'which' must contain at least one file type.")
+
+    if isinstance(species, str):
+        if kingdom is None:
+            kingdom = "vertebrates"
+        if kingdom not in KINGDOMS:
+            raise ValueError(
+                f"Parameter 'kingdom' must be one of the following: {', '.join(KINGDOMS)}.\n"
+            )
+        species_list = kingdom_species(kingdom, release=release)
+        if verbose:
+            logging.info(
+                f"Fetching reference information for {len(species_list)} {kingdom} species."
+            )
+
+        if kingdom == "vertebrates":
+            database = ENSEMBL_FTP_URL
+            nv_kingdom = None
+        else:
+            database = ENSEMBL_FTP_URL_NV
+            nv_kingdom = kingdom
+        if release is None:
+            release = find_latest_ens_rel(database)
+        resolved = [(sp, database, release, nv_kingdom) for sp in species_list]
+
+    else:
+        species_list = list(dict.fromkeys(species))
+        if verbose:
+            logging.info(
+                f"Fetching reference information for {len(species_list)} species."
+            )
+
+        # Resolve all species concurrently
+        # (the species listings are memoized, so they are only fetched once)
+        with futures.ThreadPoolExecutor(
+            max(1, min(len(species_list), HTTP_POOL_MAXSIZE))
+        ) as executor:
+            future_species = [
+                executor.submit(resolve_species, sp, release) for sp in species_list
+            ]
+
+        resolved = []
+        not_found = []
+        for sp, future in zip(species_list, future_species):
+            try:
+                resolved.append(future.result())
+            except ValueError:
+                not_found.append(sp)
+        if not_found:
+            raise ValueError(
+                f"The following species do not match any available species: {', '.join(not_found)}. Please double-check spelling.\n"
+                "'gget ref --list_species' -> lists out all available species (Python: 'gget.ref(None, list_species=True)').\n"
+            )
+
+    if not species_list:
+        logging.warning("No species were found. Returning an empty manifest.")
+        return pd.DataFrame(columns=MANIFEST_COLUMNS)
+
+    # Fetch the manifests of all species concurrently
+    # (each manifest fetches the directories of all file types concurrently)
+    workers = max(1, min(len(resolved), HTTP_POOL_MAXSIZE // len(file_types)))
+    with futures.ThreadPoolExecutor(workers) as executor:
+        manifests = list(
+            executor.map(
+                lambda res: species_manifest(
+                    res[0], res[2], database=res[1], kingdom=res[3], which=file_types
+                ),
+                resolved,
+            )
+        )
+
+    rows = []
+    for res, manifest in zip(resolved, manifests):
+        for file_type in file_types:
+            rows.append(
+                {"species": res[0], "file_type": file_type, **manifest[file_type].to_dict()}
+            )
+
+    return pd.DataFrame(rows, columns=MANIFEST_COLUMNS)
+
+
 def ref(
     species,
     which="all",
     release=None,
     ftp=False,
     save=False,
+    download=False,
+    kingdom=None,
+    json=False,
     list_species=False,
     list_iv_species=False,
     verbose=True,
@@ -71,6 +366,9 @@ def ref(
     Args:
     - species         Defines the species for which the reference should be fetched in the format "<genus>_<species>",
                       e.g. species = "homo_sapiens".
+                      Several species can be passed as a list, e.g. species = ["homo_sapiens", "mus_musculus"],
+                      and species = "all" fetches the references of all species of a kingdom (see 'kingdom').
+                      Multiple species return one table with one row per species and file type.
     - which           Defines which results to return.
                       Default: 'all' -> Returns all available results.
                       Possible entries are one or a combination (as a list of strings) of the following:
@@ -84,6 +382,11 @@ def ref(
                       Default: None -> latest Ensembl release is used
     - ftp             Return only the requested FTP links in a list (default: False).
     - save            Save the results in the local directory (default: False).
+    - download        Download the requested files to the current directory (default: False).
+                      Files are downloaded concurrently, partial downloads are resumed and
+                      files are verified against the Ensembl CHECKSUMS files.
+    - kingdom         Kingdom of the species if species = "all": 'vertebrates' (default), 'plants', 'protists', 'metazoa' or 'fungi'.
+    - json            If True and several species are passed, returns the results in json format instead of data frame (default: False).
     - list_species    If True and `species=None`, returns a list of all available VERTEBRATE species from the Ensembl database (default: False).
                       (Can be combined with the `release` argument to get the available species from a specific Ensembl release.)
     - list_iv_species If True and `species=None`, returns a list of all available INVERTEBRATE species from the Ensembl database (default: False).
@@ -92,6 +395,8 @@ def ref(
 
     Returns a dictionary containing the requested URLs with their respective Ensembl version and release date and time.
     (If FTP=True, returns a list containing only the URLs.)
+    If several species are passed, returns a data frame with the columns
+    species, file_type, ftp, ensembl_release, release_date, release_time and bytes.
     """
     # Return list of all available species
     if list_species:
@@ -106,20 +411,14 @@ def ref(
                     f"Fetching available vertebrate genomes (GTF and FASTA available) from Ensembl release {release}."
                 )
 
-        # Find all available species for GTFs for this Ensembl release
-        species_list_gtf = ref_species_options("gtf", release=release)
-        # Find all available species for FASTAs for this Ensembl release
-        species_list_dna = ref_species_options("dna", release=release)
-
-        # Find intersection of the two lists
-        # (Only species which have GTF and FASTAs available can continue)
-        species_list = list(set(species_list_gtf) & set(species_list_dna))
+        # Find all available species with GTFs and FASTAs for this Ensembl release
+        species_list = ref_species(release=release)
 
         if save:
             with open("ensembl_species.txt", 'w') as tfile:
                 tfile.write('\n'.join(species_list))
 
-        return sorted(species_list)
+        return species_list
 
     # Return list of all available invertebrate species
     elif list_iv_species:
@@ -134,24 +433,14 @@ def ref(
                     f"Fetching available invertebrate genomes (GTF and FASTA present) from Ensembl release {release}."
                 )
 
-        # Find all available species for GTFs for this Ensembl release
-        species_list_gtf = ref_species_options(
-            "gtf", database=ENSEMBL_FTP_URL_NV, release=release
-        )
-        # Find all available species for FASTAs for this Ensembl release
-        species_list_dna = ref_species_options(
-            "dna", database=ENSEMBL_FTP_URL_NV, release=release
-        )
-
-        # Find intersection of the two lists
-        # (Only species which have GTF and FASTAs available can continue)
-        species_list = list(set(species_list_gtf) & set(species_list_dna))
+        # Find all available species with GTFs and FASTAs for this Ensembl release
+        species_list = ref_species(database=ENSEMBL_FTP_URL_NV, release=release)
 
         if save:
             with open("ensembl_iv_species.txt", 'w') as tfile:
                 tfile.write('\n'.join(species_list))
 
-        return sorted(species_list)
+        return species_list
 
     ## Check 'which' parameter
     # If single which passed as string, convert to list
@@ -170,332 +459,72 @@ def ref(
             f"Parameter 'which' must be 'all', or any one or a combination of the following: 'gtf', 'cdna', 'dna', 'cds', 'ncrna', 'pep'.\n"
         )
 
-    # Species shortcuts
-    if species == "human":
-        species = "homo_sapiens"
-    if species == "mouse":
-        species = "mus_musculus"
-
-    # In case species was passed with upper case letters
-    species = species.lower()
-
-    ## For non-vertebrates, switch to non-vertebrate databases
-    if species in ref_species_options("dna", database=ENSEMBL_FTP_URL, release=release):
-        database = ENSEMBL_FTP_URL
-        # Find latest vertebrate Ensembl release
-        ENS_rel = find_latest_ens_rel(ENSEMBL_FTP_URL)
-    else:
-        database = ENSEMBL_FTP_URL_NV
-        # Find latest NV Ensembl release
-        ENS_rel = find_latest_ens_rel(database)
-
-    # If release != None, use user-defined Ensembl release
-    if release != None:
-        # Warn user when release is higher than the latest release
-        if release > ENS_rel:
-            logging.warning(
-                f"Provided Ensembl release number {release} is greater than the latest release ({ENS_rel})."
-            )
-        ENS_rel = release
-
-    ## Raise error if species not found (both FASTA and GTF have to be available)
-    # Find all available species for genome FASTAs for this Ensembl release
-    species_list_dna = ref_species_options("dna", database=database, release=ENS_rel)
-    # Find all available species for GTFs for this Ensembl release
-    species_list_gtf = ref_species_options("gtf", database=database, release=ENS_rel)
-    # Find intersection of the two lists
-    # (Only species which have GTF and FASTAs available can continue)
-    species_list = list(set(species_list_gtf) & set(species_list_dna))
-
-    if species not in species_list:
-        raise ValueError(
-            f"Species does not match any available species for Ensembl release {ENS_rel}. Please double-check spelling.\n"
-            "'gget ref --list_species' -> lists out all available species (Python: 'gget.ref(None, list_species=True)').\n"
-            "Combine with `release` argument to define specific Ensembl release (default: latest).\n"
-        )
-
-    ## Find kingdom for non-vertebrate species
-    if database == ENSEMBL_FTP_URL_NV:
-        kingdom = find_nv_kingdom(species, release=ENS_rel)
-
-    ## Get GTF link for this species and release
-    if "all" in which or "gtf" in which:
-        # Define location of GTF links
-        if database == ENSEMBL_FTP_URL_NV:
-            gtf_search_url = database + f"release-{ENS_rel}/{kingdom}/gtf/{species}/"
-        else:
-            gtf_search_url = database + f"release-{ENS_rel}/gtf/{species}/"
-
-        # Get link, release date and dataset size
-        gtf_str, gtf_date, gtf_size = find_FTP_link(
-            url=gtf_search_url, link_substring=f"{ENS_rel}.gtf.gz"
+    ## Several species (or all species of a kingdom)
+    if not isinstance(species, str) or species.lower() == "all":
+        df = ref_manifest(
+            species if not isinstance(species, str) else "all",
+            which=which,
+            release=release,
+            kingdom=kingdom,
+            verbose=verbose,
         )
-        # Build the final download link
-        if not isinstance(gtf_str, type(None)):
-            gtf_url = gtf_search_url + gtf_str
-        else:
-            gtf_url = ""
-            gtf_date = " "
-            gtf_size = ""
-
-    ## Get cDNA FASTA link for this species and release
-    if "all" in which or "cdna" in which:
-        if database == ENSEMBL_FTP_URL_NV:
-            # Define location of cdna links
-            cdna_search_url = (
-                database + f"release-{ENS_rel}/{kingdom}/fasta/{species}/cdna/"
-            )
-        else:
-            # Define location of cdna links
-            cdna_search_url = database + f"release-{ENS_rel}/fasta/{species}/cdna/"
+        links = [link for link in df["ftp"] if link]
 
-        # Get link, release date and dataset size
-        cdna_str, cdna_date, cdna_size = find_FTP_link(
-            url=cdna_search_url, link_substring="cdna.all.fa"
-        )
-        # Build the final download link
-        if not isinstance(cdna_str, type(None)):
-            cdna_url = cdna_search_url + cdna_str
-        else:
-            cdna_url = ""
-            cdna_date = " "
-            cdna_size = ""
-
-    ## Get DNA FASTA link for this species and release
-    if "all" in which or "dna" in which:
-        # Define location of dna links
-        if database == ENSEMBL_FTP_URL_NV:
-            dna_search_url = (
-                database + f"release-{ENS_rel}/{kingdom}/fasta/{species}/dna/"
-            )
-        else:
-            dna_search_url = database + f"release-{ENS_rel}/fasta/{species}/dna/"
-        # Get link, release date and dataset size
-        dna_str, dna_date, dna_size = find_FTP_link(
-            url=dna_search_url, link_substring=".dna.primary_assembly.fa"
-        )
+        if ftp:
+            if save:
+                with open('gget_ref_results.txt', 'w') as tfile:
+                    tfile.write('\n'.join(links))
+            results = links
 
-        # Get toplevel if primary assembly not available
-        if dna_str is None:
-            # Get link, release date and dataset size
-            dna_str, dna_date, dna_size = find_FTP_link(
-                url=dna_search_url, link_substring=".dna.toplevel.fa"
-            )
+        elif json:
+            results = json_package.loads(df.to_json(orient="records"))
+            if save:
+                with open("gget_ref_results.json", "w", encoding="utf-8") as f:
+                    json_package.dump(results, f, ensure_ascii=False, indent=4)
 
-        # Build the final download link
-        if not isinstance(dna_str, type(None)):
-            dna_url = dna_search_url + dna_str
-        else:
-            dna_url = ""
-            dna_date = " "
-            dna_size = ""
-
-    ## Get CDS FASTA link for this species and release
-    if "all" in which or "cds" in which:
-        # Define location of cds links
-        if database == ENSEMBL_FTP_URL_NV:
-            cds_search_url = (
-                database + f"release-{ENS_rel}/{kingdom}/fasta/{species}/cds/"
-            )
-        else:
-            cds_search_url = database + f"release-{ENS_rel}/fasta/{species}/cds/"
-        # Get link, release date and dataset size
-        cds_str, cds_date, cds_size = find_FTP_link(
-            url=cds_search_url, link_substring="cds.all.fa"
-        )
-        # Build the final download link
-        if not isinstance(cds_str, type(None)):
-            cds_url = cds_search_url + cds_str
         else:
-            cds_url = ""
-            cds_date = " "
-            cds_size = ""
-
-    ## Get ncRNA FASTA link for this species and release (if available)
-    if "all" in which or "ncrna" in which:
-        # Define location of ncRNA links
-        if database == ENSEMBL_FTP_URL_NV:
-            ncrna_search_url = (
-                database + f"release-{ENS_rel}/{kingdom}/fasta/{species}/ncrna/"
-            )
-        else:
-            ncrna_search_url = database + f"release-{ENS_rel}/fasta/{species}/ncrna/"
-
-        html = requests.get(ncrna_search_url)
+            if save:
+                df.to_csv("gget_ref_results.csv", index=False)
+            results = df
 
-        # If ncRNA data is not available, HTML requests returns an error code (!= 200)
-        if html.status_code == 200:
-            soup = BeautifulSoup(html.text, "html.parser")
+        if download:
+            download_files(links, verbose=verbose)
 
-            # Get all entries from the website
-            links = [stuff.text.strip() for stuff in soup.findAll("td")]
-            for i, link in enumerate(links):
-                # Find the correct link
-                if ".ncrna.fa" in link:
-                    ncrna_str = link
-                    # Get date and size
-                    ncrna_date = links[i + 1]
-                    ncrna_size = links[i + 2]
+        return results
 
-            ncrna_url = ncrna_search_url + ncrna_str
+    species, database, ENS_rel, kingdom = resolve_species(species, release=release)
 
-        # If the HTML request returned an error code here, I will assume that ncRNA data is not available
-        else:
-            ncrna_url = ""
-            ncrna_date = " "
-            ncrna_size = ""
-
-    ## Get pep FASTA link for this species and release
-    if "all" in which or "pep" in which:
-        # Define location of pep links
-        if database == ENSEMBL_FTP_URL_NV:
-            pep_search_url = (
-                database + f"release-{ENS_rel}/{kingdom}/fasta/{species}/pep/"
-            )
-        else:
-            pep_search_url = database + f"release-{ENS_rel}/fasta/{species}/pep/"
-        # Get link, release date and dataset size
-        pep_str, pep_date, pep_size = find_FTP_link(
-            url=pep_search_url, link_substring=".pep.all.fa"
-        )
-        # Build the final download link
-        if not isinstance(pep_str, type(None)):
-            pep_url = pep_search_url + pep_str
-        else:
-            pep_url = ""
-            pep_date = " "
-            pep_size = ""
+    ## Get the links, release dates and dataset sizes of the requested files
+    if "all" in which:
+        file_types = list(REF_FILES)
+    else:
+        file_types = list(dict.fromkeys(which))
+    manifest = species_manifest(
+        species, ENS_rel, database=database, kingdom=kingdom, which=file_types
+    )
 
     ## Return results
     # If FTP=False, return dictionary/json of specified results
     if ftp is False:
         ref_dict = {species: {}}
         for return_val in which:
-            if return_val == "all":
-                ref_dict = {
-                    species: {
-                        "transcriptome_cdna": {
-                            "ftp": cdna_url,
-                            "ensembl_release": int(ENS_rel),
-                            "release_date": cdna_date.split(" ")[0],
-                            "release_time": cdna_date.split(" ")[1],
-                            "bytes": cdna_size,
-                        },
-                        "genome_dna": {
-                            "ftp": dna_url,
-                            "ensembl_release": int(ENS_rel),
-                            "release_date": dna_date.split(" ")[0],
-                            "release_time": dna_date.split(" ")[1],
-                            "bytes": dna_size,
-                        },
-                        "annotation_gtf": {
-                            "ftp": gtf_url,
-                            "ensembl_release": int(ENS_rel),
-                            "release_date": gtf_date.split(" ")[0],
-                            "release_time": gtf_date.split(" ")[1],
-                            "bytes": gtf_size,
-                        },
-                        "coding_seq_cds": {
-                            "ftp": cds_url,
-                            "ensembl_release": int(ENS_rel),
-                            "release_date": cds_date.split(" ")[0],
-                            "release_time": cds_date.split(" ")[1],
-                            "bytes": cds_size,
-                        },
-                        "non-coding_seq_ncRNA": {
-                            "ftp": ncrna_url,
-                            "ensembl_release": int(ENS_rel),
-                            "release_date": ncrna_date.split(" ")[0],
-                            "release_time": ncrna_date.split(" ")[1],
-                            "bytes": ncrna_size,
-                        },
-                        "protein_translation_pep": {
-                            "ftp": pep_url,
-                            "ensembl_release": int(ENS_rel),
-                            "release_date": pep_date.split(" ")[0],
-                            "release_time": pep_date.split(" ")[1],
-                            "bytes": pep_size,
-                        },
-                    }
-                }
-            elif return_val == "gtf":
-                dict_temp = {
-                    "annotation_gtf": {
-                        "ftp": gtf_url,
-                        "ensembl_release": int(ENS_rel),
-                        "release_date": gtf_date.split(" ")[0],
-                        "release_time": gtf_date.split(" ")[1],
-                        "bytes": gtf_size,
-                    },
-                }
-                ref_dict[species].update(dict_temp)
-            elif return_val == "cdna":
-                dict_temp = {
-                    "transcriptome_cdna": {
-                        "ftp": cdna_url,
-                        "ensembl_release": int(ENS_rel),
-                        "release_date": cdna_date.split(" ")[0],
-                        "release_time": cdna_date.split(" ")[1],
-                        "bytes": cdna_size,
-                    },
-                }
-                ref_dict[species].update(dict_temp)
-            elif return_val == "dna":
-                dict_temp = {
-                    "genome_dna": {
-                        "ftp": dna_url,
-                        "ensembl_release": int(ENS_rel),
-                        "release_date": dna_date.split(" ")[0],
-                        "release_time": dna_date.split(" ")[1],
-                        "bytes": dna_size,
-                    },
-                }
-                ref_dict[species].update(dict_temp)
-            elif return_val == "cds":
-                dict_temp = {
-                    "coding_seq_cds": {
-                        "ftp": cds_url,
-                        "ensembl_release": int(ENS_rel),
-                        "release_date": cds_date.split(" ")[0],
-                        "release_time": cds_date.split(" ")[1],
-                        "bytes": cds_size,
-                    },
-                }
-                ref_dict[species].update(dict_temp)
-            elif return_val == "ncrna":
-                dict_temp = {
-                    "non-coding_seq_ncRNA": {
-                        "ftp": ncrna_url,
-                        "ensembl_release": int(ENS_rel),
-                        "release_date": ncrna_date.split(" ")[0],
-                        "release_time": ncrna_date.split(" ")[1],
-                        "bytes": ncrna_size,
-                    },
-                }
-                ref_dict[species].update(dict_temp)
-            elif return_val == "pep":
-                dict_temp = {
-                    "protein_translation_pep": {
-                        "ftp": pep_url,
-                        "ensembl_release": int(ENS_rel),
-                        "release_date": pep_date.split(" ")[0],
-                        "release_time": pep_date.split(" ")[1],
-                        "bytes": pep_size,
-                    },
-                }
-                ref_dict[species].update(dict_temp)
-            else:
-                raise ValueError(
-                    "Parameter 'which' must be 'all', or any one or a combination of the following: 'gtf', 'cdna', 'dna', 'cds', 'ncrna', 'pep'.\n"
-                )
+            for file_type in REF_FILES if return_val == "all" else [return_val]:
+                ref_dict[species][REF_FILES[file_type][0]] = manifest[
+                    file_type
+                ].to_dict()
 
         if save:
             with open("gget_ref_results.json", "w", encoding="utf-8") as file:
-                json.dump(ref_dict, file, ensure_ascii=False, indent=4)
+                json_package.dump(ref_dict, file, ensure_ascii=False, indent=4)
         if verbose:
             logging.info(
                 f"Fetching reference information for {species} from Ensembl release: {ENS_rel}."
             )
+        if download:
+            download_files(
+                [ftp_info["ftp"] for ftp_info in ref_dict[species].values()],
+                verbose=verbose,
+            )
         return ref_dict
 
     # If FTP==True, return only the specified URLs as a list
@@ -506,32 +535,14 @@ def ref(
             )
         results = []
         for return_val in which:
-            if return_val == "all":
-                results.append(gtf_url)
-                results.append(cdna_url)
-                results.append(dna_url)
-                results.append(cds_url)
-                results.append(ncrna_url)
-                results.append(pep_url)
-            elif return_val == "gtf":
-                results.append(gtf_url)
-            elif return_val == "cdna":
-                results.append(cdna_url)
-            elif return_val == "dna":
-                results.append(dna_url)
-            elif return_val == "cds":
-                results.append(cds_url)
-            elif return_val == "ncrna":
-                results.append(ncrna_url)
-            elif return_val == "pep":
-                results.append(pep_url)
-            else:
-                raise ValueError(
-                    "Parameter 'which' must be 'all', or any one or a combination of the following: 'gtf', 'cdna', 'dna', 'cds', 'ncrna', 'pep'.\n"
-                )
+            for file_type in FTP_ORDER if return_val == "all" else [return_val]:
+                results.append(manifest[file_type].url)
 
         if save:
             with open('gget_ref_results.txt', 'w') as tfile:
                 tfile.write('\n'.join(results))
 
+        if download:
+            download_files(results, verbose=verbose)
+
         return results
@@ -2,6 +2,9 @@ import numpy as np
 import json as json_package
 import mysql.connector as sql
 import time
+import atexit
+import threading
+import contextlib
 import logging
 
 # Add and format time stamp in logging messages
@@ -26,8 +29,16 @@ from gget.utils import (
     wrap_cols_func,
     find_nv_kingdom,
 )
-
-from gget.constants import ENSEMBL_FTP_URL, ENSEMBL_FTP_URL_NV
+from gget.search_index import get_search_index, query_search_index
+
+from gget.constants import (
+    ENSEMBL_FTP_URL,
+    ENSEMBL_FTP_URL_NV,
+    ENSEMBL_MYSQL_HOST,
+    ENSEMBL_MYSQL_PORTS,
+    ENSEMBL_MYSQL_USER,
+    MYSQL_POOL_MAX_IDLE,
+)
 
 
 def clean_cols(x):
@@ -41,15 +52,280 @@ def clean_cols(x):
         return x
 
 
-def clean_cols(x):
-    if isinstance(x, list):
-        unique_list = list(set(x))
-        if len(unique_list) == 1:
-            return unique_list[0]
+def collapse_results(df, id_col="ensembl_id", list_cols=("synonym",)):
+    """
+    Collapse search results (one row per joined match) to one row per ID.
+    Columns with a single unique value per ID are returned as scalars and columns
+    with several unique values as lists, except for the columns in list_cols,
+    which are always returned as sorted lists.
+
+    Equivalent to (but much faster than) the element-wise collapse
+    df.groupby(id_col).agg(tuple).map(list).map(clean_cols) for large results,
+    since rows are deduplicated and grouped on the integer group codes and
+    Python lists are only built for IDs with more than one unique value.
+    Unlike set(), values within a list keep the order in which they were found.
+    """
+    # Integer code per ID (sorted like groupby; missing IDs are dropped)
+    codes, ids = pd.factorize(df[id_col], sort=True)
+    keep = codes >= 0
+    codes = codes[keep]
+    n_ids = len(ids)
+
+    collapsed = {id_col: ids.to_numpy(object)}
+    for col in df.columns.drop(id_col):
+        # Unique (ID, value) pairs, ordered by ID
+        pairs = pd.DataFrame(
+            {"code": codes, "value": df[col].to_numpy(object)[keep]}
+        ).drop_duplicates()
+        if col in list_cols:
+            pairs = pairs.sort_values(["code", "value"], kind="stable")
         else:
-            return unique_list
+            pairs = pairs.sort_values("code", kind="stable")
+
+        values = pairs["value"].to_numpy(object)
+        counts = np.bincount(pairs["code"].to_numpy(), minlength=n_ids)
+        starts = np.cumsum(counts) - counts
+
+        column = np.empty(n_ids, dtype=object)
+        if col in list_cols:
+            multi = np.arange(n_ids)
+        else:
+            single = counts == 1
+            column[single] = values[starts[single]]
+            multi = np.flatnonzero(~single)
+        for i in multi:
+            column[i] = values[starts[i] : starts[i] + counts[i]].tolist()
+        collapsed[col] = column
+
+    return pd.DataFrame(collapsed, columns=df.columns.tolist())
+
+
+class MySQLConnectionPool:
+    """
+    Thread-safe pool of MySQL connections keyed by (host, port, database).
+
+    Idle connections are health-checked (pinged) before they are reused, and the port
+    that worked last for a host is tried first for new connections.
+    The pool can be used as a context manager, which closes all idle connections on exit:
+
+        with MySQLConnectionPool() as pool:
+            with pool.connection("homo_sapiens_core_111_38") as conn:
+                ...
+    """
+
+    def __init__(self, max_idle=MYSQL_POOL_MAX_IDLE):
+        """
+        Args:
+        - max_idle  Maximum number of idle connections kept open per (host, port, database).
+        """
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        # (host, port, database) -> list of idle connections
+        self._idle = {}
+        # host -> port of the last successful connection
+        self._ports = {}
+
+    def _ports_to_try(self, host, ports):
+        # Try the port that worked last first
+        port = self._ports.get(host)
+        if port in ports:
+            return [port] + [p for p in ports if p != port]
+        return list(ports)
+
+    def acquire(
+        self,
+        database,
+        host=ENSEMBL_MYSQL_HOST,
+        ports=ENSEMBL_MYSQL_PORTS,
+        user=ENSEMBL_MYSQL_USER,
+        password="",
+    ):
+        """
+        Get a connection to a database from the pool (or open a new one).
+        Returns the connection and its pool key (host, port, database), which are
+        passed to release() once the connection is no longer used.
+        """
+        with self._lock:
+            ports = self._ports_to_try(host, ports)
+
+        # Reuse an idle connection if it is still alive
+        for port in ports:
+            key = (host, port, database)
+            while True:
+                with self._lock:
+                    if not self._idle.get(key):
+                        break
+                    conn = self._idle[key].pop()
+                try:
+                    if conn.is_connected():
+                        return conn, key
+                except Exception:
+                    pass
+                self._close(conn)
+
+        # Open a new connection
+        error = None
+        for port in ports:
+            try:
+                conn = sql.connect(
+                    host=host,
+                    database=database,
+                    user=user,
+                    password=password,
+                    port=port,
+                )
+            except Exception as e:
+                error = e
+                continue
+
+            with self._lock:
+                self._ports[host] = port
+            return conn, (host, port, database)
+
+        if error is None:
+            raise RuntimeError(
+                f"No ports were given to connect to the MySQL server {host}."
+            )
+        if "Access denied" in str(error):
+            raise RuntimeError(
+                f"""
+                The Ensembl server returned the following error: {error}.
+                This might be caused by the Ensembl release number being too low. 
+                Please try again with a more recent release.
+                """
+            )
+        else:
+            raise RuntimeError(
+                f"The Ensembl server returned the following error: {error}"
+            )
+
+    def release(self, conn, key):
+        """
+        Return a connection to the pool (the connection is closed if the pool is full).
+        """
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        self._close(conn)
+
+    @contextlib.contextmanager
+    def connection(self, database, **kwargs):
+        """
+        Context manager yielding a pooled connection to a database (see acquire).
+        """
+        conn, key = self.acquire(database, **kwargs)
+        try:
+            yield conn
+        except Exception:
+            # Do not reuse connections that might be in an undefined state
+            self._close(conn)
+            raise
+        else:
+            self.release(conn, key)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            connections = [conn for idle in self._idle.values() for conn in idle]
+            self._idle = {}
+        for conn in connections:
+            self._close(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Connection pool shared by all gget search calls
+MYSQL_POOL = MySQLConnectionPool()
+atexit.register(MYSQL_POOL.close)
+
+
+def close_connections():
+    """
+    Close all idle connections to the Ensembl MySQL server opened by gget search.
+    """
+    MYSQL_POOL.close()
+
+
+def search_query(searchwords, id_type="gene", andor="or", limit=None):
+    """
+    Build a single MySQL query returning the search results for all searchwords.
+
+    "or": Returns all rows matching at least one of the searchwords.
+    "and": Returns the rows matching the first searchword of all genes/transcripts that
+    match each of the searchwords (at least once, in any of the searched fields).
+    If limit is not None, only the results for the first {limit} Ensembl IDs are returned.
+
+    Returns the query and the list of query parameters.
+    """
+    t = id_type
+
+    joins = f"""
+            LEFT JOIN xref ON {t}.display_xref_id = xref.xref_id 
+            LEFT JOIN external_synonym ON {t}.display_xref_id = external_synonym.xref_id 
+            LEFT JOIN {t}_attrib ON {t}.{t}_id = {t}_attrib.{t}_id 
+            """
+
+    # Condition matching one searchword in any of the searched fields
+    match = f"({t}.description LIKE %s OR xref.description LIKE %s OR xref.display_label LIKE %s OR external_synonym.synonym LIKE %s OR {t}_attrib.value LIKE %s)"
+    n_fields = match.count("%s")
+
+    def match_params(searchword):
+        return [f"%{searchword}%"] * n_fields
+
+    match_any = "(" + " OR ".join([match] * len(searchwords)) + ")"
+    params_any = [p for sw in searchwords for p in match_params(sw)]
+
+    select = f"""
+            SELECT {t}.stable_id AS 'ensembl_id', xref.display_label AS 'gene_name', {t}.description AS 'ensembl_description', xref.description AS 'ext_ref_description', {t}.biotype AS 'biotype', external_synonym.synonym AS 'synonym'
+            FROM {t} 
+            """
+
+    if andor == "or" and limit is None:
+        query = select + joins + f"WHERE {match_any}"
+        return query, params_any
+
+    # Find the Ensembl IDs matching the searchwords
+    # (with 'and', each searchword needs to match at least one row of the Ensembl ID)
+    ids_query = f"SELECT {t}.stable_id AS stable_id FROM {t} " + joins
+    ids_query += f"WHERE {match_any} GROUP BY {t}.stable_id "
+    ids_params = params_any
+    if andor == "and":
+        ids_query += "HAVING " + " AND ".join(
+            [f"SUM({match}) > 0"] * len(searchwords)
+        )
+        ids_params = ids_params + [p for sw in searchwords for p in match_params(sw)]
+    if limit is not None:
+        ids_query += f" ORDER BY {t}.stable_id LIMIT {int(limit)}"
+
+    query = (
+        select
+        + f"JOIN ({ids_query}) AS matches ON {t}.stable_id = matches.stable_id "
+        + joins
+    )
+    if andor == "and":
+        # Only return the rows matching the first searchword
+        query += f"WHERE {match}"
+        params = ids_params + match_params(searchwords[0])
     else:
-        return x
+        query += f"WHERE {match_any}"
+        params = ids_params + params_any
+
+    return query, params
 
 
 def search(
@@ -64,6 +340,7 @@ def search(
     json=False,
     save=False,
     verbose=True,
+    backend="mysql",
 ):
     """
     Function to query Ensembl for genes based on species and free form search terms.
@@ -92,6 +369,10 @@ def search(
     - json            If True, returns results in json format instead of data frame. Default: False.
     - save            If True, the data frame is saved as a csv in the current directory (default: False).
     - verbose         True/False whether to print progress information. Default True.
+    - backend         "mysql" (default) or "local"
+                      "mysql": Queries the public Ensembl MySQL server.
+                      "local": Queries a local search index built from the MySQL dump of the core database on the Ensembl FTP site.
+                      The index is downloaded and built once per species and release (see gget.constants.SEARCH_INDEX_DIR).
 
     Returns a data frame with the query results.
 
@@ -125,6 +406,14 @@ def search(
             f"'andor' argument specified as {andor}. Expected one of {', '.join(andors)}"
         )
 
+    # Check if backend is valid
+    backends = ["mysql", "local"]
+    backend = backend.lower()
+    if backend not in backends:
+        raise ValueError(
+            f"'backend' argument specified as {backend}. Expected one of {', '.join(backends)}"
+        )
+
     ## Get database for specified species
     # Species shortcuts
     if species == "human":
@@ -198,38 +487,9 @@ def search(
     if verbose:
         logging.info(f"Fetching results from database: {db}")
 
-    ## Connect to data base
-    try:
-        db_connection = sql.connect(
-            host="mysql-eg-publicsql.ebi.ac.uk",
-            database=db,
-            user="anonymous",
-            password="",
-        )
-    except:
-        try:
-            # Try different port
-            db_connection = sql.connect(
-                host="mysql-eg-publicsql.ebi.ac.uk",
-                database=db,
-                user="anonymous",
-                password="",
-                port=4157,
-            )
-
-        except Exception as e:
-            if "Access denied" in e:
-                raise RuntimeError(
-                    f"""
-                    The Ensembl server returned the following error: {e}.
-                    This might be caused by the Ensembl release number being too low. 
-                    Please try again with a more recent release.
-                    """
-                )
-            else:
-                raise RuntimeError(
-                    f"The Ensembl server returned the following error: {e}"
-                )
+    if backend == "local":
+        # Build the local search index if it does not exist yet
+        index_path = get_search_index(db, verbose=verbose)
 
     ## Clean up list of searchwords
     # If single searchword passed as string, convert to list
@@ -237,103 +497,37 @@ def search(
         searchwords = [searchwords]
 
     ## Find genes
-    for i, searchword in enumerate(searchwords):
-        if id_type == "gene":
-            query = f"""
-            SELECT gene.stable_id AS 'ensembl_id', xref.display_label AS 'gene_name', gene.description AS 'ensembl_description', xref.description AS 'ext_ref_description', gene.biotype AS 'biotype', external_synonym.synonym AS 'synonym'
-            FROM gene 
-            LEFT JOIN xref ON gene.display_xref_id = xref.xref_id 
-            LEFT JOIN external_synonym ON gene.display_xref_id = external_synonym.xref_id 
-            LEFT JOIN gene_attrib ON gene.gene_id = gene_attrib.gene_id 
-            WHERE (gene.description LIKE '%{searchword}%' OR xref.description LIKE '%{searchword}%' OR xref.display_label LIKE '%{searchword}%' OR external_synonym.synonym LIKE '%{searchword}%' OR gene_attrib.value LIKE '%{searchword}%')
-            """
-
-            # Fetch the search results from the host using the specified query
-            df_temp = pd.read_sql(query, con=db_connection)
-
-            # Order by ENSEMBL ID (I am using pandas for this instead of SQL to increase speed)
-            df_temp = df_temp.sort_values("ensembl_id").reset_index(drop=True)
-
-            # If andor="or", keep all results
-            if andor == "or":
-                # In the first iteration, make the search results equal to the master data frame
-                if i == 0:
-                    df = df_temp.copy()
-                # Add new search results to master data frame
-                else:
-                    df = pd.concat([df, df_temp])
-
-            # If andor="and", only keep overlap between results
-            if andor == "and":
-                # In the first iteration, make the search results equal to the master data frame
-                if i == 0:
-                    df = df_temp.copy()
-                # Only keep overlapping results in master data frame
-                else:
-                    val = np.intersect1d(df["ensembl_id"], df_temp["ensembl_id"])
-                    df = df[df.ensembl_id.isin(val)]
-
-        if id_type == "transcript":
-            query = f"""
-            SELECT transcript.stable_id AS 'ensembl_id', xref.display_label AS 'gene_name', transcript.description AS 'ensembl_description', xref.description AS 'ext_ref_description', transcript.biotype AS 'biotype', external_synonym.synonym AS 'synonym'
-            FROM transcript 
-            LEFT JOIN xref ON transcript.display_xref_id = xref.xref_id 
-            LEFT JOIN external_synonym ON transcript.display_xref_id = external_synonym.xref_id 
-            LEFT JOIN transcript_attrib ON transcript.transcript_id = transcript_attrib.transcript_id 
-            WHERE (transcript.description LIKE '%{searchword}%' OR xref.description LIKE '%{searchword}%' OR xref.display_label LIKE '%{searchword}%' OR external_synonym.synonym LIKE '%{searchword}%' OR transcript_attrib.value LIKE '%{searchword}%')
-            """
+    # All searchwords are combined into a single query
+    # (the limit is applied to the Ensembl IDs on the server side)
+    if backend == "local":
+        # Fetch the search results from the local search index
+        df = query_search_index(
+            index_path, searchwords, id_type=id_type, andor=andor, limit=limit
+        )
 
-            # Fetch the search results from the host using the specified query
-            df_temp = pd.read_sql(query, con=db_connection)
-            # Order by ENSEMBL ID (I am using pandas for this instead of SQL to increase speed)
-            df_temp = df_temp.sort_values("ensembl_id").reset_index(drop=True)
-
-            # If andor="or", keep all results
-            if andor == "or":
-                # In the first iteration, make the search results equal to the master data frame
-                if i == 0:
-                    df = df_temp.copy()
-                # Add new search results to master data frame
-                else:
-                    df = pd.concat([df, df_temp])
-            # If andor="and", only keep overlap between results
-            if andor == "and":
-                # In the first iteration, make the search results equal to the master data frame
-                if i == 0:
-                    df = df_temp.copy()
-                # Only keep overlapping results in master data frame
-                else:
-                    val = np.intersect1d(df["ensembl_id"], df_temp["ensembl_id"])
-                    df = df[df.ensembl_id.isin(val)]
+    else:
+        query, params = search_query(
+            searchwords, id_type=id_type, andor=andor, limit=limit
+        )
+        # Fetch the search results from the host using the specified query
+        # (connections are reused across gget search calls, see MYSQL_POOL)
+        with MYSQL_POOL.connection(db) as db_connection:
+            df = pd.read_sql(query, con=db_connection, params=params)
 
     # Remove any duplicate search results from the master data frame and reset the index
     df = df.drop_duplicates().reset_index(drop=True)
 
     # Collapse entries for the same Ensembl ID
-    # .applymap was renamed to .map in pandas 2.1.0
-    try:
-        df = df.groupby("ensembl_id").agg(tuple).map(list).reset_index()
-    except AttributeError:
-        df = df.groupby("ensembl_id").agg(tuple).applymap(list).reset_index()
-
-    # Convert list of values to type string if there is only one value
-    # .applymap was renamed to .map in pandas 2.1.0
-    try:
-        df = df.map(clean_cols)
-    except AttributeError:
-        df = df.applymap(clean_cols)
-
-    # Keep synonyms always of type list for consistency
-    df["synonym"] = [
-        np.sort(syn).tolist() if isinstance(syn, list) else np.sort([syn]).tolist()
-        for syn in df["synonym"].values
-    ]
+    # (values are converted to type string if there is only one value,
+    # synonyms are kept as sorted lists for consistency)
+    df = collapse_results(df)
 
     # If limit is not None, keep only the first {limit} rows
     if limit != None:
-        # Print number of genes/transcripts found versus fetched
+        # Print number of genes/transcripts fetched
+        # (the limit was already applied in the query, so the total number of matches is unknown)
         if verbose:
-            logging.info(f"Returning {limit} matches of {len(df)} total matches found.")
+            logging.info(f"Returning {len(df)} matches (limit: {limit}).")
         # Remove all but limit rows
         df = df.head(limit)
 
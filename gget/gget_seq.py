@@ -9,14 +9,340 @@ logging.basicConfig(
 # Mute numexpr threads info
 logging.getLogger("numexpr").setLevel(logging.WARNING)
 
+import contextlib
 import numpy as np
 
 # Custom functions
-from .utils import rest_query, get_uniprot_seqs
+from .utils import rest_query, rest_query_post, chunks, get_uniprot_seqs
 from .gget_info import info
+from .seq_index import (
+    FastaIndex,
+    load_id_table,
+    genome_build,
+    reverse_complement,
+    translate_sequence,
+    mitochondrial_table,
+    CODON_TABLES,
+    MITOCHONDRIAL_SEQNAMES,
+)
 
 # Constants
-from .constants import ENSEMBL_REST_API, UNIPROT_REST_API
+from .constants import (
+    ENSEMBL_REST_API,
+    ENSEMBL_SEQUENCE_BATCH_SIZE,
+    UNIPROT_REST_API,
+)
+
+
+def fetch_sequences(server, ens_ids, content_type="application/json"):
+    """
+    Helper function for gget seq to fetch the sequences of several Ensembl IDs
+    using batched POST sequence/id queries.
+
+    Args:
+    - server        Link to Ensembl REST API server.
+    - ens_ids       List of Ensembl IDs (without version numbers).
+    - content_type  Content type requested from the server.
+
+    Returns a dictionary with the REST results for each ID that was found.
+    IDs that are not found are not included in the dictionary.
+    """
+    results = {}
+
+    # Remove duplicate IDs without changing their order
+    ens_ids = list(dict.fromkeys(ens_ids))
+
+    for ids_chunk in chunks(ens_ids, ENSEMBL_SEQUENCE_BATCH_SIZE):
+        try:
+            # Submit batch query
+            for seq_result in rest_query_post(
+                server, "sequence/id", {"ids": ids_chunk}, content_type
+            ):
+                results[seq_result["query"]] = seq_result
+
+        except RuntimeError:
+            # The server rejects the whole batch if one of the IDs is not found,
+            # so query the IDs of this batch one by one instead
+            for ensembl_ID in ids_chunk:
+                try:
+                    query = "sequence/id/" + ensembl_ID + "?"
+                    results[ensembl_ID] = rest_query(server, query, content_type)
+                except RuntimeError:
+                    continue
+
+    return results
+
+
+def cds_length(row):
+    """
+    Returns the length of the CDS of a transcript in the ID table (see seq_index.load_id_table).
+    """
+    if not row.cds_starts:
+        return 0
+    return sum(
+        int(end) - int(start) + 1
+        for start, end in zip(row.cds_starts.split(","), row.cds_ends.split(","))
+    )
+
+
+def local_sequences(
+    ens_ids, isoforms, fasta, gtf=None, translate=False, mt_table=None, verbose=True
+):
+    """
+    Helper function for gget seq to extract nucleotide or amino acid sequences from local files
+    (e.g. downloaded using gget ref) without contacting any server.
+
+    Args:
+    - ens_ids       List of Ensembl IDs (without version numbers).
+    - isoforms      If True, returns the sequences of all transcripts of gene IDs.
+    - fasta         Path (or list of paths) to genome, cDNA and/or pep FASTA files.
+    - gtf           Path to the GTF file used to map IDs to coordinates (default: None).
+                    Without a GTF file, only IDs that are records of the FASTA files
+                    (or transcript/gene IDs in the headers of pep FASTA files) are found.
+    - translate     If True, returns amino acid sequences (default: False).
+                    Amino acid sequences are read from pep FASTA files or
+                    translated from the CDS of the transcript in the genome.
+    - mt_table      Genetic code used to translate the CDS of mitochondrial genes (see seq).
+
+    Returns a list containing the requested sequences in FASTA format.
+    """
+    if isinstance(fasta, str):
+        fasta = [fasta]
+    if mt_table is not None and mt_table not in CODON_TABLES:
+        raise ValueError(
+            f"Genetic code {mt_table} not supported. Supported codes: {', '.join(map(str, CODON_TABLES))}."
+        )
+
+    if gtf is not None:
+        id_table = load_id_table(gtf, verbose=verbose)
+        assembly = genome_build(gtf)
+    else:
+        id_table = None
+        assembly = ""
+    if mt_table is None:
+        mt_table = mitochondrial_table(assembly)
+    # Warn (once) if mitochondrial genes are translated with an unknown genetic code
+    mt_warning = [mt_table is None]
+
+    # Table IDs without version number (e.g. for GENCODE annotations)
+    unversioned = {}
+    # Positions of the transcripts of each gene in the table of all transcripts
+    gene_transcripts = {}
+    if id_table is not None:
+        for table_id in id_table.index:
+            unversioned.setdefault(table_id.split(".")[0], table_id)
+        transcript_table = id_table[id_table["object_type"] == "Transcript"]
+        gene_transcripts = transcript_table.groupby("gene_id", sort=False).indices
+
+    results = []
+    with contextlib.ExitStack() as stack:
+        indices = [
+            stack.enter_context(FastaIndex(path, verbose=verbose)) for path in fasta
+        ]
+        protein_indices = [index for index in indices if "pep" in index.seqtypes]
+        nucleotide_indices = [index for index in indices if "pep" not in index.seqtypes]
+
+        def find_index(name):
+            return next((index for index in nucleotide_indices if name in index), None)
+
+        def description(row):
+            strand = 1 if row.strand == "+" else -1
+            return f"chromosome:{assembly}:{row.seqname}:{row.start}:{row.end}:{strand}"
+
+        def splice(row, starts, ends):
+            # Concatenate the segments of a transcript from the genome
+            index = find_index(row.seqname)
+            if index is None or not starts:
+                return None
+            sequence = "".join(
+                index.fetch(row.seqname, int(start), int(end))
+                for start, end in zip(starts.split(","), ends.split(","))
+            )
+            if row.strand == "-":
+                sequence = reverse_complement(sequence)
+            return sequence
+
+        def transcript_sequence(transcript_id, row):
+            # Use the cDNA sequence if available, otherwise splice the exons from the genome
+            index = find_index(transcript_id)
+            if index is not None:
+                return index.fetch(transcript_id)
+            return splice(row, row.exon_starts, row.exon_ends)
+
+        def protein_sequence(transcript_id, row):
+            # Use the pep FASTA record if available, otherwise translate the CDS from the genome
+            for index in protein_indices:
+                name = index.resolve_transcript(transcript_id)
+                if name is not None:
+                    return index.fetch(name)
+
+            if row is None or not row.cds_starts:
+                return None
+            cds = splice(row, row.cds_starts, row.cds_ends)
+            if cds is None:
+                return None
+            table = 1
+            if row.seqname in MITOCHONDRIAL_SEQNAMES:
+                if mt_table is not None:
+                    table = mt_table
+                elif mt_warning[0]:
+                    logging.warning(
+                        f"The genetic code of the mitochondrial genes of genome build '{assembly}' is not known. "
+                        "Mitochondrial genes are translated with the standard code. "
+                        "Use 'mt_table' to set the genetic code (e.g. 2 for vertebrates)."
+                    )
+                    mt_warning[0] = False
+            return translate_sequence(cds[int(row.cds_phase or 0) :], table).rstrip("*")
+
+        def protein_result(transcript_id, gene_id, gene_name, sequence):
+            return (
+                transcript_id,
+                f"ensembl_id: {transcript_id} gene_id: {gene_id} "
+                f"gene_name: {gene_name} sequence_length: {len(sequence)}",
+                sequence,
+            )
+
+        def add_protein(transcript_id, row, gene_id, gene_name):
+            sequence = protein_sequence(transcript_id, row)
+            if sequence is None:
+                logging.error(
+                    f"Amino acid sequence of {transcript_id} not found. Please provide a pep FASTA file "
+                    "or a genome FASTA file and GTF file including its CDS."
+                )
+                return
+            results.append(protein_result(transcript_id, gene_id, gene_name, sequence))
+
+        def pep_records(ensembl_ID):
+            # Records of a protein, transcript or gene ID in the pep FASTA files
+            for index in protein_indices:
+                if ensembl_ID in index:
+                    return index, [index.resolve(ensembl_ID)]
+                if index.resolve_transcript(ensembl_ID) is not None:
+                    return index, [index.resolve_transcript(ensembl_ID)]
+                names = index.gene_records(ensembl_ID)
+                if names:
+                    # All isoforms or the longest isoform
+                    return index, names if isoforms else [max(names, key=index.length)]
+            return None, []
+
+        for ensembl_ID in ens_ids:
+            table_id = None
+            if id_table is not None:
+                table_id = (
+                    ensembl_ID
+                    if ensembl_ID in id_table.index
+                    else unversioned.get(ensembl_ID)
+                )
+
+            if table_id is None:
+                # ID is not annotated, but might be the name of a FASTA record
+                # (or a transcript/gene ID in the headers of pep FASTA records)
+                if translate:
+                    index, names = pep_records(ensembl_ID)
+                else:
+                    index = find_index(ensembl_ID)
+                    names = [ensembl_ID]
+
+                if index is None:
+                    logging.error(
+                        f"ID {ensembl_ID} not found. Please double-check spelling/arguments and try again."
+                    )
+                    continue
+
+                if verbose:
+                    logging.info(f"Reading sequence of {ensembl_ID} from {index.fasta}.")
+
+                for name in names:
+                    if translate:
+                        record = index.records.loc[name]
+                        results.append(
+                            protein_result(
+                                record.transcript.split(".")[0] or name,
+                                record.gene.split(".")[0],
+                                "",
+                                index.fetch(name),
+                            )
+                        )
+                    else:
+                        results.append((name, "", index.fetch(name)))
+                continue
+
+            row = id_table.loc[table_id]
+
+            if not row.object_type == "Gene" and isoforms:
+                logging.warning("The isoform option only applies to gene IDs.")
+
+            if row.object_type == "Gene" and (isoforms or translate):
+                transcripts = transcript_table.iloc[
+                    gene_transcripts.get(row.gene_id, [])
+                ]
+                if not isoforms:
+                    # Canonical transcript (or the transcript with the longest CDS)
+                    canonical = transcripts[transcripts["canonical"]]
+                    if canonical.empty and not transcripts.empty:
+                        cds_lengths = transcripts.apply(cds_length, axis=1)
+                        canonical = transcripts.loc[[cds_lengths.idxmax()]]
+                    transcripts = canonical
+
+                if verbose:
+                    logging.info(
+                        f"Reading {'amino acid' if translate else 'nucleotide'} sequences of "
+                        f"{'all transcripts' if isoforms else 'the canonical transcript'} of {ensembl_ID} from local files."
+                    )
+
+                for transcript_id, transcript_row in transcripts.iterrows():
+                    if translate:
+                        add_protein(
+                            transcript_id, transcript_row, row.gene_id, row.gene_name
+                        )
+                        continue
+
+                    sequence = transcript_sequence(transcript_id, transcript_row)
+                    if sequence is None:
+                        logging.error(
+                            f"Sequence of {transcript_id} not found in the FASTA files."
+                        )
+                        continue
+                    results.append(
+                        (transcript_id, description(transcript_row), sequence)
+                    )
+                continue
+
+            if verbose:
+                logging.info(
+                    f"Reading {'amino acid' if translate else 'nucleotide'} sequence of {ensembl_ID} from local files."
+                )
+
+            if translate:
+                add_protein(table_id, row, row.gene_id, row.gene_name)
+                continue
+
+            if row.object_type == "Transcript":
+                sequence = transcript_sequence(table_id, row)
+            else:
+                index = find_index(row.seqname)
+                sequence = (
+                    None
+                    if index is None
+                    else index.fetch(row.seqname, row.start, row.end, strand=row.strand)
+                )
+
+            if sequence is None:
+                logging.error(
+                    f"Sequence of {ensembl_ID} not found in the FASTA files. "
+                    "Please provide a genome FASTA file containing chromosome "
+                    f"{row.seqname} (or a cDNA FASTA file)."
+                )
+                continue
+
+            results.append((ensembl_ID, description(row), sequence))
+
+    fasta_lines = []
+    for seq_id, desc, sequence in results:
+        fasta_lines.append(f">{seq_id} {desc}".rstrip())
+        fasta_lines.append(sequence)
+
+    return fasta_lines
 
 
 def seq(
@@ -27,6 +353,10 @@ def seq(
     transcribe=None,
     seqtype=None,
     verbose=True,
+    backend="rest",
+    fasta=None,
+    gtf=None,
+    mt_table=None,
 ):
     """
     Fetch nucleotide or amino acid sequence (FASTA) of a gene
@@ -43,6 +373,18 @@ def seq(
                     (Only for gene IDs.)
     - save          If True, saves output FASTA to current directory (default: False).
     - verbose       True/False whether to print progress information. Default True.
+    - backend       'rest' (default) fetches sequences from the Ensembl/UniProt REST APIs.
+                    'local' reads sequences from local files (see 'fasta' and 'gtf') without network access.
+                    With translate=True, amino acid sequences are read from pep FASTA files
+                    or translated from the CDS annotated in the GTF file.
+    - fasta         (backend='local' only) Path (or list of paths) to genome, cDNA and/or pep FASTA files,
+                    e.g. downloaded using gget ref. An index (.fai) is created next to each file on first use
+                    (gzipped files are decompressed once).
+    - gtf           (backend='local' only) Path to the matching GTF file used to look up gene and transcript coordinates.
+    - mt_table      (backend='local' only) Number of the genetic code used to translate the CDS of mitochondrial
+                    genes (sequences MT, chrM or M), e.g. 2 (vertebrates), 3 (yeast), 5 (invertebrates) or 1 (plants).
+                    Default: None -> derived from the genome build of the GTF file for vertebrates and some model
+                    organisms, otherwise the standard code (1) is used with a warning.
 
     Returns a list (or FASTA file if 'save=True') containing the requested sequences.
 
@@ -81,11 +423,35 @@ def seq(
         else:
             ens_ids_clean.append(ensembl_ID)
 
+    if backend not in ["rest", "local"]:
+        raise ValueError(
+            f"Backend '{backend}' not recognized. Please use 'rest' or 'local'."
+        )
+
+    if backend == "local":
+        if not fasta:
+            raise ValueError(
+                "Please provide the path to a genome and/or cDNA FASTA file ('fasta') to use the local backend."
+            )
+        fasta_paths = fasta
+
     # Initiate empty 'fasta'
     fasta = []
 
+    ## Read nucleotide or amino acid sequences from local files
+    if backend == "local":
+        fasta = local_sequences(
+            ens_ids_clean,
+            isoforms,
+            fasta_paths,
+            gtf=gtf,
+            translate=translate is True,
+            mt_table=mt_table,
+            verbose=verbose,
+        )
+
     ## Fetch nucleotide sequece
-    if translate is False:
+    elif translate is False:
         # Define Ensembl REST API server
         server = ENSEMBL_REST_API
         # Define type of returned content from REST
@@ -94,20 +460,17 @@ def seq(
         # Initiate dictionary to save results for all IDs in
         master_dict = {}
 
-        # Query REST APIs from https://rest.ensembl.org/
-        for ensembl_ID in ens_ids_clean:
-            # Create dict to save query results
-            results_dict = {ensembl_ID: {}}
+        # If isoforms False, just fetch sequences of passed Ensembl IDs
+        if isoforms == False:
+            # Fetch all sequences using batched sequence/id queries
+            seq_results = fetch_sequences(server, ens_ids_clean, content_type)
 
-            # If isoforms False, just fetch sequences of passed Ensembl ID
-            if isoforms == False:
-                # sequence/id/ query: Request sequence by stable identifier
-                query = "sequence/id/" + ensembl_ID + "?"
+            for ensembl_ID in ens_ids_clean:
+                # Create dict to save query results
+                results_dict = {ensembl_ID: {}}
 
-                # Try if query valid
-                try:
-                    # Submit query; this will throw RuntimeError if ID not found
-                    df_temp = rest_query(server, query, content_type)
+                if ensembl_ID in seq_results:
+                    df_temp = seq_results[ensembl_ID].copy()
 
                     # Delete superfluous entries
                     keys_to_delete = ["query", "id", "version", "molecule"]
@@ -123,18 +486,26 @@ def seq(
                             f"Requesting nucleotide sequence of {ensembl_ID} from Ensembl."
                         )
 
-                except RuntimeError:
+                else:
                     logging.error(
                         f"ID {ensembl_ID} not found. Please double-check spelling/arguments and try again."
                     )
 
-            # If isoforms true, fetch sequences of isoforms instead
-            if isoforms == True:
-                # Get ID type (gene, transcript, ...) using gget info
-                info_df = info(ensembl_ID, verbose=False, pdb=False, ncbi=False, uniprot=False)
+                # Add results to master dict
+                master_dict.update(results_dict)
+
+        # If isoforms true, fetch sequences of isoforms instead
+        if isoforms == True:
+            # Get ID types (gene, transcript, ...) of all IDs using a single gget info query
+            info_df = info(
+                ens_ids_clean, verbose=False, pdb=False, ncbi=False, uniprot=False
+            )
 
+            # Collect the IDs whose sequences will be fetched for each query ID
+            ids_to_fetch = {}
+            for ensembl_ID in ens_ids_clean:
                 # Check if Ensembl ID was found
-                if isinstance(info_df, type(None)):
+                if info_df is None or ensembl_ID not in info_df.index:
                     logging.warning(
                         f"ID '{ensembl_ID}' not found. Please double-check spelling/arguments and try again."
                     )
@@ -144,22 +515,43 @@ def seq(
 
                 # If the ID is a gene, get the IDs of all its transcripts
                 if ens_ID_type == "Gene":
-                    if verbose:
-                        logging.info(
-                            f"Requesting nucleotide sequences of all transcripts of {ensembl_ID} from Ensembl."
-                        )
-
+                    transcript_ids = []
                     for transcipt_id in info_df.loc[ensembl_ID]["all_transcripts"]:
                         # Remove version number for Ensembl IDs (not for flybase/wormbase IDs)
                         if transcipt_id.startswith("ENS"):
                             transcipt_id = transcipt_id.split(".")[0]
+                        transcript_ids.append(transcipt_id)
+
+                    ids_to_fetch[ensembl_ID] = transcript_ids
+
+                # If isoform true, but ID is not a gene; ignore the isoform parameter
+                else:
+                    ids_to_fetch[ensembl_ID] = None
+
+            # Fetch all sequences using batched sequence/id queries
+            seq_results = fetch_sequences(
+                server,
+                [
+                    seq_id
+                    for ensembl_ID, transcript_ids in ids_to_fetch.items()
+                    for seq_id in (transcript_ids or [ensembl_ID])
+                ],
+                content_type,
+            )
+
+            for ensembl_ID, transcript_ids in ids_to_fetch.items():
+                # Create dict to save query results
+                results_dict = {ensembl_ID: {}}
+
+                if transcript_ids is not None:
+                    if verbose:
+                        logging.info(
+                            f"Requesting nucleotide sequences of all transcripts of {ensembl_ID} from Ensembl."
+                        )
 
-                        # Try if query is valid
-                        try:
-                            # Define the REST query
-                            query = "sequence/id/" + transcipt_id + "?"
-                            # Submit query
-                            df_temp = rest_query(server, query, content_type)
+                    for transcipt_id in transcript_ids:
+                        if transcipt_id in seq_results:
+                            df_temp = seq_results[transcipt_id].copy()
 
                             # Delete superfluous entries
                             keys_to_delete = ["query", "version", "molecule"]
@@ -172,21 +564,15 @@ def seq(
                                 {f"{transcipt_id}": df_temp}
                             )
 
-                        except RuntimeError:
+                        else:
                             logging.error(
                                 f"ID {transcipt_id} not found. "
                                 "Please double-check spelling/arguments and try again."
                             )
 
-                # If isoform true, but ID is not a gene; ignore the isoform parameter
                 else:
-                    # Try if query is valid
-                    try:
-                        # Define the REST query
-                        query = "sequence/id/" + ensembl_ID + "?"
-
-                        # Submit query
-                        df_temp = rest_query(server, query, content_type)
+                    if ensembl_ID in seq_results:
+                        df_temp = seq_results[ensembl_ID].copy()
 
                         # Delete superfluous entries
                         keys_to_delete = ["query", "id", "version", "molecule"]
@@ -202,14 +588,14 @@ def seq(
                         )
                         logging.warning("The isoform option only applies to gene IDs.")
 
-                    except RuntimeError:
+                    else:
                         logging.error(
                             f"ID {ensembl_ID} not found. "
                             "Please double-check spelling/arguments and try again."
                         )
 
-            # Add results to master dict
-            master_dict.update(results_dict)
+                # Add results to master dict
+                master_dict.update(results_dict)
 
         # Build FASTA file
         for ens_ID in master_dict:
@@ -227,17 +613,19 @@ def seq(
                     fasta.append(master_dict[ens_ID][key]["seq"])
 
     ## Fetch amino acid sequences from UniProt
-    if translate is True:
+    elif translate is True:
         if isoforms is False:
             # List to collect transcript IDs
             trans_ids = []
 
-            for ensembl_ID in ens_ids_clean:
-                # Get ID type (gene, transcript, ...) using gget info
-                info_df = info(ensembl_ID, verbose=False, pdb=False, ncbi=False, uniprot=False)
+            # Get ID types (gene, transcript, ...) of all IDs using a single gget info query
+            info_df = info(
+                ens_ids_clean, verbose=False, pdb=False, ncbi=False, uniprot=False
+            )
 
+            for ensembl_ID in ens_ids_clean:
                 # Check that Ensembl ID was found
-                if isinstance(info_df, type(None)):
+                if info_df is None or ensembl_ID not in info_df.index:
                     logging.warning(
                         f"ID '{ensembl_ID}' not found. Please double-check spelling/arguments."
                     )
@@ -297,12 +685,14 @@ def seq(
             # List to collect transcript IDs
             trans_ids = []
 
-            for ensembl_ID in ens_ids_clean:
-                # Get ID type (gene, transcript, ...) using gget info
-                info_df = info(ensembl_ID, verbose=False, pdb=False, ncbi=False, uniprot=False)
+            # Get ID types (gene, transcript, ...) of all IDs using a single gget info query
+            info_df = info(
+                ens_ids_clean, verbose=False, pdb=False, ncbi=False, uniprot=False
+            )
 
+            for ensembl_ID in ens_ids_clean:
                 # Check that Ensembl ID was found
-                if isinstance(info_df, type(None)):
+                if info_df is None or ensembl_ID not in info_df.index:
                     logging.warning(
                         f"ID '{ensembl_ID}' not found. Please double-check spelling/arguments."
                     )
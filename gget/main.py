@@ -22,6 +22,8 @@ import json
 # Custom functions
 from .__init__ import __version__
 from .gget_ref import ref
+from .gget_mirror import mirror
+from .download import download_files
 from .gget_search import search
 from .gget_info import info
 from .gget_seq import seq
@@ -38,6 +40,22 @@ from .gget_cellxgene import cellxgene
 from .gget_elm import elm
 from .gget_diamond import diamond
 from .gget_cosmic import cosmic
+from .cache import ResponseCache, cache_path_from_env
+from .constants import CACHE_DIR
+
+
+def ref_links(ref_results):
+    """
+    Returns the FTP links from the json output of gget ref
+    (dictionary for one species or list of records for several species).
+    """
+    if isinstance(ref_results, list):
+        return [record["ftp"] for record in ref_results]
+    return [
+        ref_results[sp][ftp_type]["ftp"]
+        for sp in ref_results
+        for ftp_type in ref_results[sp]
+    ]
 
 
 def main():
@@ -78,6 +96,8 @@ def main():
             Species or database to be searched. Species should be passed in the format "genus_species", e.g. "homo_sapiens".
             To pass a specific database, enter the name of the core database and release number, e.g. 'mus_musculus_dba2j_core_105_1'.
             All available databases for each Ensembl release can be found here: http://ftp.ensembl.org/pub/
+            Several species can be passed as a comma-separated list, e.g. homo_sapiens,mus_musculus,
+            and 'all' fetches the references of all species of a kingdom (see --kingdom).
             """
         ),
     )
@@ -136,6 +156,15 @@ def main():
         required=False,
         help="Ensembl release the FTPs will be fetched from, e.g. 104 (default: latest Ensembl release).",
     )
+    parser_ref.add_argument(
+        "-k",
+        "--kingdom",
+        default=None,
+        type=str,
+        choices=["vertebrates", "plants", "protists", "metazoa", "fungi"],
+        required=False,
+        help="Kingdom of the species if species is 'all' (default: vertebrates).",
+    )
     parser_ref.add_argument(
         "-ftp",
         "--ftp",
@@ -150,7 +179,11 @@ def main():
         default=False,
         action="store_true",
         required=False,
-        help="Download FTPs to the current directory using curl.",
+        help=(
+            "Download FTPs to the current directory. "
+            "Files are downloaded concurrently, partial downloads are resumed and "
+            "files are verified against the Ensembl CHECKSUMS files."
+        ),
     )
     parser_ref.add_argument(
         "-o",
@@ -260,6 +293,19 @@ def main():
         required=False,
         help="Limits the number of results, e.g. 10 (default: None).",
     )
+    parser_gget.add_argument(
+        "-b",
+        "--backend",
+        choices=["mysql", "local"],
+        default="mysql",
+        type=str,
+        required=False,
+        help=(
+            "'mysql': Query the public Ensembl MySQL server (default).\n"
+            "'local': Query a local search index built from the MySQL dump of the core database on the Ensembl FTP site "
+            "(the index is built once per species and release).\n"
+        ),
+    )
     parser_gget.add_argument(
         "-csv",
         "--csv",
@@ -628,6 +674,43 @@ def main():
         required=False,
         help="Returns sequences of all known transcripts (default: False). (Only for gene IDs.)",
     )
+    parser_seq.add_argument(
+        "-b",
+        "--backend",
+        choices=["rest", "local"],
+        default="rest",
+        type=str,
+        required=False,
+        help=(
+            "'rest' (default): Fetch sequences from the Ensembl/UniProt REST APIs.\n"
+            "'local': Read sequences from local FASTA/GTF files (see --fasta and --gtf) without network access. "
+            "Amino acid sequences (-t) are read from pep FASTA files or translated from the CDS in the GTF file."
+        ),
+    )
+    parser_seq.add_argument(
+        "--fasta",
+        type=str,
+        nargs="+",
+        required=False,
+        help="(backend 'local' only) Path(s) to genome, cDNA and/or pep FASTA files, e.g. downloaded using gget ref.",
+    )
+    parser_seq.add_argument(
+        "--gtf",
+        type=str,
+        required=False,
+        help="(backend 'local' only) Path to the GTF file matching the FASTA files.",
+    )
+    parser_seq.add_argument(
+        "--mt_table",
+        type=int,
+        default=None,
+        required=False,
+        help=(
+            "(backend 'local' only) Genetic code used to translate the CDS of mitochondrial genes, "
+            "e.g. 2 (vertebrates), 3 (yeast), 5 (invertebrates) or 1 (plants). "
+            "Default: derived from the genome build of the GTF file (standard code if unknown)."
+        ),
+    )
     parser_seq.add_argument(
         "-o",
         "--out",
@@ -735,7 +818,10 @@ def main():
     parser_blast.add_argument(
         "sequence",
         type=str,
-        help="Sequence (str) or path to fasta file.",
+        help=(
+            "Sequence (str) or path to fasta file. "
+            "All sequences in the fasta file are searched concurrently (results include a 'query' column)."
+        ),
     )
     parser_blast.add_argument(
         "-p",
@@ -752,22 +838,15 @@ def main():
     parser_blast.add_argument(
         "-db",
         "--database",
-        choices=[
-            "nt",
-            "nr",
-            "refseq_rna",
-            "refseq_protein",
-            "swissprot",
-            "pdbaa",
-            "pdbnt",
-        ],
         default="default",
         type=str,
         required=False,
         help=(
             "'nt', 'nr', 'refseq_rna', 'refseq_protein', 'swissprot', 'pdbaa', or 'pdbnt'. "
             "Default: 'nt' for nucleotide sequences; 'nr' for amino acid sequences. "
-            "More info on BLAST databases: https://ncbi.github.io/blast-cloud/blastdb/available-blastdbs.html"
+            "More info on BLAST databases: https://ncbi.github.io/blast-cloud/blastdb/available-blastdbs.html\n"
+            "With '--backend local': Path to a BLAST database or (gzipped) FASTA file "
+            "(a BLAST database is built next to the FASTA file with makeblastdb on first use)."
         ),
     )
     parser_blast.add_argument(
@@ -802,6 +881,53 @@ def main():
         required=False,
         help="Turn off MegaBLAST algorithm. Default on (blastn only).",
     )
+    parser_blast.add_argument(
+        "-mr",
+        "--max_rids",
+        type=int,
+        default=10,
+        required=False,
+        help="Maximum number of searches running on the BLAST server at the same time (fasta files with several sequences). Default 10.",
+    )
+    parser_blast.add_argument(
+        "-mpi",
+        "--max_poll_interval",
+        type=float,
+        default=300,
+        required=False,
+        help=(
+            "Maximum number of seconds between status requests of a search. Default 300. "
+            "Searches are first polled when they are expected to be done, then every 61 seconds "
+            "with geometrically increasing intervals up to this ceiling."
+        ),
+    )
+    parser_blast.add_argument(
+        "-b",
+        "--backend",
+        choices=["rest", "local"],
+        default="rest",
+        type=str,
+        required=False,
+        help=(
+            "'rest' (default): Submit searches to the NCBI BLAST server.\n"
+            "'local': Run a local BLAST+ program against an on-disk database (see --database). "
+            "All sequences are searched with a single call of the program."
+        ),
+    )
+    parser_blast.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=1,
+        required=False,
+        help="(backend 'local' only) Number of threads used by the BLAST+ program. Default 1.",
+    )
+    parser_blast.add_argument(
+        "--blast_bin",
+        type=str,
+        required=False,
+        help="(backend 'local' only) Directory containing the BLAST+ programs. Default: programs on the PATH.",
+    )
     parser_blast.add_argument(
         "-q",
         "--quiet",
@@ -856,7 +982,10 @@ def main():
     parser_blat.add_argument(
         "sequence",
         type=str,
-        help="Sequence (str) or path to fasta file.",
+        help=(
+            "Sequence (str) or path to fasta file. "
+            "All sequences in the fasta file are submitted (results include a 'query' column)."
+        ),
     )
     parser_blat.add_argument(
         "-st",
@@ -882,6 +1011,18 @@ def main():
             "(use short assembly name as listed after the '/'). "
         ),
     )
+    parser_blat.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=2,
+        required=False,
+        help=(
+            "Number of requests sent to the BLAT server at the same time (fasta files with several sequences). Default 2. "
+            "All requests are spaced out by at least 15 seconds (UCSC usage policy), so additional workers do not increase "
+            "the request rate; they only allow the next request to be sent while the server is still answering the previous one."
+        ),
+    )
     parser_blat.add_argument(
         "-csv",
         "--csv",
@@ -1759,6 +1900,133 @@ def main():
         help="Do not print progress information.",
     )
 
+    ## gget mirror subparser
+    mirror_desc = "Keep a local mirror of Ensembl reference genomes and annotations up to date."
+    parser_mirror = parent_subparsers.add_parser(
+        "mirror",
+        parents=[parent],
+        description=mirror_desc,
+        help=mirror_desc,
+        add_help=True,
+    )
+    # mirror parser arguments
+    parser_mirror.add_argument(
+        "species",
+        type=str,
+        help=(
+            "Species in the format 'genus_species', e.g. homo_sapiens, or a comma-separated list of species. "
+            "'all' mirrors all species of a kingdom (see --kingdom)."
+        ),
+    )
+    parser_mirror.add_argument(
+        "-w",
+        "--which",
+        default="all",
+        type=str,
+        required=False,
+        help=(
+            "File types to mirror as a comma-separated list, e.g. 'dna,gtf' "
+            "(see gget ref for all options). Default: 'all'."
+        ),
+    )
+    parser_mirror.add_argument(
+        "-r",
+        "--release",
+        default=None,
+        type=int,
+        required=False,
+        help="Ensembl release to mirror, e.g. 110 (default: latest Ensembl release).",
+    )
+    parser_mirror.add_argument(
+        "-k",
+        "--kingdom",
+        default=None,
+        type=str,
+        choices=["vertebrates", "plants", "protists", "metazoa", "fungi"],
+        required=False,
+        help="Kingdom of the species if species is 'all' (default: vertebrates).",
+    )
+    parser_mirror.add_argument(
+        "-o",
+        "--out",
+        type=str,
+        default=".",
+        required=False,
+        help="Path to the mirror directory. Default: Current directory.",
+    )
+    parser_mirror.add_argument(
+        "-m",
+        "--max_size",
+        type=str,
+        default=None,
+        required=False,
+        help=(
+            "Disk budget of the mirror, e.g. 500G. Files of previous releases are deleted "
+            "(oldest first) until the mirror fits the budget. Default: No limit."
+        ),
+    )
+    parser_mirror.add_argument(
+        "-dr",
+        "--dry_run",
+        default=False,
+        action="store_true",
+        required=False,
+        help="Only print which files would be downloaded.",
+    )
+    parser_mirror.add_argument(
+        "-nc",
+        "--no_checksums",
+        default=True,
+        action="store_false",
+        dest="checksums",
+        required=False,
+        help="Do not verify the files against the Ensembl CHECKSUMS files.",
+    )
+    parser_mirror.add_argument(
+        "-q",
+        "--quiet",
+        default=True,
+        action="store_false",
+        required=False,
+        help="Do not print progress information.",
+    )
+
+    ## gget cache subparser
+    cache_desc = "Show statistics of or clear the persistent on-disk cache of server responses."
+    parser_cache = parent_subparsers.add_parser(
+        "cache",
+        parents=[parent],
+        description=cache_desc,
+        help=cache_desc,
+        add_help=True,
+    )
+    # cache parser arguments
+    parser_cache.add_argument(
+        "action",
+        type=str,
+        choices=["stats", "clear"],
+        help="'stats' prints the number and size of cached responses per endpoint. 'clear' deletes cached responses.",
+    )
+    parser_cache.add_argument(
+        "-d",
+        "--dir",
+        type=str,
+        default=None,
+        required=False,
+        help=(
+            "Path to the cache directory.\n"
+            "Default: Path set in the GGET_CACHE environment variable or ~/.cache/gget"
+        ),
+    )
+    parser_cache.add_argument(
+        "-e",
+        "--endpoint",
+        type=str,
+        default=None,
+        required=False,
+        help="Only clear cached responses of this endpoint, e.g. 'uniprot'. Default: All endpoints.",
+    )
+
     ### Define return values
     args = parent_parser.parse_args()
 
@@ -1806,6 +2074,8 @@ def main():
         "elm": parser_elm,
         "diamond": parser_diamond,
         "cosmic": parser_cosmic,
+        "mirror": parser_mirror,
+        "cache": parser_cache,
     }
 
     if len(sys.argv) == 2:
@@ -1890,6 +2160,7 @@ def main():
             assembly=args.assembly,
             json=args.csv,
             verbose=args.quiet,
+            workers=args.workers,
         )
 
         # Check if the function returned something
@@ -1944,6 +2215,11 @@ def main():
             megablast=args.megablast_off,
             verbose=args.quiet,
             json=args.csv,
+            max_rids=args.max_rids,
+            max_poll_interval=args.max_poll_interval,
+            backend=args.backend,
+            threads=args.threads,
+            blast_bin=args.blast_bin,
         )
 
         # Check if the function returned something
@@ -2182,12 +2458,18 @@ def main():
         which_clean = args.which.split(",")
 
         if args.species:
+            # Split comma-separated list of species
+            if "," in args.species:
+                args.species = args.species.split(",")
+
             # Query Ensembl for requested FTPs using function ref
             ref_results = ref(
                 species=args.species,
                 which=which_clean,
                 release=args.release,
                 ftp=args.ftp,
+                kingdom=args.kingdom,
+                json=True,
                 verbose=args.quiet,
             )
 
@@ -2203,10 +2485,7 @@ def main():
 
                     if args.download == True:
                         # Download list of URLs
-                        for link in ref_results:
-                            # command = "wget " + link
-                            command = "curl -O " + link
-                            os.system(command)
+                        download_files(ref_results, verbose=args.quiet)
                 #                     else:
                 #                         logging.info(
                 #                             "To download the FTPs to the current directory, add flag [-d]."
@@ -2220,10 +2499,7 @@ def main():
 
                     if args.download == True:
                         # Download list of URLs
-                        for link in ref_results:
-                            # command = "wget " + link
-                            command = "curl -O " + link
-                            os.system(command)
+                        download_files(ref_results, verbose=args.quiet)
             #                     else:
             #                         logging.info(
             #                             "To download the FTPs to the current directory, add flag [-d]."
@@ -2241,13 +2517,7 @@ def main():
 
                     if args.download == True:
                         # Download the URLs from the dictionary
-                        for link in ref_results:
-                            for sp in ref_results:
-                                for ftp_type in ref_results[sp]:
-                                    link = ref_results[sp][ftp_type]["ftp"]
-                                    #                                     command = "wget " + link
-                                    command = "curl -O " + link
-                                    os.system(command)
+                        download_files(ref_links(ref_results), verbose=args.quiet)
                 #                     else:
                 #                         logging.info(
                 #                             "To download the FTPs to the current directory, add flag [-d]."
@@ -2259,13 +2529,7 @@ def main():
 
                     if args.download == True:
                         # Download the URLs from the dictionary
-                        for link in ref_results:
-                            for sp in ref_results:
-                                for ftp_type in ref_results[sp]:
-                                    link = ref_results[sp][ftp_type]["ftp"]
-                                    #                                     command = "wget " + link
-                                    command = "curl -O " + link
-                                    os.system(command)
+                        download_files(ref_links(ref_results), verbose=args.quiet)
     #                     else:
     #                         logging.info(
     #                             "To download the FTPs to the current directory, add flag [-d]."
@@ -2308,6 +2572,7 @@ def main():
             limit=args.limit,
             json=args.csv,
             verbose=args.quiet,
+            backend=args.backend,
         )
 
         # Save search results if args.out specified
@@ -2517,6 +2782,10 @@ def main():
             isoforms=args.isoforms,
             transcribe=args.transcribe,
             verbose=args.quiet,
+            backend=args.backend,
+            fasta=args.fasta,
+            gtf=args.gtf,
+            mt_table=args.mt_table,
         )
 
         # Save in specified directory if -o specified
@@ -2594,3 +2863,31 @@ def main():
                         json.dump(pdb_results, f, ensure_ascii=False, indent=4)
                 else:
                     print(json.dumps(pdb_results, ensure_ascii=False, indent=4))
+
+    ## mirror return
+    if args.command == "mirror":
+        mirror_results = mirror(
+            species=args.species.split(",") if "," in args.species else args.species,
+            which=args.which.split(","),
+            out_dir=args.out,
+            release=args.release,
+            kingdom=args.kingdom,
+            max_size=args.max_size,
+            checksums=args.checksums,
+            dry_run=args.dry_run,
+            verbose=args.quiet,
+        )
+        mirror_results.to_csv(sys.stdout, index=False)
+
+    ## cache return
+    if args.command == "cache":
+        cache = ResponseCache(path=args.dir or cache_path_from_env() or CACHE_DIR)
+
+        if args.action == "stats":
+            print(json.dumps(cache.stats(), ensure_ascii=False, indent=4))
+
+        if args.action == "clear":
+            n_deleted = cache.clear(endpoint=args.endpoint)
+            logging.info(f"Deleted {n_deleted} cached responses from {cache.db}.")
+
+        cache.close()
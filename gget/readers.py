@@ -0,0 +1,262 @@
+import io
+import re
+import gzip
+import logging
+from typing import NamedTuple
+
+# Add and format time stamp in logging messages
+logging.basicConfig(
+    format="%(asctime)s %(levelname)s %(message)s",
+    level=logging.INFO,
+    datefmt="%c",
+)
+# Mute numexpr threads info
+logging.getLogger("numexpr").setLevel(logging.WARNING)
+
+# Custom functions
+from .utils import get_session
+
+# Location field in Ensembl FASTA headers, e.g. "chromosome:GRCh38:1:65419:71585:1"
+LOCATION_REGEX = re.compile(r"^(\w+):([^:]*):([^:]+):(\d+):(\d+):(-?1)$")
+# Attribute in the last column of a GTF line, e.g. gene_id "ENSG00000186092";
+GTF_ATTRIBUTE_REGEX = re.compile(r'\s*([^\s;]+)\s+(?:"([^"]*)"|([^;]*?))\s*;')
+
+
+class FastaRecord(NamedTuple):
+    """
+    Record of a FASTA file. 'description' is the header line without the ID.
+    """
+
+    id: str
+    description: str
+    sequence: str
+
+    @property
+    def attributes(self):
+        return parse_fasta_header(self.description)
+
+
+class GtfRecord(NamedTuple):
+    """
+    Line of a GTF file. Attributes that occur several times (e.g. 'tag') are stored as lists.
+    """
+
+    seqname: str
+    source: str
+    feature: str
+    start: int
+    end: int
+    score: str
+    strand: str
+    frame: str
+    attributes: dict
+
+
+def open_text(source):
+    """
+    Open a local file or the response to an HTTP(S) link as a text stream.
+    Gzipped files are decompressed on the fly (detected by their magic number),
+    so files are never loaded into memory or written to disk as a whole.
+    """
+    source = str(source)
+    if source.startswith("http://") or source.startswith("https://"):
+        r = get_session().get(source, stream=True)
+        if r.status_code != 200:
+            raise RuntimeError(
+                f"The server returned error status code {r.status_code} for {source}. Please try again."
+            )
+        r.raw.decode_content = True
+        # Keep the stream readable at EOF (required by the gzip reader)
+        r.raw.auto_close = False
+        fileobj = io.BufferedReader(r.raw)
+    else:
+        fileobj = open(source, "rb")
+
+    if fileobj.peek(2)[:2] == b"\x1f\x8b":
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+
+    return io.TextIOWrapper(fileobj, encoding="utf-8", errors="replace", newline="\n")
+
+
+def parse_fasta_header(description):
+    """
+    Parse the attributes of an Ensembl FASTA header (without the ID), e.g.
+    "cdna chromosome:GRCh38:1:65419:71585:1 gene:ENSG00000186092.7 gene_biotype:protein_coding ..."
+
+    Returns a dictionary of the 'key:value' fields. The sequence type (e.g. 'cdna') is
+    returned as 'seqtype', and the location is split into 'coord_system', 'assembly',
+    'chromosome', 'start', 'end' and 'strand'. The free text description is returned as is.
+    """
+    attributes = {}
+    fields = description.split(" ")
+    for i, field in enumerate(fields):
+        if field.startswith("description:"):
+            attributes["description"] = " ".join(fields[i:])[len("description:") :]
+            break
+
+        location = LOCATION_REGEX.match(field)
+        if location:
+            for key, value in zip(
+                ["coord_system", "assembly", "chromosome", "start", "end", "strand"],
+                location.groups(),
+            ):
+                attributes[key] = value
+        elif ":" in field:
+            key, value = field.split(":", 1)
+            attributes[key] = value
+        elif i == 0 and field:
+            attributes["seqtype"] = field
+
+    return attributes
+
+
+def _keep_fasta(record_id, description, chromosomes, biotypes, ids):
+    if ids is not None and record_id not in ids and record_id.split(".")[0] not in ids:
+        return False
+    if chromosomes is None and biotypes is None:
+        return True
+
+    attributes = parse_fasta_header(description)
+    if chromosomes is not None:
+        # Genome FASTA records are named after the chromosome
+        if attributes.get("chromosome", record_id) not in chromosomes:
+            return False
+    if biotypes is not None:
+        if (
+            attributes.get("transcript_biotype") not in biotypes
+            and attributes.get("gene_biotype") not in biotypes
+        ):
+            return False
+    return True
+
+
+def read_fasta(source, chromosomes=None, biotypes=None, ids=None):
+    """
+    Stream the records of a (gzipped) FASTA file, e.g. a cDNA FASTA link returned by gget ref.
+    Records are parsed one at a time, and filtered records are skipped without storing their sequence.
+
+    Args:
+    - source        Path to a local FASTA file or link to a FASTA file (can be gzipped).
+    - chromosomes   Only return records located on these chromosomes, e.g. ["1", "X"] (default: None -> all).
+    - biotypes      Only return records with these transcript or gene biotypes, e.g. ["protein_coding"] (default: None -> all).
+    - ids           Only return records with these IDs (with or without version number) (default: None -> all).
+
+    Yields FastaRecord tuples (id, description, sequence).
+    """
+    if chromosomes is not None:
+        chromosomes = set(str(c) for c in chromosomes)
+    if biotypes is not None:
+        biotypes = set(biotypes)
+    if ids is not None:
+        ids = set(ids)
+
+    with open_text(source) as f:
+        header = None
+        keep = False
+        seq_lines = []
+        for line in f:
+            if line.startswith(">"):
+                if keep:
+                    yield FastaRecord(*header, "".join(seq_lines))
+                record_id, _, description = line[1:].rstrip().partition(" ")
+                header = (record_id, description)
+                keep = _keep_fasta(record_id, description, chromosomes, biotypes, ids)
+                seq_lines = []
+            elif keep:
+                seq_lines.append(line.strip())
+
+        if keep:
+            yield FastaRecord(*header, "".join(seq_lines))
+
+
+def parse_gtf_attributes(attribute_str):
+    """
+    Parse the attributes column of a GTF line into a dictionary.
+    Attributes that occur several times (e.g. 'tag') are returned as lists.
+    """
+    attributes = {}
+    for key, quoted, unquoted in GTF_ATTRIBUTE_REGEX.findall(attribute_str):
+        value = quoted or unquoted
+        if key in attributes:
+            if not isinstance(attributes[key], list):
+                attributes[key] = [attributes[key]]
+            attributes[key].append(value)
+        else:
+            attributes[key] = value
+    return attributes
+
+
+def read_gtf(source, chromosomes=None, biotypes=None, features=None):
+    """
+    Stream the lines of a (gzipped) GTF file, e.g. a GTF link returned by gget ref.
+    Lines are filtered by chromosome and feature before their attributes are parsed.
+
+    Args:
+    - source        Path to a local GTF file or link to a GTF file (can be gzipped).
+    - chromosomes   Only return lines located on these chromosomes, e.g. ["1", "X"] (default: None -> all).
+    - biotypes      Only return lines with these transcript or gene biotypes, e.g. ["lncRNA"] (default: None -> all).
+    - features      Only return these features, e.g. ["gene", "transcript"] (default: None -> all).
+
+    Yields GtfRecord tuples.
+    """
+    if chromosomes is not None:
+        chromosomes = set(str(c) for c in chromosomes)
+    if biotypes is not None:
+        biotypes = set(biotypes)
+    if features is not None:
+        features = set(features)
+
+    with open_text(source) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) != 9:
+                continue
+            if chromosomes is not None and fields[0] not in chromosomes:
+                continue
+            if features is not None and fields[2] not in features:
+                continue
+
+            attributes = parse_gtf_attributes(fields[8])
+            if biotypes is not None:
+                if (
+                    attributes.get("transcript_biotype") not in biotypes
+                    and attributes.get("gene_biotype") not in biotypes
+                ):
+                    continue
+
+            yield GtfRecord(
+                fields[0],
+                fields[1],
+                fields[2],
+                int(fields[3]),
+                int(fields[4]),
+                fields[5],
+                fields[6],
+                fields[7],
+                attributes,
+            )
+
+
+def write_fasta(records, path, line_width=60):
+    """
+    Write FASTA records (e.g. from read_fasta) to a file (gzipped if the path ends with '.gz').
+
+    Returns the number of records written.
+    """
+    if path.endswith(".gz"):
+        f = gzip.open(path, "wt", encoding="utf-8")
+    else:
+        f = open(path, "w", encoding="utf-8")
+
+    n_records = 0
+    with f:
+        for record in records:
+            header = f">{record.id} {record.description}".rstrip()
+            f.write(header + "\n")
+            for i in range(0, len(record.sequence), line_width):
+                f.write(record.sequence[i : i + line_width] + "\n")
+            n_records += 1
+
+    return n_records
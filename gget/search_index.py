@@ -0,0 +1,408 @@
+import os
+import re
+import gzip
+import sqlite3
+import logging
+
+# Add and format time stamp in logging messages
+logging.basicConfig(
+    format="%(asctime)s %(levelname)s %(message)s",
+    level=logging.INFO,
+    datefmt="%c",
+)
+# Mute numexpr threads info
+logging.getLogger("numexpr").setLevel(logging.WARNING)
+
+import pandas as pd
+
+# Custom functions
+from .utils import get_session, find_nv_kingdom
+
+# Constants
+from .constants import ENSEMBL_FTP_URL, ENSEMBL_FTP_URL_NV, SEARCH_INDEX_DIR
+
+# Separator between the searchable fields of an entry
+# (prevents matches spanning two fields)
+FIELD_SEP = "\x1f"
+
+# Columns returned for each search result (same as the MySQL query in gget search)
+RESULT_COLUMNS = [
+    "ensembl_id",
+    "gene_name",
+    "ensembl_description",
+    "ext_ref_description",
+    "biotype",
+    "synonym",
+]
+
+
+def core_db_dump_url(db):
+    """
+    Returns the link to the FTP directory containing the MySQL dump of an Ensembl core database,
+    e.g. "homo_sapiens_core_111_38" (vertebrates) or "arabidopsis_thaliana_core_58_111_11" (non-vertebrates).
+    """
+    species, version = db.split("_core_")
+    version = version.split("_")
+
+    # Vertebrate databases: {species}_core_{release}_{assembly}
+    if len(version) == 2:
+        return ENSEMBL_FTP_URL + f"release-{version[0]}/mysql/{db}/"
+
+    # Non-vertebrate databases: {species}_core_{EG release}_{release}_{assembly}
+    kingdom = find_nv_kingdom(species, release=version[0])
+    if kingdom is None:
+        raise ValueError(
+            f"Database {db} was not found on the Ensembl FTP site {ENSEMBL_FTP_URL_NV}."
+        )
+    return ENSEMBL_FTP_URL_NV + f"release-{version[0]}/{kingdom}/mysql/{db}/"
+
+
+def open_dump(location, filename):
+    """
+    Open a (gzipped) file of a MySQL dump as a text stream.
+    'location' can be a link to an FTP directory or a local directory.
+    """
+    if location.startswith("http://") or location.startswith("https://"):
+        r = get_session().get(location + filename, stream=True)
+        if r.status_code != 200:
+            raise RuntimeError(
+                f"The Ensembl server returned error status code {r.status_code} for file {location + filename}. Please try again."
+            )
+        fileobj = r.raw
+    else:
+        fileobj = open(os.path.join(location, filename), "rb")
+
+    return gzip.open(fileobj, "rt", encoding="utf-8", errors="replace", newline="\n")
+
+
+def parse_schema(location, db):
+    """
+    Returns the column names of all tables in the MySQL dump of a database
+    in the format {table: [columns]}.
+    """
+    tables = {}
+    table = None
+    with open_dump(location, f"{db}.sql.gz") as f:
+        for line in f:
+            match = re.match(r"CREATE TABLE `(\w+)`", line)
+            if match:
+                table = match.group(1)
+                tables[table] = []
+            elif table is not None:
+                column = re.match(r"\s+`(\w+)`", line)
+                if column:
+                    tables[table].append(column.group(1))
+                elif line.startswith(")"):
+                    table = None
+
+    return tables
+
+
+def unescape(value):
+    """
+    Convert a field of a MySQL dump (SELECT ... INTO OUTFILE format) to a Python string or None.
+    """
+    if value == "\\N":
+        return None
+    if "\\" not in value:
+        return value
+
+    escapes = {"t": "\t", "n": "\n", "r": "\r", "0": "\0", "\\": "\\"}
+    return re.sub(r"\\(.)", lambda m: escapes.get(m.group(1), m.group(1)), value, flags=re.S)
+
+
+def read_table(location, table, columns, usecols):
+    """
+    Stream the rows of a table from a MySQL dump.
+    Yields dictionaries {column: value} containing only the columns in 'usecols'.
+    """
+    idx = [columns.index(col) for col in usecols]
+    with open_dump(location, f"{table}.txt.gz") as f:
+        row = ""
+        for line in f:
+            row += line
+            # Line breaks inside a field are escaped with a backslash
+            stripped = row.rstrip("\n")
+            if (len(stripped) - len(stripped.rstrip("\\"))) % 2 == 1:
+                continue
+
+            fields = stripped.split("\t")
+            row = ""
+            yield {col: unescape(fields[i]) for col, i in zip(usecols, idx)}
+
+
+def build_search_index(db, path=None, dump=None, verbose=True):
+    """
+    Build a local SQLite search index for gget search from the MySQL dump of an Ensembl core database.
+    The index contains the gene and transcript stable IDs, names, descriptions, biotypes,
+    synonyms and attributes. Text fields are indexed using an FTS5 trigram index (if supported
+    by the installed SQLite version) to allow fast substring searches.
+
+    Args:
+    - db        Name of the core database, e.g. "homo_sapiens_core_111_38".
+    - path      Path to the index file. Default: {SEARCH_INDEX_DIR}/{db}.sqlite
+    - dump      Link to the FTP directory or path to a local directory containing the MySQL dump.
+                Default: Dump on the Ensembl FTP site.
+    - verbose   True/False whether to print progress information. Default True.
+
+    Returns the path to the index file.
+    """
+    if path is None:
+        path = os.path.join(SEARCH_INDEX_DIR, f"{db}.sqlite")
+    if dump is None:
+        dump = core_db_dump_url(db)
+
+    if verbose:
+        logging.info(f"Building local search index for database {db} from {dump}")
+
+    tables = parse_schema(dump, db)
+
+    ## Fetch genes and transcripts
+    entries = []
+    # {(id_type, gene/transcript_id): entry index}
+    entry_idx = {}
+    needed_xrefs = set()
+    for id_type in ["gene", "transcript"]:
+        for row in read_table(
+            dump,
+            id_type,
+            tables[id_type],
+            [f"{id_type}_id", "stable_id", "display_xref_id", "description", "biotype"],
+        ):
+            entry_idx[(id_type, row[f"{id_type}_id"])] = len(entries)
+            entries.append(
+                {
+                    "id_type": id_type,
+                    "ensembl_id": row["stable_id"],
+                    "xref_id": row["display_xref_id"],
+                    "ensembl_description": row["description"],
+                    "biotype": row["biotype"],
+                    "attribs": [],
+                }
+            )
+            if row["display_xref_id"] is not None:
+                needed_xrefs.add(row["display_xref_id"])
+
+    ## Fetch gene names and descriptions of the display xrefs
+    xrefs = {}
+    for row in read_table(
+        dump, "xref", tables["xref"], ["xref_id", "display_label", "description"]
+    ):
+        if row["xref_id"] in needed_xrefs:
+            xrefs[row["xref_id"]] = (row["display_label"], row["description"])
+
+    synonyms = {}
+    for row in read_table(
+        dump, "external_synonym", tables["external_synonym"], ["xref_id", "synonym"]
+    ):
+        if row["xref_id"] in needed_xrefs:
+            synonyms.setdefault(row["xref_id"], []).append(row["synonym"])
+
+    ## Fetch gene and transcript attributes
+    for id_type in ["gene", "transcript"]:
+        for row in read_table(
+            dump,
+            f"{id_type}_attrib",
+            tables[f"{id_type}_attrib"],
+            [f"{id_type}_id", "value"],
+        ):
+            idx = entry_idx.get((id_type, row[f"{id_type}_id"]))
+            if idx is not None and row["value"] is not None:
+                entries[idx]["attribs"].append(row["value"])
+
+    ## Write index
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE entries (entry_id INTEGER PRIMARY KEY, id_type TEXT, ensembl_id TEXT, "
+            "gene_name TEXT, ensembl_description TEXT, ext_ref_description TEXT, biotype TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE synonyms (synonym_id INTEGER PRIMARY KEY, entry_id INTEGER, synonym TEXT)"
+        )
+        conn.execute("CREATE INDEX synonyms_entry ON synonyms (entry_id)")
+        # Use a trigram index for substring searches if supported (SQLite >= 3.34)
+        try:
+            for table in ["entry_text", "synonym_text"]:
+                conn.execute(
+                    f"CREATE VIRTUAL TABLE {table} USING fts5(text, tokenize='trigram')"
+                )
+        except sqlite3.OperationalError:
+            for table in ["entry_text", "synonym_text"]:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"CREATE TABLE {table} (rowid INTEGER PRIMARY KEY, text TEXT)")
+
+        synonym_id = 0
+        for entry_id, entry in enumerate(entries):
+            gene_name, ext_ref_description = xrefs.get(entry["xref_id"], (None, None))
+            conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry_id,
+                    entry["id_type"],
+                    entry["ensembl_id"],
+                    gene_name,
+                    entry["ensembl_description"],
+                    ext_ref_description,
+                    entry["biotype"],
+                ),
+            )
+
+            # Fields searched besides the synonyms
+            text = [entry["ensembl_description"], ext_ref_description, gene_name]
+            text = [t for t in text + entry["attribs"] if t is not None]
+            if text:
+                conn.execute(
+                    "INSERT INTO entry_text (rowid, text) VALUES (?, ?)",
+                    (entry_id, FIELD_SEP.join(text)),
+                )
+
+            for synonym in synonyms.get(entry["xref_id"], []):
+                conn.execute(
+                    "INSERT INTO synonyms VALUES (?, ?, ?)",
+                    (synonym_id, entry_id, synonym),
+                )
+                if synonym is not None:
+                    conn.execute(
+                        "INSERT INTO synonym_text (rowid, text) VALUES (?, ?)",
+                        (synonym_id, synonym),
+                    )
+                synonym_id += 1
+    conn.close()
+
+    # Only replace the index once it is complete
+    os.replace(tmp_path, path)
+
+    if verbose:
+        logging.info(f"Search index with {len(entries)} genes and transcripts saved in {path}")
+
+    return path
+
+
+def get_search_index(db, verbose=True):
+    """
+    Returns the path to the local search index of a core database.
+    The index is built (once per database, i.e. per species and release) if it does not exist yet.
+    """
+    path = os.path.join(SEARCH_INDEX_DIR, f"{db}.sqlite")
+    if not os.path.exists(path):
+        build_search_index(db, path=path, verbose=verbose)
+
+    return path
+
+
+def match_condition(searchword, fts=True):
+    """
+    Returns the SQL condition (and its parameters) matching one searchword in any of the
+    searched fields of the search index. As in the MySQL query of gget search, the searchword
+    is used as a LIKE pattern (i.e. '%' and '_' are wildcards).
+    With fts=True, the rows are first looked up in the FTS5 trigram index.
+    """
+    pattern = f"%{searchword}%"
+    # Parts of the searchword without wildcards that can be looked up in the trigram index
+    # (the LIKE pattern is only checked for the rows found in the index)
+    fragments = [f for f in re.split("[%_]", searchword) if len(f) >= 3]
+    conditions = []
+    params = []
+    for table in ["entry_text", "synonym_text"]:
+        if fts and fragments:
+            conditions.append(
+                f"SELECT rowid FROM {table} WHERE {table} MATCH ? AND text LIKE ?"
+            )
+            params += [
+                " AND ".join('"' + f.replace('"', '""') + '"' for f in fragments),
+                pattern,
+            ]
+        else:
+            conditions.append(f"SELECT rowid FROM {table} WHERE text LIKE ?")
+            params.append(pattern)
+
+    sql = (
+        f"(entries.entry_id IN ({conditions[0]}) "
+        f"OR synonyms.synonym_id IN ({conditions[1]}))"
+    )
+    return sql, params
+
+
+def query_search_index(path, searchwords, id_type="gene", andor="or", limit=None):
+    """
+    Find all genes or transcripts containing the searchwords (not case-sensitive) in their name,
+    description, synonyms or attributes in a local search index (see build_search_index).
+    All searchwords are combined into a single query.
+
+    Args:
+    - path          Path to the index file.
+    - searchwords   Searchword or list of searchwords.
+    - id_type       "gene" (default) or "transcript".
+    - andor         "or": Return entries matching at least one of the searchwords (default).
+                    "and": Return entries matching all searchwords.
+    - limit         If not None, only return the results for the first {limit} Ensembl IDs.
+
+    Returns a data frame with the same rows as the MySQL query in gget search, i.e. one row per
+    synonym (only the matching synonyms if the searchword only matched synonyms). With "and",
+    the rows matching the first searchword are returned.
+    """
+    if isinstance(searchwords, str):
+        searchwords = [searchwords]
+
+    conn = sqlite3.connect(path)
+    try:
+        # Check whether the text tables use the FTS5 trigram index
+        fts = "fts5" in (
+            conn.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'entry_text'"
+            ).fetchone()[0].lower()
+        )
+
+        matches = [match_condition(sw, fts) for sw in searchwords]
+        match_any = "(" + " OR ".join(sql for sql, _ in matches) + ")"
+        params_any = [p for _, params in matches for p in params]
+
+        select = """
+        SELECT entries.ensembl_id, entries.gene_name, entries.ensembl_description, entries.ext_ref_description, entries.biotype, synonyms.synonym
+        FROM entries
+        LEFT JOIN synonyms ON synonyms.entry_id = entries.entry_id
+        """
+
+        if andor == "or" and limit is None:
+            query = select + f"WHERE entries.id_type = ? AND {match_any}"
+            params = [id_type] + params_any
+
+        else:
+            # Find the Ensembl IDs matching the searchwords
+            # (with 'and', each searchword needs to match at least one row of the Ensembl ID)
+            ids_query = f"""
+            SELECT entries.ensembl_id FROM entries
+            LEFT JOIN synonyms ON synonyms.entry_id = entries.entry_id
+            WHERE entries.id_type = ? AND {match_any}
+            GROUP BY entries.ensembl_id
+            """
+            ids_params = [id_type] + params_any
+            if andor == "and":
+                ids_query += "HAVING " + " AND ".join(
+                    f"SUM({sql}) > 0" for sql, _ in matches
+                )
+                ids_params += params_any
+            if limit is not None:
+                ids_query += f" ORDER BY entries.ensembl_id LIMIT {int(limit)}"
+
+            query = select + f"WHERE entries.id_type = ? AND entries.ensembl_id IN ({ids_query}) AND "
+            params = [id_type] + ids_params
+            if andor == "and":
+                # Only return the rows matching the first searchword
+                query += matches[0][0]
+                params += matches[0][1]
+            else:
+                query += match_any
+                params += params_any
+
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
@@ -0,0 +1,440 @@
+import os
+import re
+import gzip
+import mmap
+import shutil
+import logging
+
+# Add and format time stamp in logging messages
+logging.basicConfig(
+    format="%(asctime)s %(levelname)s %(message)s",
+    level=logging.INFO,
+    datefmt="%c",
+)
+# Mute numexpr threads info
+logging.getLogger("numexpr").setLevel(logging.WARNING)
+
+import numpy as np
+import pandas as pd
+
+# Custom functions
+from .readers import open_text, read_gtf, parse_fasta_header
+
+# Columns of the ID -> coordinate table built from a GTF file
+ID_TABLE_COLUMNS = [
+    "id",
+    "object_type",
+    "seqname",
+    "start",
+    "end",
+    "strand",
+    "gene_id",
+    "gene_name",
+    "canonical",
+    "exon_starts",
+    "exon_ends",
+    "cds_starts",
+    "cds_ends",
+    "cds_phase",
+]
+
+# Columns of the table of FASTA record headers saved next to the .fai index
+RECORD_TABLE_COLUMNS = ["name", "seqtype", "transcript", "gene"]
+
+COMPLEMENT = str.maketrans("ACGTNacgtnRYKMBVDHrykmbvdh", "TGCANtgcanYRMKVBHDyrmkvbhd")
+
+# Genetic codes (https://www.ncbi.nlm.nih.gov/Taxonomy/Utils/wprintgc.cgi)
+# Amino acids of the 64 codons with bases in the order T, C, A, G
+CODON_TABLES = {
+    # Standard code
+    1: "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    # Vertebrate mitochondrial code
+    2: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSS**VVVVAAAADDEEGGGG",
+    # Yeast mitochondrial code
+    3: "FFLLSSSSYY**CCWWTTTTPPPPHHQQRRRRIIMMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    # Mold, protozoan and coelenterate mitochondrial code
+    4: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    # Invertebrate mitochondrial code
+    5: "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSSSVVVVAAAADDEEGGGG",
+}
+# Names of mitochondrial sequences
+MITOCHONDRIAL_SEQNAMES = ["MT", "chrM", "M"]
+# Genetic codes of the mitochondrial genes by genome build (regular expressions
+# matching the start of the build name, see mitochondrial_table)
+MITOCHONDRIAL_TABLES = [
+    # Genome Reference Consortium builds (human, mouse, zebrafish, chicken)
+    (r"GRC[hmzg]", 2),
+    # Vertebrate Genomes Project names (amphibians, birds, fish, mammals, reptiles, sharks),
+    # e.g. bTaeGut1 or mRatBN7
+    (r"[abfmrs][A-Z][a-z]{2}[A-Z][A-Za-z]{1,2}\d", 2),
+    # Saccharomyces cerevisiae
+    (r"R64", 3),
+    # Drosophila melanogaster
+    (r"BDGP", 5),
+    # Caenorhabditis elegans
+    (r"WBcel", 5),
+    # Arabidopsis thaliana (plant mitochondria use the standard code)
+    (r"TAIR", 1),
+]
+
+# Base -> index in the codon tables (4 = any other character)
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _i, _base in enumerate("TCAG"):
+    _BASE_CODES[ord(_base)] = _i
+    _BASE_CODES[ord(_base.lower())] = _i
+_BASE_CODES[ord("U")] = _BASE_CODES[ord("u")] = 0
+
+
+def reverse_complement(sequence):
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def translate_sequence(sequence, table=1):
+    """
+    Translate a coding nucleotide sequence into an amino acid sequence.
+    All codons are looked up at once in a vectorized codon table. Codons containing
+    ambiguous bases are translated as 'X' and incomplete trailing codons are ignored.
+
+    Args:
+    - sequence   Nucleotide sequence (DNA or RNA).
+    - table      Number of the genetic code (see CODON_TABLES), default: 1 (standard code).
+    """
+    n_codons = len(sequence) // 3
+    if n_codons == 0:
+        return ""
+
+    codes = _BASE_CODES[
+        np.frombuffer(sequence[: n_codons * 3].encode("ascii", "replace"), dtype=np.uint8)
+    ].reshape(n_codons, 3)
+    invalid = (codes == 4).any(axis=1)
+    codons = codes[:, 0].astype(np.intp) * 16 + codes[:, 1] * 4 + codes[:, 2]
+    codons[invalid] = 0
+
+    amino_acids = np.frombuffer(CODON_TABLES[table].encode(), dtype=np.uint8)[codons]
+    amino_acids[invalid] = ord("X")
+    return amino_acids.tobytes().decode()
+
+
+def mitochondrial_table(build):
+    """
+    Returns the genetic code of the mitochondrial genes of a genome build
+    (see MITOCHONDRIAL_TABLES), or None if it is not known.
+    """
+    for pattern, table in MITOCHONDRIAL_TABLES:
+        if re.match(pattern, build):
+            return table
+    return None
+
+
+def _is_newer(path, source):
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source)
+
+
+def decompress_fasta(fasta, verbose=True):
+    """
+    Decompress a gzipped FASTA file next to the original file (once), since regular gzip files
+    (as provided by Ensembl) do not support random access.
+
+    Returns the path to the uncompressed FASTA file.
+    """
+    if not fasta.endswith(".gz"):
+        return fasta
+
+    out = fasta[: -len(".gz")]
+    if not _is_newer(out, fasta):
+        if verbose:
+            logging.info(f"Decompressing {fasta} for indexed access.")
+        with gzip.open(fasta, "rb") as f_in, open(out + ".tmp", "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.replace(out + ".tmp", out)
+
+    return out
+
+
+def build_fai(fasta, fai=None):
+    """
+    Build a samtools-style FASTA index (.fai) with one line per record:
+    name, length, byte offset of the sequence, bases per line and bytes per line.
+
+    Returns the path to the index.
+    """
+    fai = fai or fasta + ".fai"
+
+    entries = []
+    records = []
+    with open(fasta, "rb") as f:
+        name = None
+        offset = 0
+        for line in iter(f.readline, b""):
+            if line.startswith(b">"):
+                if name is not None:
+                    entries.append([name, length, seq_offset, linebases, linewidth])
+                name, _, description = line[1:].decode().rstrip().partition(" ")
+                attributes = parse_fasta_header(description)
+                records.append(
+                    [
+                        name,
+                        attributes.get("seqtype", ""),
+                        attributes.get("transcript", ""),
+                        attributes.get("gene", ""),
+                    ]
+                )
+                length = 0
+                seq_offset = offset + len(line)
+                linebases = None
+                linewidth = None
+                last_line = False
+            elif name is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if bases:
+                    if linebases is None:
+                        linebases = bases
+                        linewidth = len(line)
+                    elif last_line or bases > linebases:
+                        raise ValueError(
+                            f"FASTA record {name} has lines of different length and cannot be indexed."
+                        )
+                    # Only the last line of a record can be shorter
+                    last_line = bases < linebases
+                    length += bases
+            offset += len(line)
+
+        if name is not None:
+            entries.append([name, length, seq_offset, linebases, linewidth])
+
+    with open(fai + ".tmp", "w") as f:
+        for name, length, seq_offset, linebases, linewidth in entries:
+            f.write(
+                f"{name}\t{length}\t{seq_offset}\t{linebases or 0}\t{linewidth or 0}\n"
+            )
+    os.replace(fai + ".tmp", fai)
+
+    # Save the IDs in the record headers (e.g. the transcript IDs of pep FASTA records)
+    records_path = fai[: -len(".fai")] + ".records.tsv"
+    with open(records_path + ".tmp", "w") as f:
+        f.write("\t".join(RECORD_TABLE_COLUMNS) + "\n")
+        for record in records:
+            f.write("\t".join(record) + "\n")
+    os.replace(records_path + ".tmp", records_path)
+
+    return fai
+
+
+class FastaIndex:
+    """
+    Random access to the sequences of a FASTA file using a samtools-style index (.fai).
+    The index is built if it does not exist yet, and gzipped files are decompressed once.
+    Sequences are read from a memory-mapped file, so only the requested bases are loaded.
+
+        with FastaIndex("Homo_sapiens.GRCh38.dna.primary_assembly.fa.gz") as genome:
+            genome.fetch("1", 65419, 71585, strand="+")
+    """
+
+    def __init__(self, fasta, verbose=True):
+        self.fasta = decompress_fasta(fasta, verbose=verbose)
+        fai = self.fasta + ".fai"
+        records_path = self.fasta + ".records.tsv"
+        if not _is_newer(fai, self.fasta) or not _is_newer(records_path, self.fasta):
+            if verbose:
+                logging.info(f"Indexing {self.fasta}.")
+            build_fai(self.fasta, fai)
+
+        self.index = {}
+        with open(fai) as f:
+            for line in f:
+                name, length, offset, linebases, linewidth = line.rstrip("\n").split("\t")[:5]
+                self.index[name] = (int(length), int(offset), int(linebases), int(linewidth))
+
+        # Record names without version number, e.g. ENST00000641515 -> ENST00000641515.2
+        self.unversioned = {}
+        for name in self.index:
+            self.unversioned.setdefault(name.split(".")[0], name)
+
+        # Transcript and gene IDs of the records (without version number) from the headers,
+        # e.g. to look up pep FASTA records (named by protein ID) by transcript ID
+        self.records = pd.read_csv(
+            records_path, sep="\t", dtype=str, keep_default_na=False
+        ).set_index("name")
+        self.transcripts = {}
+        for name, transcript_id in self.records["transcript"].items():
+            if transcript_id:
+                self.transcripts.setdefault(transcript_id.split(".")[0], name)
+        self.genes = {}
+        for name, gene_id in self.records["gene"].items():
+            if gene_id:
+                self.genes.setdefault(gene_id.split(".")[0], []).append(name)
+        self.seqtypes = set(self.records["seqtype"])
+
+        self._file = open(self.fasta, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def resolve(self, name):
+        """
+        Returns the record name matching a name with or without version number (or None).
+        """
+        if name in self.index:
+            return name
+        return self.unversioned.get(name.split(".")[0])
+
+    def resolve_transcript(self, transcript_id):
+        """
+        Returns the record name of a transcript ID, e.g. the protein ID of a pep FASTA record (or None).
+        """
+        return self.transcripts.get(transcript_id.split(".")[0])
+
+    def gene_records(self, gene_id):
+        """
+        Returns the names of all records of a gene ID according to the record headers.
+        """
+        return list(self.genes.get(gene_id.split(".")[0], []))
+
+    def __contains__(self, name):
+        return self.resolve(name) is not None
+
+    def length(self, name):
+        return self.index[self.resolve(name)][0]
+
+    def fetch(self, name, start=None, end=None, strand="+"):
+        """
+        Returns the sequence of a record from start to end (1-based, inclusive; default: whole record).
+        The reverse complement is returned for strand "-" (or -1).
+        """
+        length, offset, linebases, linewidth = self.index[self.resolve(name)]
+        start = 1 if start is None else max(1, start)
+        end = length if end is None else min(length, end)
+        if end < start or linebases == 0:
+            return ""
+
+        def position(pos):
+            # Byte offset of 0-based position pos
+            return offset + (pos // linebases) * linewidth + pos % linebases
+
+        data = self._mmap[position(start - 1) : position(end - 1) + 1]
+        sequence = data.replace(b"\n", b"").replace(b"\r", b"").decode()
+
+        if strand in ("-", -1, "-1"):
+            sequence = reverse_complement(sequence)
+        return sequence
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_id_table(gtf, path=None, verbose=True):
+    """
+    Build a table mapping the gene and transcript IDs of a GTF file to their coordinates
+    (transcripts also include the coordinates of their exons, sorted by position).
+    The table is saved as a (gzipped) TSV file next to the GTF file.
+
+    Returns the path to the table.
+    """
+    path = path or gtf + ".ids.tsv.gz"
+    if verbose:
+        logging.info(f"Building ID table from {gtf}.")
+
+    rows = {}
+    exons = {}
+    cds = {}
+    for record in read_gtf(gtf, features=["gene", "transcript", "exon", "CDS"]):
+        attributes = record.attributes
+        if record.feature == "exon":
+            exons.setdefault(attributes.get("transcript_id"), []).append(
+                (record.start, record.end)
+            )
+            continue
+        if record.feature == "CDS":
+            cds.setdefault(attributes.get("transcript_id"), []).append(
+                (record.start, record.end, record.frame)
+            )
+            continue
+
+        tags = attributes.get("tag", [])
+        if isinstance(tags, str):
+            tags = [tags]
+
+        id_key = "gene_id" if record.feature == "gene" else "transcript_id"
+        rows[attributes.get(id_key)] = [
+            attributes.get(id_key),
+            record.feature.capitalize(),
+            record.seqname,
+            record.start,
+            record.end,
+            record.strand,
+            attributes.get("gene_id"),
+            attributes.get("gene_name", ""),
+            "Ensembl_canonical" in tags,
+        ]
+
+    # Gene names are not always repeated on transcript lines
+    gene_names = {row[0]: row[7] for row in rows.values() if row[1] == "Gene"}
+
+    with gzip.open(path + ".tmp", "wt") as f:
+        f.write("\t".join(ID_TABLE_COLUMNS) + "\n")
+        for id_, row in rows.items():
+            row[7] = row[7] or gene_names.get(row[6], "")
+            exon_list = sorted(exons.get(id_, [])) if row[1] == "Transcript" else []
+            cds_list = sorted(cds.get(id_, [])) if row[1] == "Transcript" else []
+            # Phase of the first CDS segment in transcript orientation
+            phase = ""
+            if cds_list:
+                frame = cds_list[0][2] if row[5] == "+" else cds_list[-1][2]
+                phase = int(frame) if frame.isdigit() else 0
+            row = row + [
+                ",".join(str(start) for start, _ in exon_list),
+                ",".join(str(end) for _, end in exon_list),
+                ",".join(str(start) for start, _, _ in cds_list),
+                ",".join(str(end) for _, end, _ in cds_list),
+                phase,
+            ]
+            f.write("\t".join(str(value) for value in row) + "\n")
+    os.replace(path + ".tmp", path)
+
+    return path
+
+
+def load_id_table(gtf, verbose=True):
+    """
+    Load the ID table of a GTF file (built if it does not exist yet or is older than the GTF file).
+    Returns a data frame indexed by ID.
+    """
+    path = gtf + ".ids.tsv.gz"
+    if not _is_newer(path, gtf) or _table_columns(path) != ID_TABLE_COLUMNS:
+        build_id_table(gtf, path, verbose=verbose)
+
+    df = pd.read_csv(
+        path,
+        sep="\t",
+        dtype={
+            column: str
+            for column in ID_TABLE_COLUMNS
+            if column not in ["start", "end", "canonical"]
+        },
+        keep_default_na=False,
+    )
+    df["canonical"] = df["canonical"].astype(str) == "True"
+    return df.set_index("id")
+
+
+def _table_columns(path):
+    with gzip.open(path, "rt") as f:
+        return f.readline().rstrip("\n").split("\t")
+
+
+def genome_build(gtf):
+    """
+    Returns the genome build from the header of a GTF file (e.g. 'GRCh38'), or an empty string.
+    """
+    with open_text(gtf) as f:
+        for line in f:
+            if not line.startswith("#!"):
+                break
+            if line.startswith("#!genome-build "):
+                return line.split()[1].split(".")[0]
+    return ""
@@ -1,8 +1,14 @@
 from bs4 import BeautifulSoup
 import requests
-
-# from requests.adapters import HTTPAdapter, Retry
-# import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import MaxRetryError
+
+import time
+import asyncio
+import threading
+from concurrent import futures
+from urllib.parse import urlparse
 import re
 import os
 import uuid
@@ -20,7 +26,334 @@ logging.basicConfig(
 # Mute numexpr threads info
 logging.getLogger("numexpr").setLevel(logging.WARNING)
 
-from .constants import ENSEMBL_FTP_URL, ENSEMBL_FTP_URL_NV, ENS_TO_PDB_API
+from .constants import (
+    ENSEMBL_FTP_URL,
+    ENSEMBL_FTP_URL_NV,
+    ENS_TO_PDB_API,
+    NCBI_URL,
+    UNIPROT_IDMAPPING_API,
+    UNIPROT_IDMAPPING_MIN_IDS,
+    UNIPROT_IDMAPPING_BATCH_SIZE,
+    UNIPROT_IDMAPPING_PAGE_SIZE,
+    UNIPROT_IDMAPPING_POLL_INTERVAL,
+    HTTP_RETRIES,
+    HTTP_BACKOFF_FACTOR,
+    HTTP_RETRY_STATUS_CODES,
+    HTTP_RETRY_POST_HOSTS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_POOL_SIZES,
+    RATE_LIMITS,
+)
+from .cache import cached
+
+
+def get_host(url):
+    """
+    Returns the host of a URL (or the host itself if a host without scheme is passed).
+    """
+    host = urlparse(url).hostname
+    if host is None:
+        host = url.split("/")[0]
+    return host.lower()
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket rate limiter keyed by host.
+
+    Each host has a bucket holding up to 'burst' tokens which is refilled at 'rate'
+    tokens per second. Every request takes one token. If the bucket is empty, the
+    request waits until a token becomes available. Tokens are reserved while holding
+    a lock, but the waiting happens outside of the lock, so the same limiter can be
+    shared by threads (acquire) and asyncio tasks (acquire_async).
+    Requests to hosts without a defined limit are not throttled.
+    """
+
+    def __init__(self, limits=None):
+        """
+        Args:
+        - limits    Dictionary of rate limits in the format {URL or host: (requests per second, burst size)}.
+        """
+        self._lock = threading.Lock()
+        # host -> (rate, burst)
+        self._limits = {}
+        # host -> [tokens, time of last update]
+        self._buckets = {}
+        # host -> counters
+        self._stats = {}
+
+        for host, (rate, burst) in (limits or {}).items():
+            self.set_limit(host, rate, burst)
+
+    def set_limit(self, host, rate, burst=1):
+        """
+        Set the rate limit for a host.
+
+        Args:
+        - host      URL or host, e.g. "rest.ensembl.org".
+        - rate      Number of requests allowed per second. None -> requests to this host are not throttled.
+        - burst     Number of requests that can be sent at once before throttling starts. Default: 1.
+        """
+        host = get_host(host)
+        with self._lock:
+            if rate is None:
+                self._limits.pop(host, None)
+                self._buckets.pop(host, None)
+                return
+
+            if rate <= 0 or burst < 1:
+                raise ValueError(
+                    f"Rate limit for host {host} must be > 0 and burst size must be >= 1."
+                )
+
+            self._limits[host] = (rate, burst)
+            self._buckets[host] = [burst, time.monotonic()]
+
+    def get_limits(self):
+        """
+        Returns a dictionary of the current rate limits {host: (requests per second, burst size)}.
+        """
+        with self._lock:
+            return dict(self._limits)
+
+    def _reserve(self, host):
+        """
+        Reserve a token for a request to host.
+        Returns the number of seconds the caller has to wait before sending the request.
+        """
+        host = get_host(host)
+        with self._lock:
+            stats = self._stats.setdefault(
+                host, {"requests": 0, "throttled": 0, "wait_time": 0.0}
+            )
+            stats["requests"] += 1
+
+            if host not in self._limits:
+                return 0
+
+            rate, burst = self._limits[host]
+            tokens, last = self._buckets[host]
+
+            # Refill the bucket based on the time passed since the last request
+            now = time.monotonic()
+            tokens = min(burst, tokens + (now - last) * rate) - 1
+            self._buckets[host] = [tokens, now]
+
+            # Tokens below zero are reservations of future tokens
+            if tokens >= 0:
+                return 0
+
+            wait = -tokens / rate
+            stats["throttled"] += 1
+            stats["wait_time"] += wait
+
+            return wait
+
+    def acquire(self, host):
+        """
+        Block the current thread until a request to host is allowed.
+        Returns the number of seconds spent waiting.
+        """
+        wait = self._reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, host):
+        """
+        Asynchronous version of acquire for use in asyncio tasks.
+        Returns the number of seconds spent waiting.
+        """
+        wait = self._reserve(host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of requests, the number of throttled requests
+        and the total time spent waiting (in seconds) per host.
+        """
+        with self._lock:
+            return {host: dict(stats) for host, stats in self._stats.items()}
+
+    def reset_stats(self):
+        """
+        Reset all request counters.
+        """
+        with self._lock:
+            self._stats = {}
+
+
+# Rate limiter shared by all gget modules
+RATE_LIMITER = RateLimiter(RATE_LIMITS)
+
+
+def set_rate_limit(host, rate, burst=1):
+    """
+    Set the maximum request rate for a host for all gget modules.
+
+    Args:
+    - host      URL or host, e.g. "rest.ensembl.org" or gget.constants.ENSEMBL_REST_API.
+    - rate      Number of requests allowed per second. None -> requests to this host are not throttled.
+    - burst     Number of requests that can be sent at once before throttling starts. Default: 1.
+    """
+    RATE_LIMITER.set_limit(host, rate, burst)
+
+
+def rate_limit_stats():
+    """
+    Returns a dictionary with the number of requests, the number of throttled requests
+    and the total time spent waiting (in seconds) per host since gget was imported.
+    """
+    return RATE_LIMITER.stats()
+
+
+class RateLimitedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that waits for the shared rate limiter before sending a request.
+
+    Failed requests are retried by the adapter instead of urllib3, so that each retry
+    also waits for the rate limiter. Only idempotent requests are retried: POST requests
+    (e.g. job submissions) are sent once unless their host is listed in 'retry_post_hosts'.
+    """
+
+    # Request methods that are retried
+    IDEMPOTENT_METHODS = frozenset(["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"])
+
+    def __init__(self, retry=None, retry_post_hosts=(), **kwargs):
+        """
+        Args:
+        - retry             urllib3 Retry object defining the retries (None -> requests are not retried).
+        - retry_post_hosts  Hosts whose POST requests only read data and can be retried.
+        (Other keyword arguments are passed to HTTPAdapter.)
+        """
+        self.retry = retry
+        self.retry_post_hosts = set(retry_post_hosts)
+        super().__init__(**kwargs)
+
+    def is_retryable(self, request):
+        if request.method == "POST":
+            return get_host(request.url) in self.retry_post_hosts
+        return request.method in self.IDEMPOTENT_METHODS
+
+    def send(self, request, **kwargs):
+        retry = self.retry if self.is_retryable(request) else None
+        while True:
+            RATE_LIMITER.acquire(request.url)
+            try:
+                response = super().send(request, **kwargs)
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                if retry is None:
+                    raise
+                try:
+                    retry = retry.increment(request.method, request.url, error=e)
+                except MaxRetryError:
+                    raise e
+                retry.sleep()
+                continue
+
+            if retry is None or not retry.is_retry(
+                request.method,
+                response.status_code,
+                "Retry-After" in response.headers,
+            ):
+                return response
+            try:
+                retry = retry.increment(
+                    request.method, request.url, response=response.raw
+                )
+            except MaxRetryError:
+                # Return the last response once all retries are used up
+                # (the status code of the response is checked by the calling function)
+                return response
+            retry.sleep(response.raw)
+            response.close()
+
+
+# gget-wide HTTP session (see get_session)
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def build_session(
+    retries=HTTP_RETRIES,
+    backoff_factor=HTTP_BACKOFF_FACTOR,
+    status_forcelist=HTTP_RETRY_STATUS_CODES,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    pool_sizes=HTTP_POOL_SIZES,
+    retry_post_hosts=HTTP_RETRY_POST_HOSTS,
+):
+    """
+    Function to build a requests session with keep-alive connection pooling,
+    automatic retries with exponential backoff and per-host rate limiting (see RATE_LIMITER).
+    Retries also wait for the rate limiter (see RateLimitedHTTPAdapter).
+
+    Args:
+    - retries           Number of times a failed request is retried.
+    - backoff_factor    Backoff factor between retries (waits {backoff_factor} * 2 ** {retry number} seconds).
+                        'Retry-After' headers returned by the server take precedence.
+    - status_forcelist  List of response status codes that trigger a retry.
+    - pool_maxsize      Default number of connections kept alive per host.
+    - pool_sizes        Dictionary of host-specific pool sizes, e.g. {"rest.ensembl.org": 15}.
+    - retry_post_hosts  List of hosts whose POST requests are retried (other POST requests are sent once).
+
+    Returns requests.Session object.
+    """
+    retry_args = dict(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        respect_retry_after_header=True,
+    )
+    # The request methods that are retried are selected by RateLimitedHTTPAdapter
+    try:
+        retry = Retry(allowed_methods=None, **retry_args)
+    except TypeError:
+        # urllib3 < 1.26
+        retry = Retry(method_whitelist=None, **retry_args)
+
+    session = requests.Session()
+
+    # Default adapter for all hosts
+    adapter = RateLimitedHTTPAdapter(
+        retry=retry,
+        retry_post_hosts=retry_post_hosts,
+        pool_connections=len(pool_sizes) + 1,
+        pool_maxsize=pool_maxsize,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    # Host-specific adapters
+    for host, pool_size in pool_sizes.items():
+        host_adapter = RateLimitedHTTPAdapter(
+            retry=retry,
+            retry_post_hosts=retry_post_hosts,
+            pool_connections=1,
+            pool_maxsize=pool_size,
+        )
+        session.mount(f"http://{host}", host_adapter)
+        session.mount(f"https://{host}", host_adapter)
+
+    return session
+
+
+def get_session():
+    """
+    Returns the requests session shared by all gget modules.
+    Reusing the session keeps connections to each server alive between requests,
+    so that consecutive requests do not pay for a new TCP/TLS handshake.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = build_session()
+        return _SESSION
+
 
 def flatten(xss):
     """
@@ -28,6 +361,14 @@ def flatten(xss):
     """
     return [x for xs in xss for x in xs]
 
+
+def chunks(lst, n):
+    """
+    Function to split a list into consecutive chunks of (at most) n elements.
+    """
+    return [lst[i : i + n] for i in range(0, len(lst), n)]
+
+
 def n_colors(nucleotide):
     """
     Returns a string format to print the nucleotide
@@ -142,9 +483,203 @@ def aa_colors(amino_acid):
     return f"\033[38;5;{textcolor}m\033[48;5;{bkg_color}m{amino_acid}\033[0;0m"
 
 
+def uniprot_idmapping_db(id_):
+    """
+    Returns the name of the UniProt ID mapping database of an
+    Ensembl (gene, transcript or protein), WormBase or FlyBase ID (None for other IDs).
+    """
+    if id_.startswith("ENS"):
+        # The object type is the letter before the number, e.g. ENSG, ENSMUST, ENSDARP
+        match = re.match(r"ENS[A-Z]*([GTP])\d", id_)
+        if match is None:
+            return None
+        return {"G": "Ensembl", "T": "Ensembl_Transcript", "P": "Ensembl_Protein"}[
+            match.group(1)
+        ]
+    elif id_.startswith("WBGene"):
+        return "WormBase"
+    elif id_.startswith("FBgn"):
+        return "FlyBase"
+    else:
+        return None
+
+
+@cached("uniprot")
+def get_uniprot_idmapping(ids, from_db="Ensembl"):
+    """
+    Map IDs to UniProtKB entries using the UniProt ID mapping service.
+    Submits one job per UNIPROT_IDMAPPING_BATCH_SIZE IDs, polls the job status
+    and fetches the paginated results (following the 'next' Link headers).
+
+    API documentation: https://www.uniprot.org/help/id_mapping
+
+    Args:
+    - ids       List of IDs.
+    - from_db   UniProt ID mapping database the IDs belong to, e.g. "Ensembl", "WormBase" or "FlyBase".
+
+    Returns dictionary {query ID: list of UniProtKB entries (json)} containing all mapped IDs.
+    """
+    mapped = {}
+
+    for ids_chunk in chunks(list(ids), UNIPROT_IDMAPPING_BATCH_SIZE):
+        # Submit ID mapping job
+        r = get_session().post(
+            UNIPROT_IDMAPPING_API + "/run",
+            data={"from": from_db, "to": "UniProtKB", "ids": ",".join(ids_chunk)},
+        )
+        if not r.ok:
+            raise RuntimeError(
+                f"UniProt ID mapping server returned error status code {r.status_code}."
+            )
+        job_id = r.json()["jobId"]
+
+        # Poll job status until the job is finished
+        # (finished jobs redirect to their results)
+        while True:
+            r = get_session().get(
+                f"{UNIPROT_IDMAPPING_API}/status/{job_id}", allow_redirects=False
+            )
+            if r.is_redirect:
+                break
+            if not r.ok:
+                raise RuntimeError(
+                    f"UniProt ID mapping server returned error status code {r.status_code}."
+                )
+
+            status = r.json().get("jobStatus")
+            if status in ["NEW", "RUNNING"]:
+                time.sleep(UNIPROT_IDMAPPING_POLL_INTERVAL)
+            elif status is None or status == "FINISHED":
+                break
+            else:
+                raise RuntimeError(
+                    f"UniProt ID mapping job {job_id} returned status '{status}'."
+                )
+
+        # Get link to results
+        r = get_session().get(f"{UNIPROT_IDMAPPING_API}/details/{job_id}")
+        if not r.ok:
+            raise RuntimeError(
+                f"UniProt ID mapping server returned error status code {r.status_code}."
+            )
+        url = r.json()["redirectURL"]
+        params = {"format": "json", "size": UNIPROT_IDMAPPING_PAGE_SIZE}
+
+        # Fetch all pages of results
+        while url:
+            r = get_session().get(url, params=params)
+            if not r.ok:
+                raise RuntimeError(
+                    f"UniProt ID mapping server returned error status code {r.status_code}."
+                )
+            for result in r.json()["results"]:
+                mapped.setdefault(result["from"], []).append(result["to"])
+
+            # The link to the next page already contains all parameters
+            url = r.links.get("next", {}).get("url")
+            params = None
+
+    return mapped
+
+
+def get_uniprot_entries(ids):
+    """
+    Fetch the UniProtKB entries of several Ensembl, WormBase or FlyBase IDs
+    with one UniProt ID mapping job per ID type (see get_uniprot_idmapping).
+
+    Args:
+    - ids   List of IDs.
+
+    Returns dictionary {query ID: list of UniProtKB entries (json)}.
+    IDs of other types, IDs that were not mapped or IDs for which the ID mapping job failed are not included,
+    so they can be looked up one by one instead.
+    """
+    ids_per_db = {}
+    for id_ in ids:
+        from_db = uniprot_idmapping_db(id_)
+        if from_db is not None:
+            ids_per_db.setdefault(from_db, []).append(id_)
+
+    entries = {}
+    for from_db, db_ids in ids_per_db.items():
+        try:
+            mapped = get_uniprot_idmapping(db_ids, from_db=from_db)
+        except Exception as e:
+            logging.warning(
+                f"UniProt ID mapping failed with the following error. IDs will be looked up one by one.\n{e}"
+            )
+            continue
+
+        # IDs without mapped entries are left out so they are looked up one by one
+        for id_ in db_ids:
+            if id_ in mapped:
+                entries[id_] = mapped[id_]
+
+    return entries
+
+
+def filter_reviewed(entries):
+    """
+    Returns the reviewed (Swiss-Prot) entries of a list of UniProtKB entries (json)
+    if there are any, and all (unreviewed) entries otherwise.
+    The second return value is True if only reviewed entries were returned.
+    """
+    reviewed = [
+        entry
+        for entry in entries
+        if entry.get("entryType", "").startswith("UniProtKB reviewed")
+    ]
+    if len(reviewed) > 0:
+        return reviewed, True
+    else:
+        return entries, False
+
+
+def uniprot_seqs_df(results, id_):
+    """
+    Convert UniProtKB entries (json) to a data frame with UniProt ID,
+    organism, sequence, sequence length, gene name, and query ID.
+    """
+    # Convert results to data frame
+    df = pd.json_normalize(results)
+
+    # Remove non-relevant columns
+    df = df[
+        [
+            "primaryAccession",
+            "organism.scientificName",
+            "sequence.value",
+            "sequence.length",
+        ]
+    ]
+
+    # Rename columns
+    df.columns = [
+        "uniprot_id",
+        "organism",
+        "sequence",
+        "sequence_length",
+    ]
+
+    # Add gene name and query columns
+    gene_names = []
+    for i in np.arange(len(results)):
+        try:
+            gene_names.append(results[i]["genes"][0]["geneName"]["value"])
+        except:
+            gene_names.append(np.NaN)
+    df["gene_name"] = gene_names
+    df["query"] = id_
+
+    return df
+
+
+@cached("uniprot")
 def get_uniprot_seqs(server, ensembl_ids):
     """
     Retrieve UniProt sequences based on Ensemsbl, WormBase or FlyBase identifiers.
+    If at least UNIPROT_IDMAPPING_MIN_IDS IDs are passed, all IDs are mapped using
+    a single UniProt ID mapping job instead of one search request per ID.
 
     Args:
     - server        Link to UniProt REST API server.
@@ -157,24 +692,30 @@ def get_uniprot_seqs(server, ensembl_ids):
     if type(ensembl_ids) == str:
         ensembl_ids = [ensembl_ids]
 
+    # Fetch entries of all IDs at once for long ID lists
+    mapped = {}
+    if len(ensembl_ids) >= UNIPROT_IDMAPPING_MIN_IDS:
+        mapped = get_uniprot_entries(ensembl_ids)
+
     # Initiate data frame so empty df will be returned if no matches are found
     master_df = pd.DataFrame()
 
     for id_ in ensembl_ids:
-        # API documentation: https://www.uniprot.org/help/api_queries
-        # Submit server request
-        r = requests.get(server + id_ + "+AND+reviewed:true")
-        if not r.ok:
-            logging.error(
-                f"UniProt server request returned with error status code: {r.status_code}. Please double-check arguments or try again later."
-            )
-        # Convert to json
-        json = r.json()
+        if id_ in mapped:
+            # Prefer reviewed entries
+            results, reviewed = filter_reviewed(mapped[id_])
+            json = {"results": results}
+
+            # Warn user if only unreviewed results were found
+            if len(results) > 0 and not reviewed:
+                logging.warning(
+                    f"No reviewed UniProt results were found for ID {id_}. Returning all unreviewed results."
+                )
 
-        # If no reviewed results were found, try again for unreviewed results
-        if not len(json["results"]) > 0:
+        else:
+            # API documentation: https://www.uniprot.org/help/api_queries
             # Submit server request
-            r = requests.get(server + id_)
+            r = get_session().get(server + id_ + "+AND+reviewed:true")
             if not r.ok:
                 logging.error(
                     f"UniProt server request returned with error status code: {r.status_code}. Please double-check arguments or try again later."
@@ -182,45 +723,25 @@ def get_uniprot_seqs(server, ensembl_ids):
             # Convert to json
             json = r.json()
 
-            # Warn user if unreviewed results were found
-            if len(json["results"]) > 0:
-                logging.warning(
-                    f"No reviewed UniProt results were found for ID {id_}. Returning all unreviewed results."
-                )
-
-        if len(json["results"]) > 0:
-            # Convert results to data frame
-            df = pd.json_normalize(json["results"])
-
-            # Remove non-relevant columns
-            df = df[
-                [
-                    "primaryAccession",
-                    "organism.scientificName",
-                    "sequence.value",
-                    "sequence.length",
-                ]
-            ]
-
-            # Rename columns
-            df.columns = [
-                "uniprot_id",
-                "organism",
-                "sequence",
-                "sequence_length",
-            ]
+            # If no reviewed results were found, try again for unreviewed results
+            if not len(json["results"]) > 0:
+                # Submit server request
+                r = get_session().get(server + id_)
+                if not r.ok:
+                    logging.error(
+                        f"UniProt server request returned with error status code: {r.status_code}. Please double-check arguments or try again later."
+                    )
+                # Convert to json
+                json = r.json()
 
-            # Add gene name and query columns
-            gene_names = []
-            for i in np.arange(len(json["results"])):
-                try:
-                    gene_names.append(
-                        json["results"][i]["genes"][0]["geneName"]["value"]
+                # Warn user if unreviewed results were found
+                if len(json["results"]) > 0:
+                    logging.warning(
+                        f"No reviewed UniProt results were found for ID {id_}. Returning all unreviewed results."
                     )
-                except:
-                    gene_names.append(np.NaN)
-            df["gene_name"] = gene_names
-            df["query"] = id_
+
+        if len(json["results"]) > 0:
+            df = uniprot_seqs_df(json["results"], id_)
 
             # Append results for this ID to master data frame
             master_df = pd.concat([master_df, df], axis=0)
@@ -232,48 +753,18 @@ def get_uniprot_seqs(server, ensembl_ids):
     return master_df
 
 
-def get_uniprot_info(server, ensembl_id, verbose=True):
+def uniprot_info_df(results, ensembl_id):
     """
-    Retrieve UniProt synonyms and description based on Ensemsbl identifiers.
+    Convert the UniProtKB entries (json) found for an Ensembl ID to a data frame with
+    UniProt ID, primary gene name, synonyms, protein names, description, subcellular
+    localisation, and query ID. If more than one entry was found, the values of all
+    entries are combined into a single row.
 
-    Args:
-    - server          Link to UniProt REST API server.
-    - ensembl_id      Ensembl, WormBase or FlyBase ID (str).
-    - verbose         True/False to print logging messages.
-
-    Returns data frame with UniProt ID, gene name, organism, sequence, sequence length, and query ID.
+    Returns None if no entries were found.
     """
-    # API documentation: https://www.uniprot.org/help/api_queries
-    # Submit server request for reviewed entries
-    r = requests.get(server + ensembl_id + "+AND+reviewed:true")
-    if not r.ok:
-        logging.error(
-            f"UniProt server request returned with error status code: {r.status_code}. Please double-check arguments or try again later."
-        )
-    # Convert to json
-    json = r.json()
-
-    # If no reviewed entries were found, try again for unreviewed entries
-    if not len(json["results"]) > 0:
-        # Submit server request
-        r = requests.get(server + ensembl_id)
-        if not r.ok:
-            logging.error(
-                f"UniProt server request returned with error status code: {r.status_code}. Please double-check arguments or try again later."
-            )
-        # Convert to json
-        json = r.json()
-
-        # Warn user if unreviewed results were found
-        if len(json["results"]) > 0:
-            if verbose is True:
-                logging.warning(
-                    f"No reviewed UniProt results were found for ID {ensembl_id}. Returning all unreviewed results."
-                )
-
-    if len(json["results"]) > 0:
+    if len(results) > 0:
         # Convert results to data frame
-        df = pd.json_normalize(json["results"])
+        df = pd.json_normalize(results)
 
         # Remove non-relevant columns
         df = df[
@@ -288,19 +779,19 @@ def get_uniprot_info(server, ensembl_id, verbose=True):
 
         # Get primary gene name for each result
         gene_names = []
-        for i in np.arange(len(json["results"])):
+        for i in np.arange(len(results)):
             try:
-                gene_names.append(json["results"][i]["genes"][0]["geneName"]["value"])
+                gene_names.append(results[i]["genes"][0]["geneName"]["value"])
             except:
                 gene_names.append(np.NaN)
         df["primary_gene_name"] = gene_names
 
         # Get synonyms for each result
         uni_synonyms = []
-        for i in np.arange(len(json["results"])):
+        for i in np.arange(len(results)):
             uni_syn_temp = []
             try:
-                for syn in json["results"][i]["genes"][0]["synonyms"]:
+                for syn in results[i]["genes"][0]["synonyms"]:
                     uni_syn_temp.append(syn["value"])
             except:
                 uni_syn_temp.append(np.NaN)
@@ -309,10 +800,10 @@ def get_uniprot_info(server, ensembl_id, verbose=True):
 
         # Get protein names for each result
         protein_names = []
-        for i in np.arange(len(json["results"])):
+        for i in np.arange(len(results)):
             try:
                 protein_names.append(
-                    json["results"][i]["proteinDescription"]["recommendedName"][
+                    results[i]["proteinDescription"]["recommendedName"][
                         "fullName"
                     ]["value"]
                 )
@@ -322,10 +813,10 @@ def get_uniprot_info(server, ensembl_id, verbose=True):
 
         # Get descriptions for each result
         descriptions = []
-        for i in np.arange(len(json["results"])):
+        for i in np.arange(len(results)):
             des_temp = []
             try:
-                for text in json["results"][i]["comments"]:
+                for text in results[i]["comments"]:
                     if text["commentType"] == "FUNCTION":
                         des_temp.append(text["texts"][0]["value"])
                 # Keep only unique descriptions
@@ -340,11 +831,11 @@ def get_uniprot_info(server, ensembl_id, verbose=True):
 
         # Get subcellular localisations for each result
         subcel_locs_final = []
-        for i in np.arange(len(json["results"])):
+        for i in np.arange(len(results)):
             subcel_locs = []
             try:
-                for comment_idx in np.arange(len(json["results"][i]["comments"])):
-                    comment_json = json["results"][i]["comments"][comment_idx]
+                for comment_idx in np.arange(len(results[i]["comments"])):
+                    comment_json = results[i]["comments"][comment_idx]
                     if comment_json["commentType"] == "SUBCELLULAR LOCATION":
                         for location_dict in comment_json["subcellularLocations"]:
                             subcel_locs.append(location_dict["location"]["value"])
@@ -402,6 +893,78 @@ def get_uniprot_info(server, ensembl_id, verbose=True):
         return None
 
 
+@cached("uniprot", ignore=("verbose",))
+def get_uniprot_info(server, ensembl_id, verbose=True):
+    """
+    Retrieve UniProt synonyms and description based on Ensemsbl identifiers.
+
+    Args:
+    - server          Link to UniProt REST API server.
+    - ensembl_id      Ensembl, WormBase or FlyBase ID (str).
+    - verbose         True/False to print logging messages.
+
+    Returns data frame with UniProt ID, gene name, organism, sequence, sequence length, and query ID.
+    """
+    # API documentation: https://www.uniprot.org/help/api_queries
+    # Submit server request for reviewed entries
+    r = get_session().get(server + ensembl_id + "+AND+reviewed:true")
+    if not r.ok:
+        logging.error(
+            f"UniProt server request returned with error status code: {r.status_code}. Please double-check arguments or try again later."
+        )
+    # Convert to json
+    json = r.json()
+
+    # If no reviewed entries were found, try again for unreviewed entries
+    if not len(json["results"]) > 0:
+        # Submit server request
+        r = get_session().get(server + ensembl_id)
+        if not r.ok:
+            logging.error(
+                f"UniProt server request returned with error status code: {r.status_code}. Please double-check arguments or try again later."
+            )
+        # Convert to json
+        json = r.json()
+
+        # Warn user if unreviewed results were found
+        if len(json["results"]) > 0:
+            if verbose is True:
+                logging.warning(
+                    f"No reviewed UniProt results were found for ID {ensembl_id}. Returning all unreviewed results."
+                )
+
+    return uniprot_info_df(json["results"], ensembl_id)
+
+
+def get_uniprot_info_bulk(ensembl_ids, verbose=True):
+    """
+    Retrieve UniProt synonyms and descriptions of several Ensembl, WormBase or FlyBase IDs
+    using UniProt ID mapping jobs (see get_uniprot_entries) instead of one search request per ID.
+
+    Args:
+    - ensembl_ids     List of Ensembl, WormBase or FlyBase IDs.
+    - verbose         True/False to print logging messages.
+
+    Returns dictionary {query ID: data frame (see get_uniprot_info) or None if no entry was found}.
+    IDs that could not be mapped are not included.
+    """
+    results = {}
+    for ensembl_id, entries in get_uniprot_entries(ensembl_ids).items():
+        # Prefer reviewed entries
+        entries, reviewed = filter_reviewed(entries)
+
+        # Warn user if only unreviewed results were found
+        if len(entries) > 0 and not reviewed:
+            if verbose is True:
+                logging.warning(
+                    f"No reviewed UniProt results were found for ID {ensembl_id}. Returning all unreviewed results."
+                )
+
+        results[ensembl_id] = uniprot_info_df(entries, ensembl_id)
+
+    return results
+
+
 # This function was replaced by the faster and more complete PDB API (see get_pdb_ids below)
 # def get_pdb_ids(uniprot_ids):
 #     """
@@ -494,6 +1057,69 @@ def get_uniprot_info(server, ensembl_id, verbose=True):
 #     return list(pdb_ids)
 
 
+@cached("ncbi")
+def get_ncbi_info(ens_id):
+    """
+    Function to fetch the NCBI gene ID, description and synonyms linked to an Ensembl ID
+    by web scraping the NCBI gene search results.
+
+    Returns a dictionary with the keys 'ncbi_gene_id', 'ncbi_description' (np.nan if not available)
+    and 'ncbi_synonyms' (None if not available).
+    Raises a RuntimeError if the NCBI server returned an error message.
+    """
+    html = get_session().get(NCBI_URL + f"/gene/?term={ens_id}")
+    # Raise error if status code not "OK" Response
+    if html.status_code != 200:
+        logging.error(
+            f"NCBI server request for {ens_id} returned error status code:\n{html.status_code}.\nPlease double-check arguments or try again later."
+        )
+
+    ## Web scrape NCBI website for gene ID, synonyms and description
+    soup = BeautifulSoup(html.text, "html.parser")
+
+    # Check for error message in NCBI return
+    error = soup.find("li", class_="error icon")
+    if error is not None and "An error has occured" in error.text.strip():
+        raise RuntimeError(error.text.strip())
+
+    # Check if NCBI gene ID is available
+    try:
+        ncbi_gene_id = soup.find("input", {"id": "gene-id-value"}).get("value")
+    except AttributeError:
+        ncbi_gene_id = np.nan
+
+    # Check if NCBI description is available
+    try:
+        ncbi_description = (
+            soup.find("div", class_="section", id="summaryDiv")
+            .find("dt", string="Summary")
+            .find_next_sibling("dd")
+            .text
+        )
+    except AttributeError:
+        ncbi_description = np.nan
+
+    # Check if NCBI synonyms are available
+    try:
+        ncbi_synonyms = (
+            soup.find("div", class_="section", id="summaryDiv")
+            .find("dt", string="Also known as")
+            .find_next_sibling("dd")
+            .text
+        )
+        # Split NCBI synonyms
+        ncbi_synonyms = ncbi_synonyms.split("; ")
+    except AttributeError:
+        ncbi_synonyms = None
+
+    return {
+        "ncbi_gene_id": ncbi_gene_id,
+        "ncbi_description": ncbi_description,
+        "ncbi_synonyms": ncbi_synonyms,
+    }
+
+
+@cached("pdbe")
 def get_pdb_ids(ens_id):
     """
     Function to fetch all PDB IDs linked to an Ensembl ID.
@@ -503,7 +1129,7 @@ def get_pdb_ids(ens_id):
     https://www.ebi.ac.uk/pdbe/aggregated-api/#/SIFTS/get_ensembl_to_pdb_mappings_api_mappings_ensembl_to_pdb__gene_id__get
     """
 
-    res = requests.get(ENS_TO_PDB_API + ens_id)
+    res = get_session().get(ENS_TO_PDB_API + ens_id)
 
     if not res.ok:
         # If no PDB IDs were found, return None
@@ -533,6 +1159,7 @@ def wrap_cols_func(df, cols):
     return display(HTML(df.to_html().replace("\\n", "<br>")))
 
 
+@cached("ensembl_rest")
 def rest_query(server, query, content_type):
     """
     Function to perform a REST API query.
@@ -545,7 +1172,7 @@ def rest_query(server, query, content_type):
     Returns server output.
     """
 
-    r = requests.get(server + query, headers={"Content-Type": content_type})
+    r = get_session().get(server + query, headers={"Content-Type": content_type})
 
     if not r.ok:
         raise RuntimeError(
@@ -559,6 +1186,39 @@ def rest_query(server, query, content_type):
         return r.text
 
 
+@cached("ensembl_rest")
+def rest_query_post(server, query, data, content_type="application/json"):
+    """
+    Function to perform a REST API POST query (e.g. to look up several IDs in one request).
+
+    Args:
+    - server        Server to query.
+    - Query         Query (endpoint) that is passed to server.
+    - data          Dictionary that is sent as the JSON body of the request, e.g. {"ids": [...]}.
+    - content_type  Content type requested from the server.
+
+    Returns server output.
+    """
+
+    r = get_session().post(
+        server + query,
+        headers={"Content-Type": "application/json", "Accept": content_type},
+        json=data,
+    )
+
+    if not r.ok:
+        raise RuntimeError(
+            f"{server} returned error status code {r.status_code}. "
+            "Please double-check arguments and try again.\n"
+        )
+
+    if content_type == "application/json":
+        return r.json()
+    else:
+        return r.text
+
+
+@cached("ensembl_release", release=False, memory=True)
 def find_latest_ens_rel(database=ENSEMBL_FTP_URL):
     """
     Returns the latest Ensembl release number.
@@ -585,7 +1245,7 @@ def find_latest_ens_rel(database=ENSEMBL_FTP_URL):
     # # Find highest release number (= latest release)
     # ENS_rel = np.array(rels).astype(int).max()
 
-    html = requests.get(database + "VERSION")
+    html = get_session().get(database + "VERSION")
     if html.status_code != 200:
         raise RuntimeError(
             f"The Ensembl FTP server returned error status code {html.status_code}. Please try again."
@@ -595,6 +1255,87 @@ def find_latest_ens_rel(database=ENSEMBL_FTP_URL):
     return ENS_rel
 
 
+@cached("ensembl_ftp", release=False, memory=True)
+def get_ftp_listing(url):
+    """
+    Function to fetch the names of all files and directories listed on an Ensembl FTP page.
+    Listings are memoized (and stored in the on-disk cache if enabled), so that repeated
+    calls for the same release do not fetch and parse the page again.
+
+    Args:
+    - url   Link to an Ensembl FTP directory, e.g. "http://ftp.ensembl.org/pub/release-111/fasta/".
+
+    Returns a tuple of the listed names (without trailing '/').
+    """
+    html = get_session().get(url)
+
+    # Raise error if status code not "OK" Response
+    if html.status_code != 200:
+        raise RuntimeError(
+            f"The Ensembl server returned error status code {html.status_code}. Please try again."
+        )
+
+    # Parse the html and generate a clean list of the listed names
+    soup = BeautifulSoup(html.text, "html.parser")
+
+    return tuple(subsoup["href"].split("/")[0] for subsoup in soup.body.findAll("a"))
+
+
+@cached("ensembl_ftp", release=False, memory=True)
+def get_ftp_files(url, missing_ok=False):
+    """
+    Function to fetch the files and directories listed on an Ensembl FTP page together
+    with their last modification date and size (memoized like get_ftp_listing).
+
+    Args:
+    - url           Link to an Ensembl FTP directory, e.g. "http://ftp.ensembl.org/pub/release-111/fasta/homo_sapiens/cdna/".
+    - missing_ok    If True, return an empty tuple instead of raising an error if the page is not available.
+
+    Returns a tuple of (name, date, size) tuples,
+    e.g. ("Homo_sapiens.GRCh38.cdna.all.fa.gz", "2023-06-28 13:52", "74M").
+    """
+    html = get_session().get(url)
+
+    # Raise error if status code not "OK" Response
+    if html.status_code != 200:
+        if missing_ok:
+            return ()
+        raise RuntimeError(
+            f"HTTP response status code {html.status_code}. Please try again.\n"
+        )
+
+    soup = BeautifulSoup(html.text, "html.parser")
+
+    # Each table row contains an icon, the linked name, the date and the size
+    files = []
+    for row in soup.find_all("tr"):
+        cells = row.find_all("td")
+        for i, cell in enumerate(cells[:-2]):
+            if cell.find("a") is not None:
+                files.append(
+                    tuple(cells[j].text.strip() for j in range(i, i + 3))
+                )
+                break
+
+    return tuple(files)
+
+
+def fetch_ftp_listings(urls, func=get_ftp_listing, **kwargs):
+    """
+    Function to fetch several Ensembl FTP pages concurrently
+    (using get_ftp_listing or get_ftp_files, which memoize the results).
+
+    Returns a list of the results in the order of the URLs.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+
+    workers = min(len(urls), HTTP_POOL_SIZES.get(get_host(urls[0]), HTTP_POOL_MAXSIZE))
+    with futures.ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(lambda url: func(url, **kwargs), urls))
+
+
 def search_species_options(database=ENSEMBL_FTP_URL, release=None):
     """
     Function to find all available species core databases for gget search.
@@ -623,38 +1364,20 @@ def search_species_options(database=ENSEMBL_FTP_URL, release=None):
         kds = ["plants", "protists", "metazoa", "fungi"]
         for kingdom in kds:
             url = database + f"release-{ENS_rel}/{kingdom}/mysql/"
-            html = requests.get(url)
-
-            # Raise error if status code not "OK" Response
-            if html.status_code != 200:
-                raise RuntimeError(
-                    f"The Ensembl server returned error status code {html.status_code}. Please try again."
-                )
-
-            soup = BeautifulSoup(html.text, "html.parser")
 
             # Find all available databases
-            for subsoup in soup.body.findAll("a"):
-                if "core" in subsoup["href"]:
-                    databases.append(subsoup["href"].split("/")[0])
+            for name in get_ftp_listing(url):
+                if "core" in name:
+                    databases.append(name)
 
     else:
         url = database + f"release-{ENS_rel}/mysql/"
-        html = requests.get(url)
-
-        # Raise error if status code not "OK" Response
-        if html.status_code != 200:
-            raise RuntimeError(
-                f"The Ensembl server returned error status code {html.status_code}. Please try again."
-            )
-
-        soup = BeautifulSoup(html.text, "html.parser")
 
         # Return list of all available databases
         databases = []
-        for subsoup in soup.body.findAll("a"):
-            if "core" in subsoup["href"]:
-                databases.append(subsoup["href"].split("/")[0])
+        for name in get_ftp_listing(url):
+            if "core" in name:
+                databases.append(name)
 
     return databases
 
@@ -662,20 +1385,8 @@ def find_nv_kingdom(species, release):
     kds = ["plants", "protists", "metazoa", "fungi"]
     for kingdom in kds:
         url = ENSEMBL_FTP_URL_NV + f"release-{release}/{kingdom}/fasta/"
-        html = requests.get(url)
-
-        # Raise error if status code not "OK" Response
-        if html.status_code != 200:
-            raise RuntimeError(
-                f"The Ensembl server returned error status code {html.status_code}. Please try again."
-            )
-
-        # Parse the html and generate a clean list of the available genomes
-        soup = BeautifulSoup(html.text, "html.parser")
-
-        sps = []
-        for subsoup in soup.body.findAll("a"):
-            sps.append(subsoup["href"].split("/")[0])
+        # (Same listings as used by ref_species_options, so they are usually memoized already)
+        sps = get_ftp_listing(url)
 
         # Return kingdom if species was found
         if species in sps[5:]:
@@ -709,27 +1420,13 @@ def ref_species_options(which, database=ENSEMBL_FTP_URL, release=None):
     if "ensemblgenomes" in database:
         species_list = []
         kds = ["plants", "protists", "metazoa", "fungi"]
-        for kingdom in kds:
-            # Find all available species for this release and FTP type
-            if which == "gtf":
-                url = database + f"release-{ENS_rel}/{kingdom}/gtf/"
-            elif which in ("dna", "cdna"):
-                url = database + f"release-{ENS_rel}/{kingdom}/fasta/"
-            html = requests.get(url)
-
-            # Raise error if status code not "OK" Response
-            if html.status_code != 200:
-                raise RuntimeError(
-                    f"The Ensembl server returned error status code {html.status_code}. Please try again."
-                )
-
-            # Parse the html and generate a clean list of the available genomes
-            soup = BeautifulSoup(html.text, "html.parser")
-
-            sps = []
-            for subsoup in soup.body.findAll("a"):
-                sps.append(subsoup["href"].split("/")[0])
-
+        # Find all available species for this release and FTP type
+        # (the listings of all kingdoms are fetched concurrently)
+        if which == "gtf":
+            urls = [database + f"release-{ENS_rel}/{kingdom}/gtf/" for kingdom in kds]
+        elif which in ("dna", "cdna"):
+            urls = [database + f"release-{ENS_rel}/{kingdom}/fasta/" for kingdom in kds]
+        for sps in fetch_ftp_listings(urls):
             species_list.append(sps[5:])
 
         species_list = flatten(species_list)
@@ -740,30 +1437,17 @@ def ref_species_options(which, database=ENSEMBL_FTP_URL, release=None):
             url = database + f"release-{ENS_rel}/gtf/"
         elif which in ("dna", "cdna"):
             url = database + f"release-{ENS_rel}/fasta/"
-        html = requests.get(url)
+        sps = get_ftp_listing(url)
 
-        # Raise error if status code not "OK" Response
-        if html.status_code != 200:
-            raise RuntimeError(
-                f"The Ensembl server returned error status code {html.status_code}. Please try again."
-            )
-
-        # Parse the html and generate a clean list of the available genomes
-        soup = BeautifulSoup(html.text, "html.parser")
-
-        sps = []
-        for subsoup in soup.body.findAll("a"):
-            sps.append(subsoup["href"].split("/")[0])
-
-        species_list = sps[5:]
+        species_list = list(sps[5:])
 
     # Return list of all available species
     return sorted(species_list)
 
 
-def parse_blast_ref_page(handle):
+def parse_blast_ref_page(string):
     """
-    Extract RID and RTOE from the NCBI 'please wait' page (handle).
+    Extract RID and RTOE from the NCBI 'please wait' page (string).
     RTOE = 'Estimated time fo completion.'
     RID = 'Request ID'.
 
@@ -775,9 +1459,6 @@ def parse_blast_ref_page(handle):
     https://github.com/biopython/biopython/blob/171697883aca6894f8367f8f20f1463ce7784d0c/LICENSE.rst
     """
 
-    # Decode handle
-    string = handle.read().decode()
-
     # Find RID
     idx = string.find("RID =")
     if idx == -1:
@@ -839,6 +1520,26 @@ def parse_blast_ref_page(handle):
         )
 
 
+def format_evalue(evalue):
+    """
+    Round an E value the way the descriptions table on the BLAST website does
+    (e.g. 1.2e-53 -> 1e-53, 0.01234 -> 0.012).
+    """
+    if evalue < 1e-180:
+        return 0.0
+    if evalue < 1e-99:
+        return float(f"{evalue:2.0e}")
+    if evalue < 0.0009:
+        return float(f"{evalue:3.0e}")
+    if evalue < 0.1:
+        return float(f"{evalue:4.3f}")
+    if evalue < 1:
+        return float(f"{evalue:3.2f}")
+    if evalue < 10:
+        return float(f"{evalue:2.1f}")
+    return float(f"{evalue:5.0f}")
+
+
 def tsv_to_df(tsv_file, headers=None, skiprows=None):
     """
     Convert tsv file to dataframe format.
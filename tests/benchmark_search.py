@@ -0,0 +1,73 @@
+"""
+Benchmark of the collapse step of gget search on a synthetic join result.
+
+Run from the gget repository root with:
+    python -m tests.benchmark_search [number of rows]
+"""
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from gget.gget_search import clean_cols, collapse_results
+
+
+def synthetic_search_results(n_rows=50000, seed=0):
+    """
+    Returns a data frame shaped like the rows returned by the gget search MySQL query
+    for a broad searchword: one row per (gene, synonym, external reference) combination.
+    """
+    rng = np.random.default_rng(seed)
+    n_genes = max(1, n_rows // 10)
+
+    genes = rng.integers(0, n_genes, n_rows)
+    # Each gene has a handful of synonyms and external references
+    synonyms = rng.integers(0, 5, n_rows)
+    ext_refs = rng.integers(0, 3, n_rows)
+
+    df = pd.DataFrame(
+        {
+            "ensembl_id": [f"ENSG{g:011d}" for g in genes],
+            "gene_name": [f"GENE{g}" for g in genes],
+            "ensembl_description": [f"kinase {g} [Source:HGNC]" for g in genes],
+            "ext_ref_description": [
+                f"receptor kinase {g}.{r}" for g, r in zip(genes, ext_refs)
+            ],
+            "biotype": np.where(genes % 7 == 0, "lncRNA", "protein_coding"),
+            "synonym": [
+                None if g % 11 == 0 else f"SYN{g}-{s}" for g, s in zip(genes, synonyms)
+            ],
+        }
+    )
+    return df.drop_duplicates().reset_index(drop=True)
+
+
+def collapse_results_elementwise(df):
+    """
+    Element-wise collapse used by gget search before collapse_results was added.
+    """
+    df = df.groupby("ensembl_id").agg(tuple).map(list).reset_index()
+    df = df.map(clean_cols)
+    df["synonym"] = [
+        np.sort(syn).tolist() if isinstance(syn, list) else np.sort([syn]).tolist()
+        for syn in df["synonym"].values
+    ]
+    return df
+
+
+def main(n_rows=500000):
+    df = synthetic_search_results(n_rows)
+    print(f"Synthetic join result: {len(df)} rows, {df['ensembl_id'].nunique()} IDs")
+
+    for name, func in [
+        ("element-wise", collapse_results_elementwise),
+        ("vectorized", collapse_results),
+    ]:
+        start = time.perf_counter()
+        func(df)
+        print(f"{name}: {time.perf_counter() - start:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,7 +1,13 @@
 import unittest
+from unittest import mock
 import pandas as pd
 import json
-from gget.gget_blast import blast
+import os
+import asyncio
+import shutil
+import tempfile
+from gget.gget_blast import blast, submit, load_jobs, BlastJob, PollSchedule, parse_results
+from gget.blast_local import parse_tabular
 
 # Load dictionary containing arguments and expected results
 with open("./tests/fixtures/test_blast.json") as json_file:
@@ -56,3 +62,468 @@ class TestBlast(unittest.TestCase):
         test = "error_test6"
         with self.assertRaises(ValueError):
             blast(**blast_dict[test]["args"])
+
+
+class FakeBlastServer:
+    """
+    Fake NCBI BLAST server: every search is WAITING for the given number of
+    status requests before it is READY. Submitting 'TTTT' and status requests
+    of searches for 'GGGG' raise an error. Common names are looked up in the
+    fake NCBI Taxonomy ({9606: 'human'}).
+    """
+
+    def __init__(self, polls_until_ready):
+        self.polls_until_ready = polls_until_ready
+        self.searches = {}
+        self.requests = []
+
+    def get(self, url, params):
+        result = {"uids": params["id"].split(",")}
+        if "9606" in result["uids"]:
+            result["9606"] = {"commonname": "human"}
+        return FakeResponse(json.dumps({"result": result}))
+
+    def post(self, url, data, headers=None):
+        data = dict(data)
+        if data["CMD"] == "Put":
+            self.requests.append(("Put", data["QUERY"]))
+            if data["QUERY"] == "TTTT":
+                raise RuntimeError("Connection reset")
+            RID = f"RID{len(self.searches) + 1}"
+            self.searches[RID] = [data["QUERY"], 0]
+            return FakeResponse(f"    RID = {RID}\n    RTOE = 20\n")
+
+        query, polls = self.searches[data["RID"]]
+        if data.get("FORMAT_OBJECT") == "SearchInfo":
+            self.requests.append(("SearchInfo", data["RID"]))
+            self.searches[data["RID"]][1] += 1
+            if query == "GGGG":
+                raise RuntimeError("Connection reset")
+            if polls < self.polls_until_ready.get(query, 0):
+                return FakeResponse("QBlastInfoBegin\n\tStatus=WAITING\nQBlastInfoEnd\n")
+            hits = "no" if query == "NNNN" else "yes"
+            return FakeResponse(
+                f"QBlastInfoBegin\n\tStatus=READY\nQBlastInfoEnd\nQBlastInfoBegin\n\tThereAreHits={hits}\nQBlastInfoEnd\n"
+            )
+
+        self.requests.append((data["FORMAT_TYPE"], data["RID"]))
+        return FakeResponse(json.dumps(blast_json(query)))
+
+
+def blast_json(query):
+    # Results in the JSON2_S format with one hit consisting of two HSPs
+    return {
+        "BlastOutput2": [
+            {
+                "report": {
+                    "results": {
+                        "search": {
+                            "query_len": 100,
+                            "hits": [
+                                {
+                                    "num": 1,
+                                    "description": [
+                                        {
+                                            "id": "ref|NM_001.2|",
+                                            "accession": "NM_001",
+                                            "title": f"hit of {query}",
+                                            "taxid": 9606,
+                                            "sciname": "Homo sapiens",
+                                        }
+                                    ],
+                                    "len": 460,
+                                    "hsps": [
+                                        {
+                                            "bit_score": 100.4,
+                                            "evalue": 1.2e-20,
+                                            "identity": 58,
+                                            "align_len": 60,
+                                            "query_from": 1,
+                                            "query_to": 60,
+                                        },
+                                        {
+                                            "bit_score": 50.2,
+                                            "evalue": 3e-5,
+                                            "identity": 30,
+                                            "align_len": 30,
+                                            "query_from": 81,
+                                            "query_to": 51,
+                                        },
+                                    ],
+                                }
+                            ],
+                        }
+                    }
+                }
+            }
+        ]
+    }
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.ok = True
+        self.status_code = 200
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class TestBlastScheduler(unittest.TestCase):
+    def run_blast(self, sequence, polls_until_ready, **kwargs):
+        server = FakeBlastServer(polls_until_ready)
+        clock = [0.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with mock.patch("gget.gget_blast.get_session", return_value=server), mock.patch(
+            "gget.gget_blast.time.sleep", side_effect=sleep
+        ), mock.patch("gget.gget_blast.time.time", side_effect=lambda: clock[0]), mock.patch(
+            "gget.gget_blast.POLL_SCHEDULE", PollSchedule()
+        ):
+            result = blast(sequence, verbose=False, **kwargs)
+        return result, server, clock[0]
+
+    def test_single_query(self):
+        result, server, _ = self.run_blast("ACGT", {})
+        self.assertEqual(
+            result.values.tolist(),
+            [
+                [
+                    "hit of ACGT",
+                    "Homo sapiens",
+                    "human",
+                    9606,
+                    100,
+                    151,
+                    "81%",
+                    1e-20,
+                    "96.67%",
+                    460,
+                    "NM_001.2",
+                ]
+            ],
+        )
+        # Only the search information is requested while polling,
+        # the results are fetched once
+        self.assertEqual(
+            server.requests,
+            [("Put", "ACGT"), ("SearchInfo", "RID1"), ("JSON2_S", "RID1")],
+        )
+
+    def test_no_hits(self):
+        result, server, _ = self.run_blast("NNNN", {"NNNN": 1})
+        self.assertIsNone(result)
+        self.assertEqual(
+            server.requests,
+            [("Put", "NNNN"), ("SearchInfo", "RID1"), ("SearchInfo", "RID1")],
+        )
+
+    def test_batch(self):
+        result, server, elapsed = self.run_blast(
+            ["ACGT", "ACGTACGT", "AC"], {"ACGT": 2, "AC": 1}, max_rids=2
+        )
+        self.assertEqual(
+            result[["query", "Description", "Accession"]].values.tolist(),
+            [
+                ["query_1", "hit of ACGT", "NM_001.2"],
+                ["query_2", "hit of ACGTACGT", "NM_001.2"],
+                ["query_3", "hit of AC", "NM_001.2"],
+            ],
+        )
+        # The third search is submitted once the second one is done
+        self.assertEqual(
+            server.requests[:5],
+            [
+                ("Put", "ACGT"),
+                ("Put", "ACGTACGT"),
+                ("SearchInfo", "RID1"),
+                ("SearchInfo", "RID2"),
+                ("JSON2_S", "RID2"),
+            ],
+        )
+        self.assertEqual(server.requests[5], ("Put", "AC"))
+        # All searches are polled from one loop (instead of one search after another)
+        self.assertLess(elapsed, 3 * 61 + 20)
+
+    def test_batch_fasta_json(self):
+        result, _, _ = self.run_blast(
+            "tests/fixtures/muscle_nt_test.fa", {}, json=True
+        )
+        self.assertEqual(result[0]["query"], "ENSTGUT00000006367")
+        self.assertEqual(result[1]["query"], "ENSTGUT00000027003")
+
+    def test_batch_errors(self):
+        # Errors of one search do not abort the other searches
+        result, server, _ = self.run_blast(
+            ["ACGT", "GGGG", "TTTT", "ACGTACGT"], {"ACGT": 1}, max_rids=2
+        )
+        self.assertEqual(list(result["query"]), ["query_1", "query_4"])
+
+        # Errors of a single search are raised
+        for sequence in ["TTTT", "GGGG"]:
+            with self.assertRaises(RuntimeError):
+                self.run_blast(sequence, {})
+
+    def test_batch_duplicate_titles(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        fasta = os.path.join(tmp, "queries.fa")
+        with open(fasta, "w") as f:
+            f.write(">seq\nACGT\n>seq\nACGTACGT\n")
+
+        result, _, _ = self.run_blast(fasta, {})
+        self.assertEqual(
+            result[["query", "Description"]].values.tolist(),
+            [["seq", "hit of ACGT"], ["seq_2", "hit of ACGTACGT"]],
+        )
+
+    def test_batch_mixed_sequence_types(self):
+        with self.assertRaises(ValueError):
+            self.run_blast(["ACGTACGT", "MKWMFKEDHSLEHRCVESAKIRAK"], {})
+
+
+class TestPollSchedule(unittest.TestCase):
+    def test_backoff(self):
+        schedule = PollSchedule(min_interval=61, max_interval=200, backoff=1.5)
+        self.assertEqual(
+            [schedule.interval(polls) for polls in range(1, 6)],
+            [61, 91.5, 137.25, 200, 200],
+        )
+
+    def test_first_poll(self):
+        schedule = PollSchedule()
+        # NCBI's estimate (but not earlier than 11 seconds after submission)
+        self.assertEqual(schedule.first_poll(30), 30)
+        self.assertEqual(schedule.first_poll(0), 11)
+        # Searches took twice as long as estimated
+        schedule.record(20, 40)
+        schedule.record(30, 60)
+        schedule.record(10, 100)
+        self.assertEqual(schedule.first_poll(30), 60)
+
+    def test_history(self):
+        schedule = PollSchedule(history=2)
+        for ratio in [10, 1, 1]:
+            schedule.record(10, 10 * ratio)
+        self.assertEqual(schedule.ratios, [1, 1])
+
+
+class TestBlastJob(unittest.TestCase):
+    def setUp(self):
+        self.clock = [0.0]
+        self.server = FakeBlastServer({"ACGT": 3})
+        for patch in [
+            mock.patch("gget.gget_blast.get_session", return_value=self.server),
+            mock.patch("gget.gget_blast.time.sleep", side_effect=self.sleep),
+            mock.patch("gget.gget_blast.time.time", side_effect=lambda: self.clock[0]),
+        ]:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.server.searches["RID1"] = ["ACGT", 0]
+
+    def sleep(self, seconds):
+        self.clock[0] += seconds
+
+    def test_wait(self):
+        schedule = PollSchedule(max_interval=100)
+        job = BlastJob("RID1", 20, schedule=schedule)
+        self.assertEqual(job.wait(), "READY")
+        # Polled after 20 s, then after intervals of 61 s and 91.5 s (and 100 s ceiling)
+        self.assertEqual(self.clock[0], 20 + 61 + 91.5 + 100)
+        self.assertEqual(job.polls, 4)
+        self.assertEqual(schedule.ratios, [272.5 / 20])
+        self.assertEqual(job.result()["Accession"].tolist(), ["NM_001.2"])
+
+    def test_timeout_and_cancel(self):
+        job = BlastJob("RID1", 20, schedule=PollSchedule())
+        self.assertEqual(job.wait(timeout=100), "WAITING")
+        self.assertEqual(self.clock[0], 100)
+        self.assertEqual(job.polls, 2)
+        job.cancel()
+        self.assertEqual(job.wait(), "CANCELLED")
+        self.assertEqual(job.polls, 2)
+        self.assertIsNone(job.result())
+
+
+class TestBlastSubmit(unittest.TestCase):
+    def setUp(self):
+        self.clock = [0.0]
+        self.server = FakeBlastServer({"ACGT": 1, "ACGTAA": 2})
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        async def async_sleep(seconds):
+            self.sleep(seconds)
+
+        for patch in [
+            mock.patch("gget.gget_blast.get_session", return_value=self.server),
+            mock.patch("gget.gget_blast.time.sleep", side_effect=self.sleep),
+            mock.patch("gget.gget_blast.time.time", side_effect=lambda: self.clock[0]),
+            mock.patch("gget.gget_blast.asyncio.sleep", side_effect=async_sleep),
+            mock.patch("gget.gget_blast.POLL_SCHEDULE", PollSchedule()),
+        ]:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def sleep(self, seconds):
+        self.clock[0] += seconds
+
+    def test_submit(self):
+        job = submit("acgt", verbose=False)
+        self.assertEqual(job.RID, "RID1")
+        # The server is not contacted before the first status request is due
+        self.assertEqual(job.status(), "WAITING")
+        self.assertEqual(self.server.requests, [("Put", "ACGT")])
+
+        with self.assertRaises(TimeoutError):
+            job.result(timeout=30)
+        self.assertEqual(job.result()["Description"].tolist(), ["hit of ACGT"])
+        # Results are only fetched once
+        job.result()
+        self.assertEqual(
+            [request[0] for request in self.server.requests].count("JSON2_S"), 1
+        )
+
+    def test_resume(self):
+        jobs_file = os.path.join(self.tmp, "jobs.json")
+        submit("ACGT", query_id="query_a", jobs_file=jobs_file, verbose=False)
+        submit("ACGTAA", query_id="query_b", jobs_file=jobs_file, verbose=False)
+
+        # A new worker collects the results of the saved jobs
+        jobs = load_jobs(jobs_file, schedule=PollSchedule())
+        self.assertEqual([job.query_id for job in jobs], ["query_a", "query_b"])
+        self.assertEqual(
+            [job.result()["Description"][0] for job in jobs],
+            ["hit of ACGT", "hit of ACGTAA"],
+        )
+
+    def test_await(self):
+        async def collect():
+            jobs = [submit(seq, verbose=False) for seq in ["ACGT", "ACGTAA"]]
+            return await asyncio.gather(*jobs)
+
+        results = asyncio.run(collect())
+        self.assertEqual(
+            [df["Description"][0] for df in results], ["hit of ACGT", "hit of ACGTAA"]
+        )
+
+
+BLAST_OUTFMT7 = """# BLASTN 2.15.0+
+# Query: Query_1
+# Database: blast_local_db.fa
+# Fields: query id, subject acc.ver, subject title, subject tax ids, subject sci names, subject com names, bit score, evalue, % identity, query length, q. start, q. end, subject length
+# 3 hits found
+Query_1\tSEQ_A.1\tSEQ_A.1 Test sequence A containing query 1\t9606\tHomo sapiens\thuman\t222\t1.5e-60\t100.000\t120\t1\t120\t200
+Query_1\tSEQ_B.1\tSEQ_B.1 Test sequence B\tN/A\tN/A\tN/A\t30.1\t0.5\t95.000\t120\t10\t30\t200
+Query_1\tSEQ_B.1\tSEQ_B.1 Test sequence B\tN/A\tN/A\tN/A\t25.3\t2.1\t90.000\t120\t25\t60\t200
+# BLASTN 2.15.0+
+# Query: Query_2
+# Database: blast_local_db.fa
+# 0 hits found
+# BLAST processed 2 queries
+"""
+
+
+class TestBlastLocal(unittest.TestCase):
+    def test_parse_tabular(self):
+        results = parse_tabular(
+            BLAST_OUTFMT7, {"Query_1": "seq_1", "Query_2": "seq_2"}
+        )
+        self.assertIsNone(results["seq_2"])
+        df = results["seq_1"]
+        self.assertListEqual(
+            df.values.tolist()[0],
+            [
+                "SEQ_A.1 Test sequence A containing query 1",
+                "Homo sapiens",
+                "human",
+                9606,
+                222,
+                222,
+                "100%",
+                2e-60,
+                "100.00%",
+                200,
+                "SEQ_A.1",
+            ],
+        )
+        # HSPs of the same subject are combined, N/A values are missing
+        self.assertListEqual(
+            df.dropna(axis=1).values.tolist()[1],
+            ["SEQ_B.1 Test sequence B", 30, 55, "42%", 0.5, "95.00%", 200, "SEQ_B.1"],
+        )
+        self.assertTrue(df.loc[1, ["Scientific Name", "Common Name", "Taxid"]].isna().all())
+
+    def test_same_format_as_web(self):
+        # Same hit as in the JSON results of the BLAST server (see blast_json)
+        output = (
+            "Query_1\tNM_001.2\thit of ACGT\t9606\tHomo sapiens\thuman\t100.4\t1.2e-20\t96.667\t100\t1\t60\t460\n"
+            "Query_1\tNM_001.2\thit of ACGT\t9606\tHomo sapiens\thuman\t50.2\t3e-05\t100.000\t100\t81\t51\t460\n"
+        )
+        local = parse_tabular(output, {"Query_1": "query_1"})["query_1"]
+        with mock.patch("gget.gget_blast.get_common_names", return_value={9606: "human"}):
+            web = parse_results(blast_json("ACGT"), "RID1")
+
+        self.assertListEqual(local.columns.tolist(), web.columns.tolist())
+        self.assertListEqual(local.values.tolist(), web.values.tolist())
+        self.assertListEqual(local.dtypes.tolist(), web.dtypes.tolist())
+
+    @mock.patch("gget.blast_local.make_blast_db", side_effect=lambda db, *a, **kw: db)
+    @mock.patch("gget.blast_local.find_binary", side_effect=lambda name, *a: name)
+    @mock.patch("gget.blast_local.subprocess.run")
+    def test_single_call(self, run, find_binary, make_blast_db):
+        def fake_run(command, **kwargs):
+            # All queries are written to one FASTA file
+            with open(command[command.index("-query") + 1]) as f:
+                self.assertEqual(f.read(), ">Query_1\nACGTACGT\n>Query_2\nGGGGCCCC\n")
+            return mock.Mock(returncode=0, stdout=BLAST_OUTFMT7, stderr="")
+
+        run.side_effect = fake_run
+        result = blast(
+            ["ACGTACGT", "ggggcccc"],
+            backend="local",
+            database="db/blast_local_db.fa",
+            limit=5,
+            threads=4,
+            verbose=False,
+        )
+
+        run.assert_called_once()
+        command = run.call_args[0][0]
+        self.assertEqual(command[0], "blastn")
+        self.assertEqual(command[command.index("-db") + 1], "db/blast_local_db.fa")
+        self.assertEqual(command[command.index("-num_threads") + 1], "4")
+        self.assertEqual(command[command.index("-max_target_seqs") + 1], "5")
+        self.assertEqual(command[command.index("-task") + 1], "megablast")
+        self.assertListEqual(list(result["query"]), ["query_1", "query_1"])
+        self.assertListEqual(list(result["Accession"]), ["SEQ_A.1", "SEQ_B.1"])
+
+    def test_local_errors(self):
+        with self.assertRaises(ValueError):
+            blast("ACGTACGT", backend="local", verbose=False)
+        with self.assertRaises(ValueError):
+            blast("ACGTACGT", backend="ftp", database="nt", verbose=False)
+
+    def test_blast_local_db(self):
+        if shutil.which("blastn") is None or shutil.which("makeblastdb") is None:
+            self.skipTest("BLAST+ is not installed.")
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        database = shutil.copy("tests/fixtures/blast_local_db.fa", tmp)
+
+        result = blast(
+            blast_dict["test1"]["args"]["sequence"],
+            backend="local",
+            database=database,
+            limit=1,
+            verbose=False,
+        )
+        self.assertListEqual(list(result["Accession"]), ["SEQ_A.1"])
+        self.assertListEqual(list(result["Query Cover"]), ["100%"])
+        self.assertListEqual(list(result["Per. Ident"]), ["100.00%"])
+        # The BLAST database is built next to the FASTA file
+        self.assertTrue(os.path.exists(database + ".nin"))
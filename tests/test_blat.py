@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 import pandas as pd
 import json
 from gget.gget_blat import blat
@@ -62,9 +63,9 @@ class TestBlat(unittest.TestCase):
         test = "test6"
         expected_result = blat_dict[test]["expected_result"]
         result_to_test = blat(**blat_dict[test]["args"])
-        # If result is a DataFrame, convert to list
-        if isinstance(result_to_test, pd.DataFrame):
-            result_to_test = result_to_test.values.tolist()
+        # All sequences in the file are submitted, check the results of the first sequence
+        result_to_test = result_to_test[result_to_test["query"] == "ENSTGUT00000006367"]
+        result_to_test = result_to_test.drop(columns="query").values.tolist()
 
         self.assertListEqual(result_to_test, expected_result)
 
@@ -72,9 +73,9 @@ class TestBlat(unittest.TestCase):
         test = "test7"
         expected_result = blat_dict[test]["expected_result"]
         result_to_test = blat(**blat_dict[test]["args"])
-        # If result is a DataFrame, convert to list
-        if isinstance(result_to_test, pd.DataFrame):
-            result_to_test = result_to_test.values.tolist()
+        # All sequences in the file are submitted, check the results of the first sequence
+        result_to_test = result_to_test[result_to_test["query"] == "ENSTGUT00000006367"]
+        result_to_test = result_to_test.drop(columns="query").values.tolist()
 
         self.assertListEqual(result_to_test, expected_result)
 
@@ -127,3 +128,107 @@ class TestBlat(unittest.TestCase):
         test = "error_test4"
         with self.assertRaises(FileNotFoundError):
             blat(**blat_dict[test]["args"])
+
+
+BLAT_FIELDS = [
+    "matches", "misMatches", "repMatches", "nCount", "qNumInsert", "qBaseInsert",
+    "tNumInsert", "tBaseInsert", "strand", "qName", "qSize", "qStart", "qEnd",
+    "tName", "tSize", "tStart", "tEnd", "blockCount", "blockSizes", "qStarts", "tStarts",
+]
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.status_code = 200
+        self.text = text
+
+
+class FakeBlatServer:
+    """
+    Answers hgBlat requests with one hit per sequence
+    (no hits for sequences starting with 'CCCC', server error for sequences starting with 'TTTT').
+    """
+
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        params = dict(param.split("=", 1) for param in url.split("?", 1)[1].split("&"))
+        sequence = params["userSeq"]
+        if sequence.startswith("TTTT"):
+            response = FakeResponse("Internal Server Error")
+            response.status_code = 500
+            return response
+        hits = []
+        if not sequence.startswith("CCCC"):
+            hits.append(
+                [28, 0, 0, 0, 0, 0, 0, 0, "+", "YourSeq", len(sequence), 16, 44,
+                 "chr18", 80373285, 1952613, 1952647, 1, "28,", "16,", "1952613,"]
+            )
+        return FakeResponse(
+            json.dumps({"genome": params["db"], "fields": BLAT_FIELDS, "blat": hits})
+        )
+
+
+class TestBlatBatch(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeBlatServer()
+        patcher = mock.patch("gget.gget_blat.get_session", return_value=self.server)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_single_sequence(self):
+        result = blat("ATGCTGAATTTATGCTGAATTTATGCTGAATTTATGCTGAATTT", verbose=False)
+        self.assertListEqual(
+            result.values.tolist(), blat_dict["test1"]["expected_result"]
+        )
+
+    def test_batch(self):
+        sequences = [
+            "ATGCTGAATTTATGCTGAATTTATGCTGAATTTATGCTGAATTT",
+            "CCCCGGGGCCCCGGGGCCCCGGGG",
+            "mlmpgplrralgqkfsifpsvdhdsdd",
+        ]
+        result = blat(sequences, assembly="mouse", verbose=False)
+
+        # The seqtype is detected for each sequence
+        self.assertEqual(len(self.server.urls), 3)
+        types = sorted(url.split("type=")[1].split("&")[0] for url in self.server.urls)
+        self.assertListEqual(types, ["DNA", "DNA", "protein"])
+
+        self.assertListEqual(list(result.columns[:2]), ["query", "genome"])
+        self.assertListEqual(list(result["query"]), ["query_1", "query_3"])
+        self.assertListEqual(list(result["genome"]), ["mm39", "mm39"])
+        self.assertListEqual(list(result["start"]), [1952614, 1952614])
+
+    def test_batch_json(self):
+        result = blat(
+            ["CCCCGGGGCCCCGGGGCCCCGGGG", "CCCCGGGGCCCCGGGGCCCCGGGA"],
+            json=True,
+            verbose=False,
+        )
+        self.assertIsNone(result)
+
+        result = blat("tests/fixtures/muscle_nt_test.fa", json=True, verbose=False)
+        self.assertListEqual(
+            [hit["query"] for hit in result], ["ENSTGUT00000006367", "ENSTGUT00000027003"]
+        )
+
+    def test_batch_errors(self):
+        # A failed request only drops the results of its own sequence
+        result = blat(
+            ["ATGCTGAATTTATGCTGAATTTATGCTGAATTTATGCTGAATTT", "TTTTGGGGCCCCGGGGCCCCGGGG"],
+            verbose=False,
+        )
+        self.assertListEqual(list(result["query"]), ["query_1"])
+
+        # A single sequence still raises the error
+        with self.assertRaises(RuntimeError):
+            blat("TTTTGGGGCCCCGGGGCCCCGGGG", verbose=False)
+
+    def test_batch_bad_sequence(self):
+        # Invalid sequences are detected before any request is sent
+        with self.assertRaises(ValueError):
+            blat(["ATGCTGAATTTATGCTGAATTT", "BANANA123"], verbose=False)
+        self.assertEqual(self.server.urls, [])
@@ -0,0 +1,82 @@
+import unittest
+import tempfile
+import shutil
+from gget.cache import ResponseCache, cached, clear_memory
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_cache_get_set(self):
+        cache = ResponseCache(path=self.path)
+        key = {"query": "lookup/id/ENSG00000034713", "ens_release": 111}
+
+        self.assertEqual(cache.get("ensembl_rest", key), (False, None))
+        cache.set("ensembl_rest", key, {"id": "ENSG00000034713"})
+        self.assertEqual(
+            cache.get("ensembl_rest", key), (True, {"id": "ENSG00000034713"})
+        )
+
+        # A new Ensembl release is a different key
+        self.assertEqual(
+            cache.get("ensembl_rest", {**key, "ens_release": 112}), (False, None)
+        )
+
+        # Entries persist across sessions
+        cache.close()
+        cache = ResponseCache(path=self.path)
+        self.assertTrue(cache.get("ensembl_rest", key)[0])
+        cache.close()
+
+    def test_cache_ttl(self):
+        cache = ResponseCache(path=self.path, ttls={"uniprot": -1})
+        cache.set("uniprot", "P04637", "TP53")
+
+        self.assertEqual(cache.get("uniprot", "P04637"), (False, None))
+        cache.close()
+
+    def test_cache_lru(self):
+        cache = ResponseCache(path=self.path, max_size=150)
+        cache.set("pdbe", "a", "x" * 40)
+        cache.set("pdbe", "b", "x" * 40)
+        # Access "a" so that "b" becomes the least recently used entry
+        cache.get("pdbe", "a")
+        cache.set("pdbe", "c", "x" * 40)
+
+        self.assertTrue(cache.get("pdbe", "a")[0])
+        self.assertFalse(cache.get("pdbe", "b")[0])
+        self.assertTrue(cache.get("pdbe", "c")[0])
+
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["endpoints"]["pdbe"]["hits"], 3)
+        self.assertEqual(stats["endpoints"]["pdbe"]["misses"], 1)
+
+        self.assertEqual(cache.clear(), 2)
+        self.assertEqual(cache.stats()["entries"], 0)
+        cache.close()
+
+    def test_cached_memory(self):
+        calls = []
+
+        @cached("ensembl_ftp", release=False, memory=True)
+        def listing(url):
+            calls.append(url)
+            return ("homo_sapiens",)
+
+        # Repeated calls are memoized in-process
+        self.assertEqual(listing("release-111/fasta/"), ("homo_sapiens",))
+        self.assertEqual(listing(url="release-111/fasta/"), ("homo_sapiens",))
+        self.assertEqual(len(calls), 1)
+
+        # Listings of a different release are fetched
+        listing("release-110/fasta/")
+        self.assertEqual(len(calls), 2)
+
+        clear_memory()
+        listing("release-111/fasta/")
+        self.assertEqual(len(calls), 3)
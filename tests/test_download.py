@@ -0,0 +1,192 @@
+import os
+import re
+import shutil
+import unittest
+import tempfile
+import threading
+from unittest import mock
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from gget.cache import clear_memory
+from gget.download import (
+    parse_checksums,
+    bsd_sum,
+    download_file,
+    download_files,
+    _fetch_range,
+)
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Minimal static file handler supporting single HTTP range requests.
+    Range requests are ignored if 'ignore_ranges' is True, and at most
+    'max_range' bytes are sent per range request.
+    """
+
+    ignore_ranges = False
+    max_range = None
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and not self.ignore_ranges:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            if self.max_range:
+                end = min(end, start + self.max_range - 1)
+            if start >= len(data):
+                self.send_error(416)
+                return None
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            data = data[start : end + 1]
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self.body = data
+        return True
+
+    def do_GET(self):
+        if self.send_head():
+            self.wfile.write(self.body)
+
+    def do_HEAD(self):
+        self.send_head()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownload(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server_dir = tempfile.mkdtemp()
+        cls.data = os.urandom(100000)
+        with open(os.path.join(cls.server_dir, "genome.fa.gz"), "wb") as f:
+            f.write(cls.data)
+        with open(os.path.join(cls.server_dir, "cdna.fa.gz"), "wb") as f:
+            f.write(cls.data[:5000])
+
+        checksum, blocks = bsd_sum(os.path.join(cls.server_dir, "genome.fa.gz"))
+        with open(os.path.join(cls.server_dir, "CHECKSUMS"), "w") as f:
+            f.write(f"{checksum} {blocks} genome.fa.gz\n")
+            f.write("1 1 cdna.fa.gz\n")
+
+        handler = lambda *args: RangeRequestHandler(
+            *args, directory=cls.server_dir
+        )
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.server_dir)
+
+    def setUp(self):
+        clear_memory()
+        self.out_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.out_dir)
+
+    def test_parse_checksums(self):
+        text = "12345 67 Homo_sapiens.GRCh38.cdna.all.fa.gz\n54321 1 README\n"
+        self.assertEqual(
+            parse_checksums(text),
+            {"Homo_sapiens.GRCh38.cdna.all.fa.gz": (12345, 67), "README": (54321, 1)},
+        )
+
+    def test_bsd_sum(self):
+        path = os.path.join(self.out_dir, "test.txt")
+        with open(path, "w") as f:
+            f.write("gget\n")
+        with mock.patch("gget.download.shutil.which", return_value=None):
+            self.assertEqual(bsd_sum(path), (36976, 1))
+
+    @unittest.skipUnless(shutil.which("sum"), "sum command not available")
+    def test_bsd_sum_fallback(self):
+        # The Python implementation matches the sum command
+        path = os.path.join(self.out_dir, "random.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(300000))
+        expected = bsd_sum(path)
+        with mock.patch("gget.download.shutil.which", return_value=None):
+            self.assertEqual(bsd_sum(path), expected)
+
+    def test_download_ranges(self):
+        with mock.patch("gget.download.DOWNLOAD_MIN_RANGE_SIZE", 1000):
+            path = download_file(
+                self.url + "genome.fa.gz", out_dir=self.out_dir, parts=4, verbose=False
+            )
+
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(self.out_dir), ["genome.fa.gz"])
+
+    def test_download_resume(self):
+        # Partial download of the second of two ranges
+        path = os.path.join(self.out_dir, "genome.fa.gz")
+        with open(path + ".part1", "wb") as f:
+            f.write(self.data[50000:60000])
+
+        with mock.patch("gget.download.DOWNLOAD_MIN_RANGE_SIZE", 1000):
+            download_file(
+                self.url + "genome.fa.gz", out_dir=self.out_dir, parts=2, verbose=False
+            )
+
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_range_ignored(self):
+        # The server sends the whole file instead of the first range
+        part_path = os.path.join(self.out_dir, "genome.fa.gz.part0")
+        pbar = mock.Mock()
+        with mock.patch.object(RangeRequestHandler, "ignore_ranges", True):
+            _fetch_range(self.url + "genome.fa.gz", part_path, 0, 9999, pbar)
+            with open(part_path, "rb") as f:
+                self.assertEqual(f.read(), self.data[:10000])
+
+            with self.assertRaisesRegex(RuntimeError, "range requests"):
+                _fetch_range(self.url + "genome.fa.gz", part_path + "1", 10000, 19999, pbar)
+
+    def test_range_incomplete(self):
+        part_path = os.path.join(self.out_dir, "genome.fa.gz.part1")
+        with mock.patch.object(RangeRequestHandler, "max_range", 1000), mock.patch(
+            "gget.download.HTTP_RETRIES", 1
+        ), mock.patch("gget.download.time.sleep"):
+            with self.assertRaisesRegex(RuntimeError, "received 2000 of 10000 bytes"):
+                _fetch_range(self.url + "genome.fa.gz", part_path, 10000, 19999, mock.Mock())
+
+    def test_download_checksum_mismatch(self):
+        with self.assertRaises(RuntimeError):
+            download_file(self.url + "cdna.fa.gz", out_dir=self.out_dir, verbose=False)
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir, "cdna.fa.gz")))
+
+    def test_download_files(self):
+        paths = download_files(
+            [self.url + "genome.fa.gz", "", self.url + "cdna.fa.gz"],
+            out_dir=self.out_dir,
+            checksums=False,
+            verbose=False,
+        )
+        self.assertEqual(
+            paths,
+            [
+                os.path.join(self.out_dir, "genome.fa.gz"),
+                os.path.join(self.out_dir, "cdna.fa.gz"),
+            ],
+        )
+        with open(paths[1], "rb") as f:
+            self.assertEqual(f.read(), self.data[:5000])
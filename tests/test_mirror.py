@@ -0,0 +1,146 @@
+import os
+import shutil
+import unittest
+import tempfile
+from unittest import mock
+import pandas as pd
+
+from gget.gget_mirror import mirror, parse_size, load_state
+from gget.gget_ref import ref_manifest
+
+
+def manifest(release, gtf_date, dna_date):
+    base = f"http://ftp.ensembl.org/pub/release-{release}/"
+    return pd.DataFrame(
+        [
+            ["homo_sapiens", "gtf", base + f"gtf/homo_sapiens/Homo_sapiens.GRCh38.{release}.gtf.gz", release, gtf_date, "10:00", "50M"],
+            ["homo_sapiens", "dna", base + "fasta/homo_sapiens/dna/Homo_sapiens.GRCh38.dna.primary_assembly.fa.gz", release, dna_date, "10:00", "800M"],
+            ["homo_sapiens", "ncrna", "", release, "", "", ""],
+        ],
+        columns=["species", "file_type", "ftp", "ensembl_release", "release_date", "release_time", "bytes"],
+    )
+
+
+def fake_download(urls, out_dir, checksums=True, verbose=True):
+    paths = []
+    for url, directory in zip(urls, out_dir):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, url.split("/")[-1])
+        with open(path, "w") as f:
+            f.write(url + "\n" * 1000)
+        paths.append(path)
+    return paths
+
+
+class TestMirror(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.out_dir)
+
+        patcher = mock.patch("gget.gget_mirror.download_files", side_effect=fake_download)
+        self.download = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # CHECKSUMS files per FTP directory (none by default)
+        self.checksums = {}
+        patcher = mock.patch(
+            "gget.gget_mirror.get_checksums",
+            side_effect=lambda directory: self.checksums.get(directory, {}),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_mirror(self, release, gtf_date, dna_date, **kwargs):
+        with mock.patch(
+            "gget.gget_mirror.ref_manifest",
+            return_value=manifest(release, gtf_date, dna_date),
+        ):
+            return mirror("homo_sapiens", out_dir=self.out_dir, verbose=False, **kwargs)
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("1.5K"), 1536)
+        self.assertEqual(parse_size("500G"), 500 * 1024**3)
+        self.assertEqual(parse_size(100), 100)
+        with self.assertRaises(ValueError):
+            parse_size("lots")
+
+    def test_mirror_incremental(self):
+        df = self.run_mirror(110, "2023-04-01", "2023-03-01")
+        self.assertEqual(df["status"].tolist(), ["downloaded", "downloaded", "unavailable"])
+
+        # Nothing changed
+        df = self.run_mirror(110, "2023-04-01", "2023-03-01")
+        self.assertEqual(df["status"].tolist(), ["unchanged", "unchanged", "unavailable"])
+
+        # New release: the genome did not change, the GTF is new
+        df = self.run_mirror(111, "2023-10-01", "2023-03-01")
+        self.assertEqual(df["status"].tolist(), ["downloaded", "linked", "unavailable"])
+        self.assertEqual(self.download.call_count, 2)
+
+        dna = "release-111/homo_sapiens/Homo_sapiens.GRCh38.dna.primary_assembly.fa.gz"
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, dna)))
+        self.assertEqual(len(load_state(self.out_dir)["files"]), 4)
+
+    def test_mirror_dry_run(self):
+        df = self.run_mirror(110, "2023-04-01", "2023-03-01", dry_run=True)
+        self.assertEqual(df["status"].tolist(), ["planned", "planned", "unavailable"])
+        self.assertEqual(self.download.call_count, 0)
+
+    def test_mirror_garbage_collection(self):
+        self.run_mirror(110, "2023-04-01", "2023-03-01")
+        self.run_mirror(111, "2023-10-01", "2023-10-01", max_size=10)
+
+        # Files of release 110 were deleted, the current release is kept
+        files = load_state(self.out_dir)["files"]
+        self.assertEqual(sorted(info["ensembl_release"] for info in files.values()), [111, 111])
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir, "release-110")))
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, "release-111")))
+
+    def test_mirror_checksums(self):
+        # Ensembl updates the timestamps of all files in each release,
+        # files with the same checksum are linked (also if the filename contains the release)
+        for release in [110, 111]:
+            base = f"http://ftp.ensembl.org/pub/release-{release}/"
+            self.checksums[base + "gtf/homo_sapiens"] = {
+                f"Homo_sapiens.GRCh38.{release}.gtf.gz": (1234, 50000)
+            }
+            self.checksums[base + "fasta/homo_sapiens/dna"] = {
+                "Homo_sapiens.GRCh38.dna.primary_assembly.fa.gz": (4321 + release, 800000)
+            }
+
+        df = self.run_mirror(110, "2023-04-01", "2023-03-01")
+        self.assertEqual(df["status"].tolist(), ["downloaded", "downloaded", "unavailable"])
+
+        df = self.run_mirror(111, "2023-10-01", "2023-10-01")
+        self.assertEqual(df["status"].tolist(), ["linked", "downloaded", "unavailable"])
+        self.assertEqual(self.download.call_count, 2)
+
+        files = load_state(self.out_dir)["files"]
+        gtf = "release-111/homo_sapiens/Homo_sapiens.GRCh38.111.gtf.gz"
+        self.assertEqual(files[gtf]["checksum"], "1234 50000")
+        self.assertEqual(
+            os.stat(os.path.join(self.out_dir, gtf)).st_ino,
+            os.stat(
+                os.path.join(self.out_dir, "release-110/homo_sapiens/Homo_sapiens.GRCh38.110.gtf.gz")
+            ).st_ino,
+        )
+
+    def test_mirror_no_checksums(self):
+        self.run_mirror(110, "2023-04-01", "2023-03-01", checksums=False)
+        self.assertIs(self.download.call_args.kwargs["checksums"], False)
+
+        self.run_mirror(111, "2023-10-01", "2023-10-01")
+        self.assertIs(self.download.call_args.kwargs["checksums"], True)
+
+    def test_ref_manifest_no_species(self):
+        # E.g. a kingdom without any species in the requested release
+        with mock.patch("gget.gget_ref.kingdom_species", return_value=[]), mock.patch(
+            "gget.gget_ref.find_latest_ens_rel", return_value=111
+        ):
+            df = ref_manifest("all", kingdom="fungi", verbose=False)
+        self.assertEqual(len(df), 0)
+        self.assertEqual(len(ref_manifest([], verbose=False)), 0)
+
+        # An empty manifest is mirrored without errors
+        with mock.patch("gget.gget_mirror.ref_manifest", return_value=df):
+            self.assertEqual(len(mirror([], out_dir=self.out_dir, verbose=False)), 0)
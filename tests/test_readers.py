@@ -0,0 +1,104 @@
+import os
+import gzip
+import shutil
+import unittest
+import tempfile
+
+from gget.readers import (
+    read_fasta,
+    read_gtf,
+    write_fasta,
+    parse_fasta_header,
+    parse_gtf_attributes,
+)
+
+CDNA = """>ENST00000641515.2 cdna chromosome:GRCh38:1:65419:71585:1 gene:ENSG00000186092.7 gene_biotype:protein_coding transcript_biotype:protein_coding gene_symbol:OR4F5 description:olfactory receptor family 4 subfamily F member 5 [Source:HGNC Symbol;Acc:HGNC:14825]
+ATGAAGAAGGTAACTGCAGAGGCTATTTCCTGGAATGAATCAACGAGTGAAACGAATAAC
+TCTATGGTGACTGAATTCATTTTTCTGGGTCTCTCTGATTCTCAGGAACTCCAGACCTTC
+>ENST00000456328.2 cdna chromosome:GRCh38:1:11869:14409:1 gene:ENSG00000290825.1 gene_biotype:lncRNA transcript_biotype:lncRNA gene_symbol:DDX11L2 description:DEAD/H-box helicase 11 like 2 (pseudogene) [Source:NCBI gene (formerly HGNC);Acc:HGNC:37102]
+GTTAACTTGCCGTCAGCCTTTTCTTTGACCTCTTCTTTCTGTTCATGTGTATTTGCTGTC
+>ENST00000361390.2 cdna chromosome:GRCh38:MT:3307:4262:1 gene:ENSG00000198888.2 gene_biotype:protein_coding transcript_biotype:protein_coding gene_symbol:MT-ND1 description:mitochondrially encoded NADH:ubiquinone oxidoreductase core subunit 1 [Source:HGNC Symbol;Acc:HGNC:7455]
+ATACCCATGGCCAACCTCCTACTCCTCATTGTACCCATTCTAATCGCAATGGCATTCCTA
+"""
+
+GTF = """#!genome-build GRCh38.p14
+1\thavana\tgene\t65419\t71585\t.\t+\t.\tgene_id "ENSG00000186092"; gene_version "7"; gene_name "OR4F5"; gene_source "ensembl_havana"; gene_biotype "protein_coding";
+1\thavana\ttranscript\t65419\t71585\t.\t+\t.\tgene_id "ENSG00000186092"; transcript_id "ENST00000641515"; gene_biotype "protein_coding"; transcript_biotype "protein_coding"; tag "basic"; tag "Ensembl_canonical";
+1\thavana\tgene\t11869\t14409\t.\t+\t.\tgene_id "ENSG00000290825"; gene_name "DDX11L2"; gene_biotype "lncRNA";
+MT\tinsdc\tgene\t3307\t4262\t.\t+\t.\tgene_id "ENSG00000198888"; gene_name "MT-ND1"; gene_biotype "protein_coding";
+"""
+
+
+class TestReaders(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.cdna = os.path.join(self.tmp, "cdna.fa.gz")
+        with gzip.open(self.cdna, "wt") as f:
+            f.write(CDNA)
+        self.gtf = os.path.join(self.tmp, "annotation.gtf")
+        with open(self.gtf, "w") as f:
+            f.write(GTF)
+
+    def test_parse_fasta_header(self):
+        attributes = parse_fasta_header(
+            "cdna chromosome:GRCh38:MT:3307:4262:1 gene:ENSG00000198888.2 gene_biotype:protein_coding description:NADH:ubiquinone [Source:HGNC Symbol;Acc:HGNC:7455]"
+        )
+        self.assertEqual(attributes["seqtype"], "cdna")
+        self.assertEqual(attributes["chromosome"], "MT")
+        self.assertEqual(attributes["start"], "3307")
+        self.assertEqual(attributes["gene"], "ENSG00000198888.2")
+        self.assertEqual(
+            attributes["description"], "NADH:ubiquinone [Source:HGNC Symbol;Acc:HGNC:7455]"
+        )
+
+    def test_read_fasta(self):
+        records = list(read_fasta(self.cdna))
+        self.assertEqual(
+            [record.id for record in records],
+            ["ENST00000641515.2", "ENST00000456328.2", "ENST00000361390.2"],
+        )
+        self.assertEqual(len(records[0].sequence), 120)
+        self.assertEqual(records[0].attributes["gene_symbol"], "OR4F5")
+
+    def test_read_fasta_filters(self):
+        records = read_fasta(self.cdna, chromosomes=["1"], biotypes=["protein_coding"])
+        self.assertEqual([record.id for record in records], ["ENST00000641515.2"])
+
+        records = read_fasta(self.cdna, ids=["ENST00000361390", "ENST00000456328.2"])
+        self.assertEqual(
+            [record.id for record in records], ["ENST00000456328.2", "ENST00000361390.2"]
+        )
+
+    def test_write_fasta(self):
+        out = os.path.join(self.tmp, "subset.fa")
+        n_records = write_fasta(read_fasta(self.cdna, chromosomes=["MT"]), out)
+        self.assertEqual(n_records, 1)
+        self.assertEqual(list(read_fasta(out)), list(read_fasta(self.cdna, chromosomes=["MT"])))
+
+    def test_parse_gtf_attributes(self):
+        attributes = parse_gtf_attributes(
+            'gene_id "ENSG00000186092"; exon_number 1; tag "basic"; tag "Ensembl_canonical";'
+        )
+        self.assertEqual(
+            attributes,
+            {
+                "gene_id": "ENSG00000186092",
+                "exon_number": "1",
+                "tag": ["basic", "Ensembl_canonical"],
+            },
+        )
+
+    def test_read_gtf(self):
+        records = list(read_gtf(self.gtf))
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[1].feature, "transcript")
+        self.assertEqual(records[1].start, 65419)
+        self.assertEqual(records[1].attributes["transcript_id"], "ENST00000641515")
+
+        records = read_gtf(
+            self.gtf, chromosomes=["1"], biotypes=["protein_coding"], features=["gene"]
+        )
+        self.assertEqual(
+            [record.attributes["gene_name"] for record in records], ["OR4F5"]
+        )
@@ -1,6 +1,9 @@
 import unittest
 import json
-from gget.gget_ref import ref
+from unittest import mock
+from gget.gget_ref import ref, species_manifest, RefFile
+from gget.utils import get_ftp_files
+from gget.cache import clear_memory
 
 # Load dictionary containing arguments and expected results
 with open("./tests/fixtures/test_ref.json") as json_file:
@@ -93,3 +96,151 @@ class TestRef(unittest.TestCase):
         test = "error_test3"
         with self.assertRaises(RuntimeError):
             ref(**ref_dict[test]["args"])
+
+
+def ftp_page(files):
+    # Apache directory listing as served by the Ensembl FTP site
+    rows = "".join(
+        f'<tr><td valign="top"><img src="/icons/compressed.gif" alt="[   ]"></td>'
+        f'<td><a href="{name}">{name}</a></td><td align="right">{date}  </td>'
+        f'<td align="right">{size}</td><td>&nbsp;</td></tr>'
+        for name, date, size in files
+    )
+    return (
+        "<html><body><table>"
+        '<tr><th valign="top"><img src="/icons/blank.gif" alt="[ICO]"></th>'
+        '<th><a href="?C=N;O=D">Name</a></th><th><a href="?C=M;O=A">Last modified</a></th>'
+        '<th><a href="?C=S;O=A">Size</a></th><th><a href="?C=D;O=A">Description</a></th></tr>'
+        '<tr><td valign="top"><img src="/icons/back.gif" alt="[PARENTDIR]"></td>'
+        '<td><a href="/pub/release-110/fasta/">Parent Directory</a></td><td>&nbsp;</td>'
+        '<td align="right">  - </td><td>&nbsp;</td></tr>'
+        f"{rows}</table></body></html>"
+    )
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+
+
+class TestSpeciesManifest(unittest.TestCase):
+    def setUp(self):
+        clear_memory()
+        self.addCleanup(clear_memory)
+
+        base = "http://ftp.ensembl.org/pub/release-110/"
+        self.pages = {
+            base
+            + "fasta/taeniopygia_guttata/dna/": [
+                ("Taeniopygia_guttata.bTaeGut1_v1.p.dna.toplevel.fa.gz", "2023-04-21 17:16", "304M"),
+                ("Taeniopygia_guttata.bTaeGut1_v1.p.dna_sm.toplevel.fa.gz", "2023-04-21 17:20", "310M"),
+                ("CHECKSUMS", "2023-04-21 18:00", "2.0K"),
+            ],
+            base
+            + "gtf/taeniopygia_guttata/": [
+                ("Taeniopygia_guttata.bTaeGut1_v1.p.110.abinitio.gtf.gz", "2023-04-21 23:00", "5.0M"),
+                ("Taeniopygia_guttata.bTaeGut1_v1.p.110.chr.gtf.gz", "2023-04-21 23:10", "13M"),
+                ("Taeniopygia_guttata.bTaeGut1_v1.p.110.gtf.gz", "2023-04-21 23:13", "13M"),
+            ],
+        }
+        self.requested = []
+
+        def get(url):
+            self.requested.append(url)
+            if url in self.pages:
+                return FakeResponse(200, ftp_page(self.pages[url]))
+            return FakeResponse(404)
+
+        session = mock.Mock()
+        session.get.side_effect = get
+        patcher = mock.patch("gget.utils.get_session", return_value=session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_ftp_files(self):
+        url = "http://ftp.ensembl.org/pub/release-110/gtf/taeniopygia_guttata/"
+        self.assertEqual(
+            get_ftp_files(url),
+            (("Parent Directory", "", "-"),) + tuple(self.pages[url]),
+        )
+        with self.assertRaises(RuntimeError):
+            get_ftp_files(url + "missing/")
+        self.assertEqual(get_ftp_files(url + "missing/", missing_ok=True), ())
+
+    def test_species_manifest(self):
+        manifest = species_manifest(
+            "taeniopygia_guttata", 110, which=["dna", "gtf", "ncrna"]
+        )
+        self.assertEqual(
+            manifest["dna"],
+            RefFile(
+                "http://ftp.ensembl.org/pub/release-110/fasta/taeniopygia_guttata/dna/Taeniopygia_guttata.bTaeGut1_v1.p.dna.toplevel.fa.gz",
+                110,
+                "2023-04-21 17:16",
+                "304M",
+            ),
+        )
+        self.assertEqual(
+            manifest["gtf"].to_dict(),
+            {
+                "ftp": "http://ftp.ensembl.org/pub/release-110/gtf/taeniopygia_guttata/Taeniopygia_guttata.bTaeGut1_v1.p.110.gtf.gz",
+                "ensembl_release": 110,
+                "release_date": "2023-04-21",
+                "release_time": "23:13",
+                "bytes": "13M",
+            },
+        )
+        # ncRNA directory not available
+        self.assertEqual(manifest["ncrna"], RefFile("", 110, "", ""))
+        # Each directory is fetched once
+        self.assertEqual(len(self.requested), 3)
+
+        # No file types
+        self.assertEqual(species_manifest("taeniopygia_guttata", 110, which=[]), {})
+
+    def test_ref_several_species(self):
+        self.pages[
+            "http://ftp.ensembl.org/pub/release-110/gtf/gallus_gallus/"
+        ] = [("Gallus_gallus.bGalGal1.mat.broiler.GRCg7b.110.gtf.gz", "2023-04-20 10:00", "28M")]
+        # No genome FASTA available
+        self.pages[
+            "http://ftp.ensembl.org/pub/release-110/fasta/gallus_gallus/dna/"
+        ] = [("CHECKSUMS", "2023-04-20 10:00", "1.0K")]
+
+        with mock.patch(
+            "gget.gget_ref.ref_species_options",
+            return_value=["gallus_gallus", "taeniopygia_guttata"],
+        ), mock.patch("gget.gget_ref.find_latest_ens_rel", return_value=110):
+            result = ref(
+                ["taeniopygia_guttata", "Gallus_gallus"],
+                which=["gtf", "dna"],
+                json=True,
+                verbose=False,
+            )
+
+        self.assertEqual(
+            [(row["species"], row["file_type"], row["bytes"]) for row in result],
+            [
+                ("taeniopygia_guttata", "gtf", "13M"),
+                ("taeniopygia_guttata", "dna", "304M"),
+                ("gallus_gallus", "gtf", "28M"),
+                ("gallus_gallus", "dna", ""),
+            ],
+        )
+        self.assertEqual(
+            list(result[0]),
+            [
+                "species",
+                "file_type",
+                "ftp",
+                "ensembl_release",
+                "release_date",
+                "release_time",
+                "bytes",
+            ],
+        )
+
+    def test_ref_bad_kingdom(self):
+        with self.assertRaises(ValueError):
+            ref("all", kingdom="bacteria", verbose=False)
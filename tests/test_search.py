@@ -1,7 +1,16 @@
+import re
 import unittest
 import pandas as pd
 import json
-from gget.gget_search import search
+import os
+import gzip
+import tempfile
+import shutil
+import sqlite3
+from unittest import mock
+from gget.gget_search import search, collapse_results, MySQLConnectionPool
+from gget.search_index import build_search_index, query_search_index, match_condition
+from .benchmark_search import synthetic_search_results, collapse_results_elementwise
 
 # Load dictionary containing arguments and expected results
 with open("./tests/fixtures/test_search.json") as json_file:
@@ -171,3 +180,252 @@ class TestSearch(unittest.TestCase):
         test = "error_test4"
         with self.assertRaises(ValueError):
             search(**search_dict[test]["args"])
+
+    def test_search_bad_backend(self):
+        test = "error_test5"
+        with self.assertRaises(ValueError):
+            search(**search_dict[test]["args"])
+
+
+def index_results(*args, **kwargs):
+    # Convert search index results to list (missing values as None)
+    df = query_search_index(*args, **kwargs).astype(object)
+    return df.where(df.notnull(), None).values.tolist()
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        # Write a minimal MySQL dump of a core database
+        self.dump = tempfile.mkdtemp()
+        self.db = "homo_sapiens_core_111_38"
+        files = {
+            f"{self.db}.sql.gz": (
+                "CREATE TABLE `gene` (\n"
+                "  `gene_id` int(10) unsigned NOT NULL AUTO_INCREMENT,\n"
+                "  `biotype` varchar(40) NOT NULL,\n"
+                "  `display_xref_id` int(10) unsigned DEFAULT NULL,\n"
+                "  `description` text,\n"
+                "  `stable_id` varchar(128) DEFAULT NULL,\n"
+                "  PRIMARY KEY (`gene_id`)\n"
+                ") ENGINE=MyISAM;\n"
+                "CREATE TABLE `transcript` (\n"
+                "  `transcript_id` int(10) unsigned NOT NULL AUTO_INCREMENT,\n"
+                "  `display_xref_id` int(10) unsigned DEFAULT NULL,\n"
+                "  `biotype` varchar(40) NOT NULL,\n"
+                "  `description` text,\n"
+                "  `stable_id` varchar(128) DEFAULT NULL\n"
+                ") ENGINE=MyISAM;\n"
+                "CREATE TABLE `xref` (\n"
+                "  `xref_id` int(10) unsigned NOT NULL AUTO_INCREMENT,\n"
+                "  `display_label` varchar(512) NOT NULL,\n"
+                "  `description` text\n"
+                ") ENGINE=MyISAM;\n"
+                "CREATE TABLE `external_synonym` (\n"
+                "  `xref_id` int(10) unsigned NOT NULL,\n"
+                "  `synonym` varchar(100) NOT NULL\n"
+                ") ENGINE=MyISAM;\n"
+                "CREATE TABLE `gene_attrib` (\n"
+                "  `gene_id` int(10) unsigned NOT NULL DEFAULT '0',\n"
+                "  `value` text NOT NULL\n"
+                ") ENGINE=MyISAM;\n"
+                "CREATE TABLE `transcript_attrib` (\n"
+                "  `transcript_id` int(10) unsigned NOT NULL DEFAULT '0',\n"
+                "  `value` text NOT NULL\n"
+                ") ENGINE=MyISAM;\n"
+            ),
+            "gene.txt.gz": (
+                "1\tprotein_coding\t10\tgamma-aminobutyric acid type A receptor\tENSG01\n"
+                "2\tprotein_coding\t11\ttransporter\tENSG02\n"
+                "3\tlncRNA\t\\N\t\\N\tENSG03\n"
+            ),
+            "transcript.txt.gz": "5\t12\tprotein_coding\t\\N\tENST05\n",
+            "xref.txt.gz": (
+                "10\tGABRA1\tGABA receptor subunit alpha1\n"
+                "11\tSLC6A1\tsolute carrier family 6\n"
+                "12\tGABRA1-201\t\\N\n"
+            ),
+            "external_synonym.txt.gz": "10\tEJM5\n10\tEIEE19\n11\tGAT1\n",
+            "gene_attrib.txt.gz": "3\tgaba-related lncRNA\n",
+            "transcript_attrib.txt.gz": "",
+        }
+        for filename, content in files.items():
+            with gzip.open(os.path.join(self.dump, filename), "wt") as f:
+                f.write(content)
+
+        self.index = build_search_index(
+            self.db,
+            path=os.path.join(self.dump, "index.sqlite"),
+            dump=self.dump,
+            verbose=False,
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.dump)
+
+    def test_search_index_description(self):
+        # A match in the name/description returns all synonyms
+        result_to_test = index_results(self.index, "gaba")
+        expected_result = [
+            ["ENSG01", "GABRA1", "gamma-aminobutyric acid type A receptor", "GABA receptor subunit alpha1", "protein_coding", "EJM5"],
+            ["ENSG01", "GABRA1", "gamma-aminobutyric acid type A receptor", "GABA receptor subunit alpha1", "protein_coding", "EIEE19"],
+            ["ENSG03", None, None, None, "lncRNA", None],
+        ]
+
+        self.assertListEqual(sorted(result_to_test, key=str), sorted(expected_result, key=str))
+
+    def test_search_index_synonym(self):
+        # A match in a synonym only returns the matching synonym
+        result_to_test = index_results(self.index, "gat1")
+        expected_result = [
+            ["ENSG02", "SLC6A1", "transporter", "solute carrier family 6", "protein_coding", "GAT1"],
+        ]
+
+        self.assertListEqual(result_to_test, expected_result)
+
+    def test_search_index_transcript(self):
+        result_to_test = index_results(self.index, "GABRA1", id_type="transcript")
+        expected_result = [["ENST05", "GABRA1-201", None, None, "protein_coding", None]]
+
+        self.assertListEqual(result_to_test, expected_result)
+
+    def test_search_index_wildcards(self):
+        # As in the MySQL query, searchwords are LIKE patterns
+        self.assertListEqual(
+            sorted(set(row[0] for row in index_results(self.index, "GABRA_"))),
+            ["ENSG01"],
+        )
+        self.assertListEqual(
+            sorted(set(row[0] for row in index_results(self.index, "solute%family"))),
+            ["ENSG02"],
+        )
+        self.assertEqual(len(query_search_index(self.index, "GABRA_2")), 0)
+        # Searchwords shorter than three characters cannot use the trigram index
+        self.assertListEqual(
+            sorted(set(row[0] for row in index_results(self.index, "ej"))),
+            ["ENSG01"],
+        )
+
+    def test_search_index_query_plan(self):
+        conn = sqlite3.connect(self.index)
+        if "fts5" not in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'entry_text'"
+        ).fetchone()[0]:
+            conn.close()
+            self.skipTest("SQLite was built without FTS5 trigram support.")
+
+        sql, params = match_condition("receptor")
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT entries.ensembl_id FROM entries "
+            f"LEFT JOIN synonyms ON synonyms.entry_id = entries.entry_id WHERE {sql}",
+            params,
+        ).fetchall()
+        conn.close()
+        # The text tables are searched using the trigram index instead of a full scan
+        virtual = [row[-1] for row in plan if "VIRTUAL TABLE" in row[-1]]
+        self.assertEqual(len(virtual), 2)
+        self.assertTrue(all(re.search(r"INDEX 0:\S*M", detail) for detail in virtual))
+
+    def test_search_index_and(self):
+        # Only entries matching all searchwords are returned
+        result_to_test = index_results(self.index, ["receptor", "ejm"], andor="and")
+        expected_result = [
+            ["ENSG01", "GABRA1", "gamma-aminobutyric acid type A receptor", "GABA receptor subunit alpha1", "protein_coding", "EJM5"],
+            ["ENSG01", "GABRA1", "gamma-aminobutyric acid type A receptor", "GABA receptor subunit alpha1", "protein_coding", "EIEE19"],
+        ]
+
+        self.assertListEqual(sorted(result_to_test, key=str), sorted(expected_result, key=str))
+        self.assertEqual(index_results(self.index, ["receptor", "gat1"], andor="and"), [])
+
+    def test_search_index_or_limit(self):
+        # The limit applies to the number of Ensembl IDs
+        result_to_test = index_results(self.index, ["gaba", "gat1"], andor="or", limit=2)
+
+        self.assertListEqual(sorted(set(row[0] for row in result_to_test)), ["ENSG01", "ENSG02"])
+        self.assertEqual(len(result_to_test), 3)
+
+
+class FakeConnection:
+    def __init__(self, port):
+        self.port = port
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        self.connected = False
+
+
+class TestMySQLConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def connect(host, database, user, password, port):
+            self.calls.append(port)
+            if port == 3306:
+                raise Exception("Can't connect to MySQL server")
+            return FakeConnection(port)
+
+        patcher = mock.patch("gget.gget_search.sql.connect", side_effect=connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pool_reuse_and_port(self):
+        with MySQLConnectionPool() as pool:
+            with pool.connection("db_1") as conn:
+                self.assertEqual(conn.port, 4157)
+            with pool.connection("db_1") as conn_2:
+                self.assertIs(conn_2, conn)
+            # The port that worked is tried first for new databases
+            with pool.connection("db_2") as conn_3:
+                self.assertIsNot(conn_3, conn)
+
+        self.assertEqual(self.calls, [3306, 4157, 4157])
+        self.assertFalse(conn.is_connected())
+
+    def test_pool_health_check(self):
+        pool = MySQLConnectionPool()
+        with pool.connection("db_1") as conn:
+            pass
+        conn.connected = False
+        with pool.connection("db_1") as conn_2:
+            self.assertIsNot(conn_2, conn)
+        pool.close()
+
+    def test_pool_error(self):
+        pool = MySQLConnectionPool()
+        with self.assertRaises(RuntimeError):
+            pool.acquire("db_1", ports=[3306])
+        with self.assertRaisesRegex(RuntimeError, "No ports"):
+            pool.acquire("db_1", ports=[])
+
+
+class TestCollapseResults(unittest.TestCase):
+    @staticmethod
+    def normalize(df):
+        # The element-wise collapse used set(), so list order is arbitrary
+        # (missing values are compared as None since NaN != NaN)
+        def clean(v):
+            if isinstance(v, list):
+                return sorted([clean(x) for x in v], key=str)
+            return None if pd.isna(v) else v
+
+        return [[clean(v) for v in row] for row in df.values.tolist()]
+
+    def test_collapse_results(self):
+        df = synthetic_search_results(5000)
+        expected = collapse_results_elementwise(df)
+        result = collapse_results(df)
+
+        self.assertEqual(result.columns.tolist(), expected.columns.tolist())
+        self.assertEqual(self.normalize(result), self.normalize(expected))
+        # Synonyms are sorted lists
+        for syn in result["synonym"]:
+            self.assertIsInstance(syn, list)
+            self.assertEqual(syn, sorted(syn, key=str))
+
+    def test_collapse_results_empty(self):
+        df = synthetic_search_results(10).head(0)
+        result = collapse_results(df)
+        self.assertEqual(result.columns.tolist(), df.columns.tolist())
+        self.assertEqual(len(result), 0)
@@ -0,0 +1,302 @@
+import os
+import gzip
+import random
+import shutil
+import unittest
+import tempfile
+import itertools
+
+from gget.seq_index import (
+    FastaIndex,
+    build_fai,
+    load_id_table,
+    reverse_complement,
+    translate_sequence,
+    mitochondrial_table,
+    CODON_TABLES,
+)
+from gget.gget_seq import seq
+
+random.seed(0)
+CHROMOSOMES = {
+    "1": "".join(random.choice("ACGT") for _ in range(250)),
+    "MT": "".join(random.choice("ACGT") for _ in range(70)),
+}
+
+GTF = """#!genome-build GRCh38.p14
+1\thavana\tgene\t11\t120\t.\t+\t.\tgene_id "ENSG00000000001"; gene_version "1"; gene_name "GENE1"; gene_biotype "protein_coding";
+1\thavana\ttranscript\t11\t120\t.\t+\t.\tgene_id "ENSG00000000001"; transcript_id "ENST00000000001"; transcript_version "2"; tag "basic"; tag "Ensembl_canonical";
+1\thavana\texon\t101\t120\t.\t+\t.\tgene_id "ENSG00000000001"; transcript_id "ENST00000000001"; exon_number "2";
+1\thavana\texon\t11\t30\t.\t+\t.\tgene_id "ENSG00000000001"; transcript_id "ENST00000000001"; exon_number "1";
+1\thavana\tCDS\t14\t30\t.\t+\t0\tgene_id "ENSG00000000001"; transcript_id "ENST00000000001"; exon_number "1";
+1\thavana\tCDS\t101\t115\t.\t+\t1\tgene_id "ENSG00000000001"; transcript_id "ENST00000000001"; exon_number "2";
+1\thavana\ttranscript\t11\t60\t.\t+\t.\tgene_id "ENSG00000000001"; transcript_id "ENST00000000002";
+1\thavana\texon\t11\t60\t.\t+\t.\tgene_id "ENSG00000000001"; transcript_id "ENST00000000002"; exon_number "1";
+MT\tinsdc\tgene\t5\t64\t.\t-\t.\tgene_id "ENSG00000000003"; gene_name "MT-GENE"; gene_biotype "protein_coding";
+MT\tinsdc\ttranscript\t5\t64\t.\t-\t.\tgene_id "ENSG00000000003"; transcript_id "ENST00000000003";
+MT\tinsdc\texon\t40\t64\t.\t-\t.\tgene_id "ENSG00000000003"; transcript_id "ENST00000000003"; exon_number "1";
+MT\tinsdc\texon\t5\t20\t.\t-\t.\tgene_id "ENSG00000000003"; transcript_id "ENST00000000003"; exon_number "2";
+MT\tinsdc\tCDS\t40\t60\t.\t-\t1\tgene_id "ENSG00000000003"; transcript_id "ENST00000000003"; exon_number "1";
+MT\tinsdc\tCDS\t8\t20\t.\t-\t0\tgene_id "ENSG00000000003"; transcript_id "ENST00000000003"; exon_number "2";
+"""
+
+PEP = """>ENSP00000000001.1 pep chromosome:GRCh38:1:11:120:1 gene:ENSG00000000001.1 transcript:ENST00000000001.2 gene_biotype:protein_coding transcript_biotype:protein_coding
+MKVLAAGIVG
+>ENSP00000000002.1 pep chromosome:GRCh38:1:11:60:1 gene:ENSG00000000001.1 transcript:ENST00000000002.1 gene_biotype:protein_coding transcript_biotype:protein_coding
+MKV
+"""
+
+
+def reference_translation(sequence, table=1):
+    codons = {
+        "".join(codon): amino_acid
+        for codon, amino_acid in zip(
+            itertools.product("TCAG", repeat=3), CODON_TABLES[table]
+        )
+    }
+    return "".join(
+        codons.get(sequence[i : i + 3], "X") for i in range(0, len(sequence) - 2, 3)
+    )
+
+
+def write_fasta(path, records, line_width=60):
+    with (gzip.open(path, "wt") if path.endswith(".gz") else open(path, "w")) as f:
+        for name, sequence in records.items():
+            f.write(f">{name} dna:chromosome\n")
+            for i in range(0, len(sequence), line_width):
+                f.write(sequence[i : i + line_width] + "\n")
+
+
+class TestSeqIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.genome = os.path.join(self.tmp, "genome.fa.gz")
+        write_fasta(self.genome, CHROMOSOMES)
+        self.gtf = os.path.join(self.tmp, "annotation.gtf")
+        with open(self.gtf, "w") as f:
+            f.write(GTF)
+
+    def test_fai(self):
+        path = os.path.join(self.tmp, "genome.fa")
+        write_fasta(path, CHROMOSOMES)
+        with open(build_fai(path)) as f:
+            lines = [line.rstrip("\n").split("\t") for line in f]
+        self.assertEqual(lines[0], ["1", "250", "18", "60", "61"])
+        self.assertEqual(lines[1][:2], ["MT", "70"])
+
+    def test_fai_inconsistent_lines(self):
+        path = os.path.join(self.tmp, "bad.fa")
+        with open(path, "w") as f:
+            f.write(">1\nACGT\nAC\nACGT\n")
+        with self.assertRaises(ValueError):
+            build_fai(path)
+
+    def test_fetch(self):
+        with FastaIndex(self.genome, verbose=False) as genome:
+            self.assertEqual(genome.length("1"), 250)
+            self.assertEqual(genome.fetch("MT"), CHROMOSOMES["MT"])
+            # Slices across line breaks (1-based, inclusive)
+            for start, end in [(1, 1), (55, 125), (60, 61), (200, 250), (240, 400)]:
+                self.assertEqual(
+                    genome.fetch("1", start, end), CHROMOSOMES["1"][start - 1 : end]
+                )
+            self.assertEqual(
+                genome.fetch("MT", 5, 64, strand="-"),
+                reverse_complement(CHROMOSOMES["MT"][4:64]),
+            )
+        # The gzipped file is decompressed and indexed once
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, "genome.fa.fai")))
+
+    def test_id_table(self):
+        table = load_id_table(self.gtf, verbose=False)
+        self.assertEqual(table.loc["ENSG00000000001", "object_type"], "Gene")
+        self.assertEqual(table.loc["ENST00000000001", "exon_starts"], "11,101")
+        self.assertEqual(table.loc["ENST00000000003", "strand"], "-")
+        self.assertEqual(table.loc["ENST00000000003", "gene_id"], "ENSG00000000003")
+        self.assertEqual(table.loc["ENST00000000003", "cds_starts"], "8,40")
+        self.assertEqual(table.loc["ENST00000000003", "cds_phase"], "1")
+        self.assertTrue(table.loc["ENST00000000001", "canonical"])
+        self.assertFalse(table.loc["ENST00000000002", "canonical"])
+
+    def test_seq_local(self):
+        chr1 = CHROMOSOMES["1"]
+        mt = CHROMOSOMES["MT"]
+        result = seq(
+            ["ENSG00000000001", "ENST00000000001.2", "ENST00000000003"],
+            backend="local",
+            fasta=self.genome,
+            gtf=self.gtf,
+            verbose=False,
+        )
+        self.assertEqual(
+            result,
+            [
+                ">ENSG00000000001 chromosome:GRCh38:1:11:120:1",
+                chr1[10:120],
+                ">ENST00000000001 chromosome:GRCh38:1:11:120:1",
+                chr1[10:30] + chr1[100:120],
+                ">ENST00000000003 chromosome:GRCh38:MT:5:64:-1",
+                reverse_complement(mt[4:20] + mt[39:64]),
+            ],
+        )
+
+    def test_seq_local_isoforms(self):
+        result = seq(
+            "ENSG00000000001",
+            isoforms=True,
+            backend="local",
+            fasta=self.genome,
+            gtf=self.gtf,
+            verbose=False,
+        )
+        self.assertEqual(
+            result[::2],
+            [
+                ">ENST00000000001 chromosome:GRCh38:1:11:120:1",
+                ">ENST00000000002 chromosome:GRCh38:1:11:60:1",
+            ],
+        )
+        self.assertEqual(result[3], CHROMOSOMES["1"][10:60])
+
+    def test_seq_local_cdna(self):
+        cdna = os.path.join(self.tmp, "cdna.fa")
+        write_fasta(cdna, {"ENST00000000001.2": "ACGTACGT"})
+        result = seq(
+            "ENST00000000001",
+            backend="local",
+            fasta=[cdna, self.genome],
+            gtf=self.gtf,
+            verbose=False,
+        )
+        # The cDNA sequence takes precedence over splicing the genome
+        self.assertEqual(result[1], "ACGTACGT")
+
+    def test_seq_local_errors(self):
+        with self.assertRaises(ValueError):
+            seq("ENSG00000000001", backend="local", verbose=False)
+        with self.assertRaises(ValueError):
+            seq("ENSG00000000001", backend="ftp", verbose=False)
+        self.assertEqual(
+            seq("ENSG00000009999", backend="local", fasta=self.genome, gtf=self.gtf, verbose=False),
+            [],
+        )
+
+    def test_translate_sequence(self):
+        self.assertEqual(translate_sequence("ATGNNNTGAC"), "MX*")
+        self.assertEqual(translate_sequence("AUGUGAAGA", table=2), "MW*")
+        self.assertEqual(translate_sequence("AT"), "")
+        sequence = CHROMOSOMES["1"]
+        self.assertEqual(translate_sequence(sequence), reference_translation(sequence))
+
+    def test_seq_local_translate(self):
+        chr1 = CHROMOSOMES["1"]
+        mt = CHROMOSOMES["MT"]
+        result = seq(
+            ["ENSG00000000001", "ENST00000000003"],
+            translate=True,
+            backend="local",
+            fasta=self.genome,
+            gtf=self.gtf,
+            verbose=False,
+        )
+        expected_1 = reference_translation(chr1[13:30] + chr1[100:115]).rstrip("*")
+        # Vertebrate mitochondrial code, the first CDS segment (in transcript orientation) has phase 1
+        expected_3 = reference_translation(
+            reverse_complement(mt[7:20] + mt[39:60])[1:], table=2
+        ).rstrip("*")
+        self.assertEqual(
+            result,
+            [
+                # Canonical transcript of the gene
+                f">ENST00000000001 ensembl_id: ENST00000000001 gene_id: ENSG00000000001 gene_name: GENE1 sequence_length: {len(expected_1)}",
+                expected_1,
+                f">ENST00000000003 ensembl_id: ENST00000000003 gene_id: ENSG00000000003 gene_name: MT-GENE sequence_length: {len(expected_3)}",
+                expected_3,
+            ],
+        )
+
+    def test_mitochondrial_table(self):
+        self.assertEqual(mitochondrial_table("GRCh38"), 2)
+        self.assertEqual(mitochondrial_table("bTaeGut1"), 2)
+        self.assertEqual(mitochondrial_table("mRatBN7"), 2)
+        self.assertEqual(mitochondrial_table("R64-1-1"), 3)
+        self.assertEqual(mitochondrial_table("BDGP6"), 5)
+        self.assertEqual(mitochondrial_table("TAIR10"), 1)
+        self.assertIsNone(mitochondrial_table("IRGSP-1"))
+        self.assertIsNone(mitochondrial_table(""))
+
+    def test_seq_local_translate_mt_table(self):
+        mt = CHROMOSOMES["MT"]
+        cds = reverse_complement(mt[7:20] + mt[39:60])[1:]
+        # Unknown genome build: standard code with a warning
+        gtf = os.path.join(self.tmp, "plant.gtf")
+        with open(gtf, "w") as f:
+            f.write(GTF.replace("GRCh38.p14", "IRGSP-1.0"))
+        with self.assertLogs(level="WARNING"):
+            result = seq(
+                "ENST00000000003",
+                translate=True,
+                backend="local",
+                fasta=self.genome,
+                gtf=gtf,
+                verbose=False,
+            )
+        self.assertEqual(result[1], reference_translation(cds, table=1).rstrip("*"))
+
+        # Genetic code passed explicitly
+        result = seq(
+            "ENST00000000003",
+            translate=True,
+            backend="local",
+            fasta=self.genome,
+            gtf=gtf,
+            mt_table=5,
+            verbose=False,
+        )
+        self.assertEqual(result[1], reference_translation(cds, table=5).rstrip("*"))
+
+        with self.assertRaises(ValueError):
+            seq(
+                "ENST00000000003",
+                translate=True,
+                backend="local",
+                fasta=self.genome,
+                gtf=gtf,
+                mt_table=99,
+            )
+
+    def test_seq_local_pep(self):
+        pep = os.path.join(self.tmp, "pep.fa")
+        with open(pep, "w") as f:
+            f.write(PEP)
+
+        # pep FASTA records are looked up by transcript ID
+        result = seq(
+            "ENSG00000000001",
+            translate=True,
+            isoforms=True,
+            backend="local",
+            fasta=[self.genome, pep],
+            gtf=self.gtf,
+            verbose=False,
+        )
+        self.assertEqual(result[1::2], ["MKVLAAGIVG", "MKV"])
+
+        # Without GTF file, using the IDs in the pep FASTA headers
+        result = seq(
+            ["ENST00000000002", "ENSG00000000001"],
+            translate=True,
+            backend="local",
+            fasta=pep,
+            verbose=False,
+        )
+        self.assertEqual(
+            result,
+            [
+                ">ENST00000000002 ensembl_id: ENST00000000002 gene_id: ENSG00000000001 gene_name:  sequence_length: 3",
+                "MKV",
+                ">ENST00000000001 ensembl_id: ENST00000000001 gene_id: ENSG00000000001 gene_name:  sequence_length: 10",
+                "MKVLAAGIVG",
+            ],
+        )
@@ -1,8 +1,21 @@
+import io
 import unittest
+from unittest import mock
+import asyncio
 import numpy as np
+import requests
+from urllib3 import HTTPResponse
 from gget.utils import (
     n_colors,
     aa_colors,
+    chunks,
+    get_session,
+    build_session,
+    RateLimiter,
+    uniprot_idmapping_db,
+    filter_reviewed,
+    get_uniprot_entries,
+    get_ncbi_info,
     get_uniprot_seqs,
     get_uniprot_info,
     rest_query,
@@ -11,7 +24,13 @@ from gget.utils import (
     ref_species_options,
 )
 
-from gget.constants import UNIPROT_REST_API, ENSEMBL_REST_API, ENSEMBL_FTP_URL_NV
+from gget.constants import (
+    UNIPROT_REST_API,
+    ENSEMBL_REST_API,
+    ENSEMBL_FTP_URL_NV,
+    HTTP_RETRIES,
+    HTTP_POOL_SIZES,
+)
 
 from .fixtures import (
     LATEST_ENS_RELEASE,
@@ -35,6 +54,137 @@ class TestUtils(unittest.TestCase):
 
         self.assertEqual(result_to_test, expected_result)
 
+    def test_chunks(self):
+        result_to_test = chunks(["a", "b", "c", "d", "e"], 2)
+        expected_result = [["a", "b"], ["c", "d"], ["e"]]
+
+        self.assertListEqual(result_to_test, expected_result)
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter({"https://example.org/api": (20, 2)})
+
+        # The first two requests use the burst, the next two wait 1/20 s each
+        waits = [limiter.acquire("example.org") for _ in range(4)]
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertTrue(all(wait > 0 for wait in waits[2:]))
+
+        # Async tasks share the same bucket
+        wait = asyncio.run(limiter.acquire_async("http://example.org/other"))
+        self.assertGreater(wait, 0)
+
+        # Hosts without a limit are not throttled
+        self.assertEqual(limiter.acquire("rest.ensembl.org"), 0)
+
+        stats = limiter.stats()
+        self.assertEqual(stats["example.org"]["requests"], 5)
+        self.assertEqual(stats["example.org"]["throttled"], 3)
+        self.assertAlmostEqual(stats["example.org"]["wait_time"], sum(waits) + wait)
+        self.assertEqual(stats["rest.ensembl.org"]["throttled"], 0)
+
+        with self.assertRaises(ValueError):
+            limiter.set_limit("example.org", 0)
+
+    def test_uniprot_idmapping_db(self):
+        result_to_test = [
+            uniprot_idmapping_db(id_)
+            for id_ in [
+                "ENSG00000034713",
+                "ENST00000641515",
+                "ENSMUSP00000000001",
+                "WBGene00043981",
+                "FBgn0003731",
+                "P04637",
+            ]
+        ]
+        expected_result = [
+            "Ensembl",
+            "Ensembl_Transcript",
+            "Ensembl_Protein",
+            "WormBase",
+            "FlyBase",
+            None,
+        ]
+
+        self.assertListEqual(result_to_test, expected_result)
+
+    def test_filter_reviewed(self):
+        reviewed = {"primaryAccession": "P1", "entryType": "UniProtKB reviewed (Swiss-Prot)"}
+        unreviewed = {"primaryAccession": "Q1", "entryType": "UniProtKB unreviewed (TrEMBL)"}
+
+        self.assertEqual(filter_reviewed([unreviewed, reviewed]), ([reviewed], True))
+        self.assertEqual(filter_reviewed([unreviewed]), ([unreviewed], False))
+        self.assertEqual(filter_reviewed([]), ([], False))
+
+    def test_get_ncbi_info(self):
+        html = (
+            '<input id="gene-id-value" value="1234"><div class="section" id="summaryDiv"><dl>'
+            "<dt>Summary</dt><dd>Description</dd><dt>Also known as</dt><dd>A; B</dd></dl></div>"
+        )
+        with mock.patch("gget.utils.get_session") as session:
+            session.return_value.get.return_value = mock.Mock(status_code=200, text=html)
+            self.assertEqual(
+                get_ncbi_info("ENSG00000000001"),
+                {"ncbi_gene_id": "1234", "ncbi_description": "Description", "ncbi_synonyms": ["A", "B"]},
+            )
+
+            session.return_value.get.return_value = mock.Mock(
+                status_code=200, text='<li class="error icon">An error has occured</li>'
+            )
+            with self.assertRaises(RuntimeError):
+                get_ncbi_info("ENSG00000000002")
+
+    def test_get_uniprot_entries(self):
+        entry = {"primaryAccession": "P1"}
+
+        def fake_idmapping(ids, from_db):
+            return {"ENST00000000001": [entry]} if from_db == "Ensembl_Transcript" else {}
+
+        with mock.patch("gget.utils.get_uniprot_idmapping", side_effect=fake_idmapping) as idmapping:
+            result = get_uniprot_entries(["ENST00000000001", "ENST00000000002", "ENSG00000000001"])
+
+        self.assertEqual(
+            sorted(call.kwargs["from_db"] for call in idmapping.call_args_list),
+            ["Ensembl", "Ensembl_Transcript"],
+        )
+        # IDs that were not mapped are left out (and looked up one by one)
+        self.assertEqual(result, {"ENST00000000001": [entry]})
+
+    def test_get_session(self):
+        session = get_session()
+        # The session is shared between calls
+        self.assertIs(session, get_session())
+
+        adapter = session.get_adapter(ENSEMBL_REST_API + "lookup/id")
+        self.assertEqual(adapter.retry.total, HTTP_RETRIES)
+        self.assertEqual(adapter._pool_maxsize, HTTP_POOL_SIZES["rest.ensembl.org"])
+
+    def test_session_retries(self):
+        session = build_session(retries=2, backoff_factor=0)
+        sent = []
+
+        def send(adapter, request, **kwargs):
+            # Every request fails with status code 503
+            sent.append((request.method, request.url))
+            response = requests.Response()
+            response.status_code = 503
+            response.raw = HTTPResponse(body=io.BytesIO(), status=503, preload_content=False)
+            response.url = request.url
+            return response
+
+        with mock.patch("requests.adapters.HTTPAdapter.send", send), mock.patch(
+            "gget.utils.RATE_LIMITER.acquire"
+        ) as acquire:
+            # Idempotent requests are retried (each retry waits for the rate limiter)
+            self.assertEqual(session.get("https://rest.uniprot.org/a").status_code, 503)
+            self.assertEqual(len(sent), 3)
+            self.assertEqual(acquire.call_count, 3)
+
+            # Ensembl POST lookups are retried, job submissions are sent once
+            session.post(ENSEMBL_REST_API + "lookup/id", json={"ids": ["ENSG1"]})
+            self.assertEqual(len(sent), 6)
+            session.post("https://blast.ncbi.nlm.nih.gov/Blast.cgi", data={"CMD": "Put"})
+            self.assertEqual(len(sent), 7)
+
     def test_get_uniprot_seqs(self):
         df = get_uniprot_seqs(
             UNIPROT_REST_API, ["ENST00000392653.3", "ENST00000392657.7"]